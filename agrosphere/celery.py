@@ -68,6 +68,66 @@ app.conf.beat_schedule = {
         'task': 'blockchain.tasks.sync_pending_transactions',
         'schedule': crontab(minute='*/5'),  # Every 5 minutes
     },
+    
+    # Drain transaction outbox (recovers events left by crashed workers)
+    'dispatch-outbox-events': {
+        'task': 'blockchain.tasks.dispatch_outbox_events',
+        'schedule': crontab(minute='*'),  # Every minute
+    },
+    
+    # Record AgroCoin rate and roll up OHLC buckets
+    'record-agrocoin-price': {
+        'task': 'blockchain.tasks.record_price_history',
+        'schedule': crontab(minute='*/15'),  # Every 15 minutes
+    },
+    
+    # Release expired checkout stock holds
+    'release-expired-holds': {
+        'task': 'marketplace.tasks.release_expired_holds',
+        'schedule': crontab(minute='*/5'),  # Every 5 minutes
+    },
+    
+    # Write changed Redis carts back to the database
+    'flush-dirty-carts': {
+        'task': 'marketplace.tasks.flush_dirty_carts',
+        'schedule': crontab(minute='*/2'),  # Every 2 minutes
+    },
+    
+    # Correct drift in incrementally maintained product ratings
+    'recompute-product-ratings': {
+        'task': 'marketplace.tasks.recompute_product_ratings',
+        'schedule': crontab(hour=3, minute=0),  # Daily at 3 AM
+    },
+    
+    # Rebuild co-purchase recommendations from order history
+    'build-product-recommendations': {
+        'task': 'marketplace.tasks.build_product_recommendations',
+        'schedule': crontab(hour=2, minute=0),  # Daily at 2 AM
+    },
+    
+    # Apply buffered product page views
+    'flush-product-views': {
+        'task': 'marketplace.tasks.flush_product_views',
+        'schedule': crontab(minute='*/5'),  # Every 5 minutes
+    },
+    
+    # Correct drift in the search autocomplete snapshot
+    'rebuild-autocomplete-index': {
+        'task': 'marketplace.tasks.rebuild_autocomplete_index',
+        'schedule': crontab(hour=4, minute=0),  # Daily at 4 AM
+    },
+    
+    # Send investment timeline milestones due today
+    'notify-investment-milestones': {
+        'task': 'investments.tasks.notify_investment_milestones',
+        'schedule': crontab(hour=9, minute=0),  # Daily at 9 AM
+    },
+    
+    # Correct drift in investor portfolio totals
+    'reconcile-investment-portfolios': {
+        'task': 'investments.tasks.reconcile_portfolios',
+        'schedule': crontab(hour=3, minute=30),  # Daily at 3:30 AM
+    },
 }
 
 # Celery Task Configuration
@@ -93,6 +153,7 @@ app.conf.update(
         'investments.tasks.*': {'queue': 'investments'},
         'experts.tasks.*': {'queue': 'experts'},
         'ussd.tasks.*': {'queue': 'ussd'},
+        'marketplace.tasks.*': {'queue': 'marketplace'},
     },
     
     # Worker configuration
@@ -88,6 +88,11 @@ ERC20_ABI = json.loads('''[
 ]''')
 
 
+class TransactionReverted(Exception):
+    """Raised when a sent transaction was mined but failed"""
+    pass
+
+
 class EthereumService:
     """
     Service class for Ethereum blockchain operations
@@ -356,52 +361,80 @@ class EthereumService:
             str: Transaction hash
         """
         try:
-            if not self.agrocoin_contract:
-                raise Exception("AgroCoin contract not configured")
-            
-            # Create account
-            account = Account.from_key(from_private_key)
-            from_address = account.address
-            
-            # Get token decimals
-            decimals = self.agrocoin_contract.functions.decimals().call()
-            
-            # Convert amount to smallest unit
-            amount_raw = int(amount * (10 ** decimals))
-            
-            # Get nonce
-            nonce = self.w3.eth.get_transaction_count(from_address)
-            
-            # Build transaction
-            transaction = self.agrocoin_contract.functions.transfer(
-                Web3.to_checksum_address(to_address),
-                amount_raw
-            ).build_transaction({
-                'nonce': nonce,
-                'gas': self.gas_limit,
-                'gasPrice': self.w3.to_wei(self.gas_price_gwei, 'gwei'),
-                'chainId': self.chain_id
-            })
-            
-            # Sign transaction
-            signed_txn = self.w3.eth.account.sign_transaction(transaction, from_private_key)
-            
-            # Send transaction
-            tx_hash = self.w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-            
-            # Wait for confirmation
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
-            
-            if receipt['status'] == 1:
-                logger.info(f"Token transfer successful. Hash: {tx_hash.hex()}")
-                return tx_hash.hex()
-            else:
-                raise Exception("Transaction failed")
+            signed_txn = self.sign_token_transfer(from_private_key, to_address, amount)
+            return self.send_signed_transaction(signed_txn)
         
         except Exception as e:
             logger.error(f"Token transfer failed: {str(e)}")
             raise
     
+    def sign_token_transfer(self, from_private_key, to_address, amount):
+        """
+        Build and sign an ERC-20 token transfer without sending it
+        
+        Args:
+            from_private_key: Sender's private key
+            to_address: Recipient's address
+            amount: Amount of tokens
+            
+        Returns:
+            SignedTransaction: The signed transfer; its hash is known before it is sent
+        """
+        if not self.agrocoin_contract:
+            raise Exception("AgroCoin contract not configured")
+        
+        # Create account
+        account = Account.from_key(from_private_key)
+        from_address = account.address
+        
+        # Get token decimals
+        decimals = self.agrocoin_contract.functions.decimals().call()
+        
+        # Convert amount to smallest unit
+        amount_raw = int(amount * (10 ** decimals))
+        
+        # Get nonce
+        nonce = self.w3.eth.get_transaction_count(from_address)
+        
+        # Build transaction
+        transaction = self.agrocoin_contract.functions.transfer(
+            Web3.to_checksum_address(to_address),
+            amount_raw
+        ).build_transaction({
+            'nonce': nonce,
+            'gas': self.gas_limit,
+            'gasPrice': self.w3.to_wei(self.gas_price_gwei, 'gwei'),
+            'chainId': self.chain_id
+        })
+        
+        # Sign transaction
+        return self.w3.eth.account.sign_transaction(transaction, from_private_key)
+    
+    def send_signed_transaction(self, signed_txn):
+        """
+        Broadcast a signed transaction and wait for its receipt
+        
+        Args:
+            signed_txn: Transaction from sign_token_transfer
+            
+        Returns:
+            str: Transaction hash
+            
+        Raises:
+            TransactionReverted: If the transaction was mined but failed
+        """
+        # Send transaction
+        tx_hash = self.w3.eth.send_raw_transaction(signed_txn.rawTransaction)
+        
+        # Wait for confirmation
+        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
+        
+        if receipt['status'] != 1:
+            raise TransactionReverted("Transaction failed")
+        
+        logger.info(f"Token transfer successful. Hash: {tx_hash.hex()}")
+        return tx_hash.hex()
+    
     def verify_transaction(self, tx_hash):
         """
         Verify a transaction on the blockchain
@@ -4,6 +4,9 @@ from django.core.validators import MinValueValidator
 from decimal import Decimal
 import uuid
 
+from .rates import get_rate
+
+
 class Wallet(models.Model):
     """
     User's Ethereum wallet for AgroCoin (ERC-20) transactions
@@ -81,7 +84,7 @@ class Wallet(models.Model):
         """
         Update cached naira equivalent based on current conversion rate
         """
-        rate = Decimal(settings.ETHEREUM_CONFIG['AGROCOIN_TO_NAIRA_RATE'])
+        rate = get_rate()
         self.naira_equivalent = self.agrocoin_balance * rate
         self.save(update_fields=['naira_equivalent', 'updated_at'])
     
@@ -328,11 +331,56 @@ class PriceHistory(models.Model):
         verbose_name = 'Price History'
         verbose_name_plural = 'Price History'
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp']),
+        ]
     
     def __str__(self):
         return f"1 AC = ₦{self.rate} at {self.timestamp}"
 
 
+class PriceCandle(models.Model):
+    """
+    Pre-aggregated OHLC bucket of the AgroCoin to Naira rate
+    One row per granularity per bucket, updated as rate changes are recorded
+    """
+    
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+        ('week', 'Weekly'),
+    ]
+    
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField(help_text="Start of the bucket (UTC)")
+    
+    # OHLC values (1 AC = X NGN)
+    open = models.DecimalField(max_digits=10, decimal_places=2)
+    high = models.DecimalField(max_digits=10, decimal_places=2)
+    low = models.DecimalField(max_digits=10, decimal_places=2)
+    close = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    # Number of rate observations folded into this bucket
+    samples = models.IntegerField(default=1)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'price_candles'
+        verbose_name = 'Price Candle'
+        verbose_name_plural = 'Price Candles'
+        ordering = ['granularity', 'bucket_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'bucket_start'],
+                name='unique_price_candle_bucket'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.granularity} {self.bucket_start}: O{self.open} H{self.high} L{self.low} C{self.close}"
+
+
 class GasFeeRecord(models.Model):
     """
     Track Ethereum gas fees for transactions
@@ -373,4 +421,58 @@ class GasFeeRecord(models.Model):
         verbose_name_plural = 'Gas Fee Records'
     
     def __str__(self):
-        return f"Gas fee: {self.total_fee_eth} ETH (₦{self.total_fee_naira})"
\ No newline at end of file
+        return f"Gas fee: {self.total_fee_eth} ETH (₦{self.total_fee_naira})"
+
+class OutboxEvent(models.Model):
+    """
+    Side effect of a transaction status change, written in the same DB transaction
+    Drained in batches by the outbox dispatcher task
+    """
+    
+    EVENT_TYPE_CHOICES = [
+        ('sms', 'SMS Notification'),
+        ('order_paid', 'Marketplace Order Paid'),
+        ('investment_paid', 'Investment Paid'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('dispatched', 'Dispatched'),
+        ('failed', 'Failed'),
+    ]
+    
+    event_type = models.CharField(max_length=30, choices=EVENT_TYPE_CHOICES)
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.CASCADE,
+        related_name='outbox_events',
+        null=True,
+        blank=True
+    )
+    payload = models.JSONField(default=dict, help_text="Event data needed by the dispatcher")
+    
+    # Delivery state
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+    next_attempt_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Earliest retry after a failed dispatch"
+    )
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'outbox_events'
+        verbose_name = 'Outbox Event'
+        verbose_name_plural = 'Outbox Events'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} ({self.status}) for {self.transaction_id}"
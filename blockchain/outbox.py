@@ -0,0 +1,266 @@
+"""
+AgroMentor 360 - Transaction Outbox
+Post-confirmation side effects are written as OutboxEvent rows in the same DB
+transaction as the status change, then applied in batches by the dispatcher
+"""
+
+from django.db import transaction as db_transaction
+from django.db.models import F, Q, Sum, Count, Case, When, Value, DateTimeField
+from django.utils import timezone
+from collections import defaultdict
+from datetime import timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+DISPATCH_BATCH_SIZE = 500
+SMS_CHUNK_SIZE = 100
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 60             # Seconds; doubles with every failed attempt
+
+
+def build_confirmation_events(tx):
+    """
+    Build (unsaved) outbox events for a confirmed transaction
+
+    Expects tx to have from_wallet__user and to_wallet__user loaded.
+    """
+    from blockchain.models import OutboxEvent
+
+    events = []
+    tx_hash_display = (tx.ethereum_tx_hash or "")[:10]
+
+    if tx.from_wallet:
+        events.append(OutboxEvent(
+            event_type='sms',
+            transaction=tx,
+            payload={
+                'phone_number': tx.from_wallet.user.phone_number,
+                'message': f"✅ Transaction confirmed! {tx.amount} AC sent successfully. TxHash: {tx_hash_display}..."
+            }
+        ))
+
+    if tx.to_wallet:
+        if tx.transaction_type == 'expert_payment':
+            message = f"💰 Payment received: {tx.amount} AC (₦{tx.naira_value}) for consultation"
+        else:
+            message = f"✅ You received {tx.amount} AC! TxHash: {tx_hash_display}..."
+        events.append(OutboxEvent(
+            event_type='sms',
+            transaction=tx,
+            payload={
+                'phone_number': tx.to_wallet.user.phone_number,
+                'message': message
+            }
+        ))
+
+    if tx.transaction_type == 'marketplace_purchase':
+        events.append(OutboxEvent(event_type='order_paid', transaction=tx))
+    elif tx.transaction_type == 'investment':
+        events.append(OutboxEvent(event_type='investment_paid', transaction=tx))
+
+    return events
+
+
+def enqueue_confirmation_events(txs):
+    """
+    Write outbox events for confirmed transactions
+    Must be called inside the atomic block that marks them confirmed
+    """
+    from blockchain.models import OutboxEvent
+
+    events = []
+    for tx in txs:
+        events.extend(build_confirmation_events(tx))
+
+    OutboxEvent.objects.bulk_create(events)
+    return len(events)
+
+
+def mark_orders_paid(transaction_ids):
+    """
+    Move pending marketplace orders paid by these transactions to 'paid'
+    """
+    from marketplace.models import Order
+    from marketplace.orders import commit_paid_orders
+    from marketplace.price_index import record_on_commit
+
+    now = timezone.now()
+    orders = list(Order.objects.filter(
+        payment_transaction_id__in=transaction_ids,
+        status='pending'
+    ))
+
+    for order in orders:
+        order.status = 'paid'
+        order.paid_at = now
+        order.updated_at = now
+
+    Order.objects.bulk_update(orders, ['status', 'paid_at', 'updated_at'])
+
+    # Stock held at checkout is taken from the database only now
+    commit_paid_orders(orders)
+
+    # Paid prices feed the crop market price index
+    record_on_commit([order.id for order in orders])
+
+    logger.info(f"Marked {len(orders)} orders as paid")
+    return orders
+
+
+def activate_investments(transaction_ids):
+    """
+    Activate pending investments paid by these transactions and add them
+    to their opportunities' funding totals
+    """
+    from investments.models import Investment, InvestmentOpportunity
+    from investments.milestones import check_funding_milestones
+    from investments.portfolio import add_delta, apply_deltas
+
+    investments = list(Investment.objects.filter(
+        payment_transaction_id__in=transaction_ids,
+        status='pending'
+    ))
+    if not investments:
+        return []
+
+    for investment in investments:
+        investment.status = 'active'
+
+    Investment.objects.bulk_update(investments, ['status'])
+
+    deltas = {}
+    for investment in investments:
+        add_delta(deltas, investment.investor_id, invested=investment.amount_ac, active=1)
+    apply_deltas(deltas)
+
+    # One funding update per opportunity instead of one save per investment
+    totals = Investment.objects.filter(
+        id__in=[i.id for i in investments]
+    ).values('opportunity_id').annotate(
+        amount=Sum('amount_ac'),
+        investors=Count('id')
+    )
+
+    for row in totals:
+        new_amount = F('current_amount_ac') + row['amount']
+        InvestmentOpportunity.objects.filter(id=row['opportunity_id']).update(
+            current_amount_ac=new_amount,
+            total_investors=F('total_investors') + row['investors'],
+            funding_percentage=new_amount * 100 / F('target_amount_ac')
+        )
+
+    InvestmentOpportunity.objects.filter(
+        id__in=[row['opportunity_id'] for row in totals],
+        status='open',
+        funding_percentage__gte=100
+    ).update(status='funded', funded_at=timezone.now())
+
+    # Milestones crossed by this batch, including fully funded
+    check_funding_milestones([row['opportunity_id'] for row in totals])
+
+    logger.info(f"Activated {len(investments)} investments")
+    return investments
+
+
+def _dispatch_sms(events):
+    """
+    Enqueue SMS events as chunked batch tasks once the batch commits
+    """
+    from notifications.tasks import send_sms_batch
+
+    messages = [
+        [e.payload['phone_number'], e.payload['message']]
+        for e in events
+        if e.payload.get('phone_number')
+    ]
+
+    for i in range(0, len(messages), SMS_CHUNK_SIZE):
+        chunk = messages[i:i + SMS_CHUNK_SIZE]
+        db_transaction.on_commit(lambda chunk=chunk: send_sms_batch.delay(chunk)) # type: ignore
+
+
+EVENT_HANDLERS = {
+    'sms': _dispatch_sms,
+    'order_paid': lambda events: mark_orders_paid([e.transaction_id for e in events]),
+    'investment_paid': lambda events: activate_investments([e.transaction_id for e in events]),
+}
+
+
+def _retry_at(now):
+    """
+    Next attempt time for rows about to record a failure, by attempts so far
+    """
+    return Case(
+        *[
+            When(attempts=attempts, then=Value(now + timedelta(seconds=RETRY_BASE_DELAY * 2 ** attempts)))
+            for attempts in range(MAX_ATTEMPTS)
+        ],
+        default=Value(None),
+        output_field=DateTimeField()
+    )
+
+
+def dispatch_batch(batch_size=DISPATCH_BATCH_SIZE):
+    """
+    Claim a batch of pending outbox events and apply them grouped by type
+
+    Rows are claimed with SKIP LOCKED so several workers can drain the outbox
+    in parallel. DB side effects commit together with the events being marked
+    dispatched, so a crash never loses or double-applies them. A failed group
+    is not claimed again until its backoff has passed.
+
+    Returns:
+        dict: Number of events dispatched per type and number failed
+    """
+    from blockchain.models import OutboxEvent
+
+    result = {'dispatched': {}, 'failed': 0}
+
+    with db_transaction.atomic():
+        now = timezone.now()
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now), status='pending')
+            .order_by('created_at')[:batch_size]
+        )
+        if not events:
+            return result
+
+        grouped = defaultdict(list)
+        for event in events:
+            grouped[event.event_type].append(event)
+
+        for event_type, group in grouped.items():
+            ids = [e.id for e in group]
+            handler = EVENT_HANDLERS.get(event_type)
+
+            try:
+                if handler is None:
+                    raise ValueError(f"No handler for outbox event type '{event_type}'")
+
+                with db_transaction.atomic():
+                    handler(group)
+
+                OutboxEvent.objects.filter(id__in=ids).update(
+                    status='dispatched',
+                    dispatched_at=now,
+                    attempts=F('attempts') + 1
+                )
+                result['dispatched'][event_type] = len(ids)
+
+            except Exception as e:
+                logger.error(f"Error dispatching {len(ids)} '{event_type}' outbox events: {str(e)}")
+                OutboxEvent.objects.filter(id__in=ids).update(
+                    attempts=F('attempts') + 1,
+                    last_error=str(e),
+                    next_attempt_at=_retry_at(now)
+                )
+                OutboxEvent.objects.filter(
+                    id__in=ids,
+                    attempts__gte=MAX_ATTEMPTS
+                ).update(status='failed')
+                result['failed'] += len(ids)
+
+    return result
@@ -0,0 +1,210 @@
+"""
+AgroMentor 360 - AgroCoin Price Series
+Records AgroCoin to Naira rate changes and serves OHLC chart data from pre-aggregated buckets
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Least
+from django.core.cache import cache
+from django.utils import timezone
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Bucket sizes, finest first. Range queries pick the finest one that fits.
+GRANULARITIES = [
+    ('hour', timedelta(hours=1)),
+    ('day', timedelta(days=1)),
+    ('week', timedelta(weeks=1)),
+]
+
+DEFAULT_POINTS = 120
+MAX_POINTS = 500
+
+LAST_RATE_CACHE_KEY = 'agrocoin_last_recorded_rate'
+
+
+def bucket_start(granularity, moment):
+    """
+    Truncate a datetime to the start of its bucket (UTC)
+    Weekly buckets start on Monday
+    """
+    moment = moment.astimezone(dt_timezone.utc)
+    start = moment.replace(minute=0, second=0, microsecond=0)
+    if granularity in ('day', 'week'):
+        start = start.replace(hour=0)
+    if granularity == 'week':
+        start -= timedelta(days=start.weekday())
+    return start
+
+
+def _fold_into_candle(granularity, start, rate):
+    """
+    Fold a rate observation into a single OHLC bucket with one UPDATE,
+    creating the bucket on its first observation
+    """
+    from blockchain.models import PriceCandle
+
+    def update():
+        return PriceCandle.objects.filter(
+            granularity=granularity,
+            bucket_start=start
+        ).update(
+            high=Greatest('high', Value(rate)),
+            low=Least('low', Value(rate)),
+            close=Value(rate),
+            samples=F('samples') + 1,
+            updated_at=timezone.now()
+        )
+
+    if update():
+        return
+
+    try:
+        with transaction.atomic():
+            PriceCandle.objects.create(
+                granularity=granularity,
+                bucket_start=start,
+                open=rate,
+                high=rate,
+                low=rate,
+                close=rate
+            )
+    except IntegrityError:
+        # Another worker opened the bucket first
+        update()
+
+
+def record_rate(rate, force=False):
+    """
+    Record an AgroCoin to Naira rate observation
+
+    A raw PriceHistory tick is written only when the rate differs from the
+    last recorded one; the hourly, daily and weekly buckets are always updated
+    so that charts have no gaps.
+
+    Returns:
+        bool: True if the rate changed and a tick was written
+    """
+    from blockchain.models import PriceHistory
+
+    rate = Decimal(str(rate)).quantize(Decimal('0.01'))
+    now = timezone.now()
+
+    last_rate = cache.get(LAST_RATE_CACHE_KEY)
+    if last_rate is None:
+        last_rate = PriceHistory.objects.values_list('rate', flat=True).first()
+    changed = force or last_rate is None or Decimal(str(last_rate)) != rate
+
+    with transaction.atomic():
+        if changed:
+            PriceHistory.objects.create(rate=rate)
+        for granularity, _ in GRANULARITIES:
+            _fold_into_candle(granularity, bucket_start(granularity, now), rate)
+
+    cache.set(LAST_RATE_CACHE_KEY, str(rate), None)
+
+    if changed:
+        logger.info(f"Recorded AgroCoin rate change: 1 AC = ₦{rate}")
+    return changed
+
+
+def choose_granularity(start, end, points=DEFAULT_POINTS):
+    """
+    Pick the finest bucket size that covers [start, end) in at most `points` buckets
+
+    Returns:
+        tuple: (granularity, merge_factor) where merge_factor > 1 means adjacent
+        weekly buckets must be merged to stay within `points`
+    """
+    span = max(end - start, timedelta(0))
+    for granularity, size in GRANULARITIES:
+        buckets = math.ceil(span / size) or 1
+        if buckets <= points:
+            return granularity, 1
+
+    granularity, size = GRANULARITIES[-1]
+    buckets = math.ceil(span / size)
+    return granularity, math.ceil(buckets / points)
+
+
+def get_price_series(start, end, points=DEFAULT_POINTS):
+    """
+    Get OHLC chart data for [start, end) with at most `points` entries
+
+    Reads only the pre-aggregated buckets of the chosen granularity. Buckets with
+    no observations carry the previous close forward so every point is populated.
+
+    Returns:
+        dict: granularity and list of {timestamp, open, high, low, close}
+    """
+    from blockchain.models import PriceCandle
+
+    points = max(1, min(int(points), MAX_POINTS))
+    granularity, merge_factor = choose_granularity(start, end, points)
+    size = dict(GRANULARITIES)[granularity]
+
+    first_bucket = bucket_start(granularity, start)
+    candles = {
+        c.bucket_start: c
+        for c in PriceCandle.objects.filter(
+            granularity=granularity,
+            bucket_start__gte=first_bucket,
+            bucket_start__lt=end
+        )
+    }
+
+    # Seed carry-forward from the last bucket before the range
+    previous = PriceCandle.objects.filter(
+        granularity=granularity,
+        bucket_start__lt=first_bucket
+    ).order_by('-bucket_start').values_list('close', flat=True).first()
+
+    series = []
+    cursor = first_bucket
+    while cursor < end:
+        candle = candles.get(cursor)
+        if candle:
+            entry = [cursor, candle.open, candle.high, candle.low, candle.close]
+            previous = candle.close
+        elif previous is not None:
+            entry = [cursor, previous, previous, previous, previous]
+        else:
+            entry = None
+
+        if entry:
+            series.append(entry)
+        cursor += size
+
+    if merge_factor > 1:
+        merged = []
+        for i in range(0, len(series), merge_factor):
+            group = series[i:i + merge_factor]
+            merged.append([
+                group[0][0],
+                group[0][1],
+                max(e[2] for e in group),
+                min(e[3] for e in group),
+                group[-1][4],
+            ])
+        series = merged
+
+    return {
+        'granularity': granularity,
+        'bucket_seconds': int(size.total_seconds()) * merge_factor,
+        'points': [
+            {
+                'timestamp': ts.isoformat(),
+                'open': float(o),
+                'high': float(h),
+                'low': float(l),
+                'close': float(c),
+            }
+            for ts, o, h, l, c in series
+        ]
+    }
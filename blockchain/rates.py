@@ -0,0 +1,202 @@
+"""
+AgroMentor 360 - AgroCoin Rate Provider
+Single source of the AgroCoin to Naira rate and bulk repricing of stored Naira values
+
+The current rate is the latest PriceHistory tick (the configured rate until
+one exists). It is shared through the cache with a version number (the
+tick's id) and held in-process for LOCAL_TTL seconds, so model saves and
+serializers read it without a query.
+
+Naira columns are display copies of AgroCoin amounts. When the rate changes,
+reprice_naira_values rewrites them with one UPDATE per chunk of rows per
+table instead of re-saving each row.
+"""
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Value, DecimalField
+from decimal import Decimal
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+RATE_CACHE_KEY = 'agrocoin_rate'
+LOCAL_TTL = 30                    # Seconds a process trusts its copy of the rate
+REPRICE_CHUNK_SIZE = 2000
+
+# Tables holding Naira copies of AgroCoin amounts:
+# (model, {naira_field: agrocoin_field}, filter)
+# Settled records (paid orders, investments, transactions) keep the rate
+# they were made at and are not listed here.
+REPRICE_TARGETS = [
+    ('marketplace.Product', {'price_naira': 'price_agrocoin'}, {}),
+    ('marketplace.Order', {'subtotal_naira': 'subtotal_ac', 'total_naira': 'total_ac'}, {'status': 'pending'}),
+    ('marketplace.Cart', {'total_naira': 'total_ac'}, {}),
+    ('blockchain.Wallet', {'naira_equivalent': 'agrocoin_balance'}, {}),
+    ('experts.ExpertProfile', {'consultation_fee_naira': 'consultation_fee_ac'}, {}),
+    (
+        'investments.InvestmentOpportunity',
+        {'target_amount_naira': 'target_amount_ac', 'minimum_investment_naira': 'minimum_investment_ac'},
+        {'status': 'open'}
+    ),
+    (
+        'investments.Portfolio',
+        {'total_invested_naira': 'total_invested_ac', 'total_returns_naira': 'total_returns_ac'},
+        {}
+    ),
+]
+
+_local = {'rate': None, 'version': None, 'expires': 0.0}
+
+
+def _configured_rate():
+    return Decimal(str(settings.ETHEREUM_CONFIG['AGROCOIN_TO_NAIRA_RATE']))
+
+
+def _load_shared():
+    """
+    Current {'rate', 'version'} from the cache, seeded from PriceHistory
+    """
+    data = cache.get(RATE_CACHE_KEY)
+    if data is not None:
+        return data
+
+    from blockchain.models import PriceHistory
+
+    latest = PriceHistory.objects.order_by('-timestamp', '-id').values('id', 'rate').first()
+    if latest:
+        data = {'rate': str(latest['rate']), 'version': latest['id']}
+    else:
+        data = {'rate': str(_configured_rate()), 'version': 0}
+
+    cache.set(RATE_CACHE_KEY, data, None)
+    return data
+
+
+def _snapshot():
+    now = time.monotonic()
+    if _local['rate'] is None or now >= _local['expires']:
+        try:
+            data = _load_shared()
+        except Exception as e:
+            # Keep serving the last known (or configured) rate
+            logger.error(f"Error loading AgroCoin rate: {str(e)}")
+            if _local['rate'] is None:
+                data = {'rate': str(_configured_rate()), 'version': 0}
+            else:
+                data = {'rate': str(_local['rate']), 'version': _local['version']}
+        _local.update(
+            rate=Decimal(data['rate']),
+            version=data['version'],
+            expires=now + LOCAL_TTL
+        )
+    return _local['rate'], _local['version']
+
+
+def get_rate():
+    """
+    Current AgroCoin to Naira rate (1 AC = X NGN)
+
+    Returns:
+        Decimal
+    """
+    return _snapshot()[0]
+
+
+def get_rate_version():
+    """
+    Version of the current rate; changes whenever the rate does
+    """
+    return _snapshot()[1]
+
+
+def clear_local():
+    """Forget this process' copy of the rate"""
+    _local.update(rate=None, version=None, expires=0.0)
+
+
+def set_rate(rate, force=False):
+    """
+    Record a rate observation and, if the rate changed, publish it and
+    queue repricing of stored Naira values
+
+    Returns:
+        bool: True if the rate changed
+    """
+    from blockchain.models import PriceHistory
+    from blockchain.price_service import record_rate
+
+    changed = record_rate(rate, force=force)
+    if not changed:
+        return False
+
+    latest = PriceHistory.objects.order_by('-timestamp', '-id').values('id', 'rate').first()
+    cache.set(RATE_CACHE_KEY, {'rate': str(latest['rate']), 'version': latest['id']}, None)
+    clear_local()
+
+    from blockchain.tasks import reprice_naira_values
+    version = latest['id']
+    transaction.on_commit(lambda: reprice_naira_values.delay(version))
+    return True
+
+
+def _reprice_table(model, fields, filters, rate, version, chunk_size):
+    """
+    Rewrite one table's Naira columns in primary-key chunks
+
+    Returns:
+        int or None: Rows updated, or None if the rate moved on mid-run
+    """
+    rate_value = Value(rate, output_field=DecimalField(max_digits=12, decimal_places=2))
+    assignments = {naira: F(ac) * rate_value for naira, ac in fields.items()}
+
+    queryset = model.objects.filter(**filters).order_by('pk')
+    updated = 0
+    last_pk = None
+
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        pks = list(page.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return updated
+
+        if version is not None and _load_shared()['version'] != version:
+            return None
+
+        updated += model.objects.filter(pk__in=pks).update(**assignments)
+        last_pk = pks[-1]
+
+
+def reprice_naira_values(version=None, chunk_size=REPRICE_CHUNK_SIZE):
+    """
+    Rewrite every stored Naira value from its AgroCoin amount at the current rate
+
+    Args:
+        version: Rate version the job was queued for. The job stops early if
+            a newer rate is published; that rate has its own job queued.
+
+    Returns:
+        dict: Rows updated per table, or {'status': 'superseded'}
+    """
+    data = _load_shared()
+    if version is not None and data['version'] != version:
+        return {'status': 'superseded'}
+    rate = Decimal(data['rate'])
+
+    counts = {}
+    for label, fields, filters in REPRICE_TARGETS:
+        updated = _reprice_table(apps.get_model(label), fields, filters, rate, version, chunk_size)
+        if updated is None:
+            return {'status': 'superseded'}
+        counts[label] = updated
+
+    # Cached catalogue responses embed Naira prices
+    from marketplace.cache import bump_versions, version_key
+    bump_versions([version_key('rate')])
+
+    logger.info(f"Repriced Naira values at 1 AC = ₦{rate}: {counts}")
+    return {'status': 'success', 'rate': str(rate), 'updated': counts}
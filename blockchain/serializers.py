@@ -5,6 +5,7 @@ Serializers for wallet, transactions, and token operations
 
 from rest_framework import serializers
 from .models import Wallet, Transaction, TokenPurchase, PriceHistory
+from .rates import get_rate
 from django.conf import settings
 from decimal import Decimal
 
@@ -24,7 +25,7 @@ class WalletSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'public_key', 'created_at']
     
     def get_conversion_rate(self, obj):
-        return float(settings.ETHEREUM_CONFIG['AGROCOIN_TO_NAIRA_RATE'])
+        return float(get_rate())
     
     def get_network(self, obj):
         return settings.ETHEREUM_CONFIG['NETWORK']
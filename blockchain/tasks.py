@@ -3,6 +3,7 @@ from django.utils import timezone
 from django.conf import settings
 from django.core.cache import cache
 from django.db import models
+from django.db import transaction as db_transaction
 from decimal import Decimal
 import logging
 from datetime import timedelta
@@ -24,10 +25,14 @@ def sync_pending_transactions(self):
             logger.info("Blockchain sync skipped (demo mode or disabled)")
             return {'status': 'skipped', 'reason': 'demo_mode'}
         
+        from blockchain.outbox import enqueue_confirmation_events
+        
         # Get pending transactions (last 24 hours to avoid old stuck txs)
         pending_txs = Transaction.objects.filter(
             status__in=['pending', 'processing'],
             created_at__gte=timezone.now() - timedelta(hours=24)
+        ).select_related(
+            'from_wallet__user', 'to_wallet__user'
         ).order_by('-created_at')[:50]  # Batch limit
         
         if not pending_txs:
@@ -47,34 +52,48 @@ def sync_pending_transactions(self):
                 # Verify transaction on blockchain
                 verification = ethereum_service.verify_transaction(tx.ethereum_tx_hash)
                 
-                if verification.get('confirmed'):
+                if verification.get('confirmed') and tx.transaction_type == 'investment':
+                    # Settlement lost track of it; also credits the farm owner
+                    from investments.funding import confirm_payment
+                    
+                    if confirm_payment(
+                        tx.id,
+                        block_number=verification.get('block_number'),
+                        gas_used=verification.get('gas_used')
+                    ):
+                        confirmed_count += 1
+                
+                elif verification.get('confirmed'):
                     # Transaction confirmed
                     tx.status = 'confirmed'
                     tx.confirmed_at = timezone.now()
                     tx.block_number = verification.get('block_number')
                     tx.gas_used = verification.get('gas_used')
-                    tx.save(update_fields=['status', 'confirmed_at', 'block_number', 'gas_used'])
                     
-                    confirmed_count += 1
+                    # Post-confirmation side effects are committed with the status change
+                    with db_transaction.atomic():
+                        tx.save(update_fields=['status', 'confirmed_at', 'block_number', 'gas_used'])
+                        enqueue_confirmation_events([tx])
                     
-                    # Trigger post-confirmation tasks
-                    process_confirmed_transaction.delay(str(tx.id)) # type: ignore
+                    confirmed_count += 1
                 
                 elif verification.get('status') == 'failed':
-                    # Transaction failed
-                    tx.status = 'failed'
-                    tx.save(update_fields=['status'])
-                    
-                    failed_count += 1
-                    
-                    # Handle failed transaction
-                    handle_failed_transaction.delay(str(tx.id)) # type: ignore
+                    # Transaction failed, unless settlement already failed it
+                    if Transaction.objects.filter(id=tx.id, status=tx.status).update(status='failed'):
+                        failed_count += 1
+                        
+                        # Handle failed transaction
+                        handle_failed_transaction.delay(str(tx.id)) # type: ignore
                 
                 synced_count += 1
             
             except Exception as e:
                 logger.error(f"Error syncing transaction {tx.id}: {str(e)}")
         
+        # One dispatcher run for the whole batch of confirmations
+        if confirmed_count:
+            dispatch_outbox_events.delay() # type: ignore
+        
         logger.info(f"Synced {synced_count} transactions: {confirmed_count} confirmed, {failed_count} failed")
         return {
             'synced': synced_count,
@@ -91,42 +110,55 @@ def sync_pending_transactions(self):
 def process_confirmed_transaction(transaction_id):
     """
     Process actions after transaction confirmation
-    Send notifications and update related records
+    Writes the transaction's side effects to the outbox and dispatches them
     """
     try:
         from blockchain.models import Transaction
-        from notifications.tasks import send_sms_notification
+        from blockchain.outbox import enqueue_confirmation_events
         
         tx = Transaction.objects.select_related('from_wallet__user', 'to_wallet__user').get(id=transaction_id)
         
-        # FIX: Safe access to hash. Use empty string if None to prevent "None is not subscriptable" error
-        tx_hash_display = (tx.ethereum_tx_hash or "")[:10]
-
-        # Send confirmation notification
-        if tx.from_wallet:
-            message = f"✅ Transaction confirmed! {tx.amount} AC sent successfully. TxHash: {tx_hash_display}..."
-            send_sms_notification.delay(tx.from_wallet.user.phone_number, message) # type: ignore
-        
-        if tx.to_wallet:
-            message = f"✅ You received {tx.amount} AC! TxHash: {tx_hash_display}..."
-            send_sms_notification.delay(tx.to_wallet.user.phone_number, message) # type: ignore
-        
-        # Update related records based on transaction type
-        if tx.transaction_type == 'marketplace_purchase':
-            update_marketplace_order.delay(transaction_id) # type: ignore
-        elif tx.transaction_type == 'investment':
-            update_investment_record.delay(transaction_id) # type: ignore
-        elif tx.transaction_type == 'expert_payment':
-            notify_expert_payment.delay(transaction_id) # type: ignore
+        with db_transaction.atomic():
+            queued = enqueue_confirmation_events([tx])
+            db_transaction.on_commit(lambda: dispatch_outbox_events.delay()) # type: ignore
         
         logger.info(f"Processed confirmed transaction {transaction_id}")
-        return {'status': 'processed'}
+        return {'status': 'processed', 'events': queued}
     
     except Exception as e:
         logger.error(f"Error processing confirmed transaction {transaction_id}: {str(e)}")
         return {'status': 'failed', 'error': str(e)}
 
 
+@shared_task(bind=True, max_retries=3)
+def dispatch_outbox_events(self):
+    """
+    Drain pending outbox events in batches
+    Triggered after confirmations and every minute via Celery Beat to recover from crashes
+    """
+    try:
+        from blockchain.outbox import dispatch_batch, DISPATCH_BATCH_SIZE
+        
+        totals = {'dispatched': 0, 'failed': 0}
+        
+        while True:
+            result = dispatch_batch()
+            dispatched = sum(result['dispatched'].values())
+            totals['dispatched'] += dispatched
+            totals['failed'] += result['failed']
+            
+            if dispatched + result['failed'] < DISPATCH_BATCH_SIZE:
+                break
+        
+        if totals['dispatched'] or totals['failed']:
+            logger.info(f"Outbox dispatch: {totals['dispatched']} dispatched, {totals['failed']} failed")
+        return totals
+    
+    except Exception as e:
+        logger.error(f"Error in dispatch_outbox_events: {str(e)}")
+        raise self.retry(exc=e, countdown=30)
+
+
 @shared_task
 def handle_failed_transaction(transaction_id):
     """
@@ -139,7 +171,11 @@ def handle_failed_transaction(transaction_id):
         tx = Transaction.objects.select_related('from_wallet__user').get(id=transaction_id)
         
         # Refund the amount to sender's wallet (if applicable)
-        if tx.from_wallet and tx.transaction_type != 'purchase':
+        if tx.transaction_type == 'investment':
+            # Also gives back the funding the investment reserved
+            from investments.funding import release_investment
+            release_investment(tx.id)
+        elif tx.from_wallet and tx.transaction_type != 'purchase':
             tx.from_wallet.add_balance(tx.amount)
             logger.info(f"Refunded {tx.amount} AC to wallet {tx.from_wallet.public_key}")
         
@@ -246,23 +282,14 @@ def update_marketplace_order(transaction_id):
     Update marketplace order after successful payment
     """
     try:
-        from blockchain.models import Transaction
-        from marketplace.models import Order
-        
-        tx = Transaction.objects.get(id=transaction_id)
+        from blockchain.outbox import mark_orders_paid
         
-        # Find related order
-        order = Order.objects.filter(
-            payment_transaction=tx
-        ).first()
+        with db_transaction.atomic():
+            orders = mark_orders_paid([transaction_id])
         
-        if order:
-            order.status = 'paid'
-            order.paid_at = timezone.now()
-            order.save(update_fields=['status', 'paid_at'])
-            
-            logger.info(f"Updated order {order.order_number} to paid status")
-            return {'status': 'updated', 'order_id': str(order.id)}
+        if orders:
+            logger.info(f"Updated order {orders[0].order_number} to paid status")
+            return {'status': 'updated', 'order_id': str(orders[0].id)}
         
         return {'status': 'no_order_found'}
     
@@ -277,28 +304,14 @@ def update_investment_record(transaction_id):
     Update investment record after successful payment
     """
     try:
-        from blockchain.models import Transaction
-        from investments.models import Investment
-        
-        tx = Transaction.objects.get(id=transaction_id)
+        from blockchain.outbox import activate_investments
         
-        # Find related investment
-        investment = Investment.objects.filter(
-            payment_transaction=tx
-        ).first()
+        with db_transaction.atomic():
+            investments = activate_investments([transaction_id])
         
-        if investment:
-            investment.status = 'active'
-            investment.save(update_fields=['status'])
-            
-            # Update opportunity funding
-            opportunity = investment.opportunity
-            opportunity.current_amount_ac += investment.amount_ac
-            opportunity.total_investors += 1
-            opportunity.save()
-            
-            logger.info(f"Updated investment {investment.id} to active status")
-            return {'status': 'updated', 'investment_id': str(investment.id)}
+        if investments:
+            logger.info(f"Updated investment {investments[0].id} to active status")
+            return {'status': 'updated', 'investment_id': str(investments[0].id)}
         
         return {'status': 'no_investment_found'}
     
@@ -336,33 +349,45 @@ def notify_expert_payment(transaction_id):
 def record_price_history():
     """
     Record AgroCoin to Naira conversion rate history
-    Runs daily for historical tracking
+    Writes a tick only when the rate has changed and keeps OHLC buckets current;
+    a change also reprices stored Naira values
     """
     try:
-        from blockchain.models import PriceHistory
+        from blockchain.rates import set_rate
         
         # Safely get rate or default to 1000
         rate_config = getattr(settings, 'ETHEREUM_CONFIG', {}).get('AGROCOIN_TO_NAIRA_RATE', 1000)
         current_rate = Decimal(str(rate_config))
         
-        # Check if rate already recorded today
-        today = timezone.now().date()
-        exists = PriceHistory.objects.filter(
-            timestamp__date=today
-        ).exists()
-        
-        if not exists:
-            PriceHistory.objects.create(rate=current_rate)
-            logger.info(f"Recorded price history: 1 AC = ₦{current_rate}")
-            return {'status': 'recorded', 'rate': float(current_rate)}
+        # Publishes the rate and queues repricing when it has changed
+        changed = set_rate(current_rate)
         
-        return {'status': 'already_recorded'}
+        return {
+            'status': 'recorded' if changed else 'unchanged',
+            'rate': float(current_rate)
+        }
     
     except Exception as e:
         logger.error(f"Error recording price history: {str(e)}")
         return {'status': 'error', 'error': str(e)}
 
 
+@shared_task
+def reprice_naira_values(version=None):
+    """
+    Rewrite stored Naira values after an AgroCoin rate change
+    Queued by blockchain.rates.set_rate; one run covers every table
+    """
+    try:
+        from blockchain.rates import reprice_naira_values as reprice
+        
+        return reprice(version)
+    
+    except Exception as e:
+        logger.error(f"Error repricing Naira values: {str(e)}")
+        return {'status': 'error', 'error': str(e)}
+
+
 @shared_task
 def cleanup_old_transactions():
     """
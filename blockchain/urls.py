@@ -12,6 +12,7 @@ urlpatterns = [
     path('purchase-tokens/', views.purchase_tokens, name='purchase-tokens'),
     path('transfer/', views.transfer_tokens, name='transfer-tokens'),
     path('conversion-rate/', views.get_conversion_rate, name='conversion-rate'),
+    path('price-history/', views.price_history, name='price-history'),
     
     # Transaction management
     path('transactions/', views.transaction_history, name='transaction-history'),
@@ -4,11 +4,15 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.db import transaction as db_transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.conf import settings
 from django.db.models import Sum
 from .models import Wallet, Transaction, TokenPurchase, PriceHistory
 from .ethereum_service import ethereum_service
+from .price_service import get_price_series, DEFAULT_POINTS
+from .rates import get_rate
 from decimal import Decimal
+from datetime import timedelta
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,7 +30,7 @@ def get_wallet(request):
         wallet = request.user.wallet
         
         # Get current conversion rate
-        conversion_rate = Decimal(str(settings.ETHEREUM_CONFIG['AGROCOIN_TO_NAIRA_RATE']))
+        conversion_rate = get_rate()
         
         # Sync blockchain balance if enabled
         if settings.ENABLE_WEB3 and not settings.DEMO_MODE:
@@ -83,7 +87,7 @@ def purchase_tokens(request):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         # Calculate AgroCoin amount
-        conversion_rate = Decimal(str(settings.ETHEREUM_CONFIG['AGROCOIN_TO_NAIRA_RATE']))
+        conversion_rate = get_rate()
         agrocoin_amount = naira_amount / conversion_rate
         
         # Generate payment reference
@@ -222,7 +226,7 @@ def transfer_tokens(request):
             )
             
             # Calculate Naira value
-            conversion_rate = Decimal(str(settings.ETHEREUM_CONFIG['AGROCOIN_TO_NAIRA_RATE']))
+            conversion_rate = get_rate()
             naira_value = amount * conversion_rate
             
             # Create transaction record
@@ -348,7 +352,7 @@ def get_conversion_rate(request):
     
     GET /api/v1/blockchain/conversion-rate/
     """
-    conversion_rate = Decimal(str(settings.ETHEREUM_CONFIG['AGROCOIN_TO_NAIRA_RATE']))
+    conversion_rate = get_rate()
     
     # Get recent rate history
     history = PriceHistory.objects.all()[:10]
@@ -370,6 +374,55 @@ def get_conversion_rate(request):
     }, status=status.HTTP_200_OK)
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def price_history(request):
+    """
+    Get AgroCoin to Naira OHLC chart data for a time range
+    Served from pre-aggregated hourly/daily/weekly buckets
+    
+    GET /api/v1/blockchain/price-history/?start=2025-01-01T00:00:00Z&end=2025-02-01T00:00:00Z&points=120
+    """
+    end = timezone.now()
+    start = None
+    
+    try:
+        if request.query_params.get('end'):
+            end = parse_datetime(request.query_params['end'])
+        if request.query_params.get('start'):
+            start = parse_datetime(request.query_params['start'])
+        elif end:
+            # Default window is the 30 days up to the requested end
+            start = end - timedelta(days=30)
+        points = int(request.query_params.get('points', DEFAULT_POINTS))
+    except ValueError:
+        start = end = None
+        points = 0
+    
+    if not start or not end or points < 1:
+        return Response({
+            'error': 'Invalid start, end or points parameter'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if timezone.is_naive(start):
+        start = timezone.make_aware(start)
+    if timezone.is_naive(end):
+        end = timezone.make_aware(end)
+    
+    if start >= end:
+        return Response({
+            'error': 'start must be before end'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    series = get_price_series(start, end, points)
+    
+    return Response({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        **series
+    }, status=status.HTTP_200_OK)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def verify_transaction(request):
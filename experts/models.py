@@ -9,6 +9,8 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
 import uuid
 
+from blockchain.rates import get_rate
+
 class Expert(models.Model):
     """
     Agricultural expert profile for providing consultations
@@ -129,7 +131,7 @@ class ExpertProfile(models.Model):
     
     def save(self, *args, **kwargs):
         """Auto-calculate Naira fee"""
-        conversion_rate = Decimal(str(settings.ETHEREUM_CONFIG['AGROCOIN_TO_NAIRA_RATE']))
+        conversion_rate = get_rate()
         self.consultation_fee_naira = self.consultation_fee_ac * conversion_rate
         super().save(*args, **kwargs)
 
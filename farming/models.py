@@ -52,6 +52,13 @@ class Farm(models.Model):
     address = models.TextField()
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    geohash = models.CharField(
+        max_length=12,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Geohash of latitude/longitude for proximity search"
+    )
     
     # Soil information
     soil_type = models.CharField(
@@ -78,6 +85,11 @@ class Farm(models.Model):
     
     # Farm images
     cover_image = models.ImageField(upload_to='farms/covers/', null=True, blank=True)
+    cover_image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Resized WebP/JPEG copies of cover_image (see utils.images)"
+    )
     
     # Status
     is_active = models.BooleanField(default=True)
@@ -98,12 +110,64 @@ class Farm(models.Model):
         indexes = [
             models.Index(fields=['owner', 'is_active']),
             models.Index(fields=['city', 'state']),
+            models.Index(fields=['is_active', 'geohash']),
         ]
     crops: models.Manager['Crop']
     
     def __str__(self):
         return f"{self.name} - {self.owner.get_full_name()}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Coordinates as loaded, to tell which products still follow the farm
+        instance._loaded_point = (instance.__dict__.get('latitude'), instance.__dict__.get('longitude'))
+        return instance
+    
+    def save(self, *args, **kwargs):
+        """
+        Keep geohash in step with coordinates, move the farm's products that
+        still share its old coordinates, and queue cover image derivatives
+        for a new upload
+        """
+        from utils.geo import encode_geohash
+        
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = None
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        
+        super().save(*args, **kwargs)
+        
+        previous = getattr(self, '_loaded_point', (None, None))
+        self._loaded_point = (self.latitude, self.longitude)
+        
+        if (update_fields is None or {'latitude', 'longitude'} & set(update_fields)) and previous != self._loaded_point:
+            from django.db.models import Q
+            from marketplace.models import Product
+            from marketplace.cache import invalidate_products
+            
+            # Products placed by their seller keep their own coordinates
+            follows_farm = Q(latitude__isnull=True) | Q(longitude__isnull=True)
+            if None not in previous:
+                follows_farm |= Q(latitude=previous[0], longitude=previous[1])
+            
+            moved = Product.objects.filter(follows_farm, farm=self).only('id', 'category', 'seller_id')
+            invalidate_products(list(moved))
+            moved.update(
+                latitude=self.latitude,
+                longitude=self.longitude,
+                geohash=self.geohash
+            )
+        
+        from utils.images import schedule_derivatives
+        from .tasks import generate_farm_cover_images
+        schedule_derivatives(self, 'cover_image', 'cover_image_variants', generate_farm_cover_images, update_fields)
+    
     @property
     def total_crops(self):
         return self.crops.exclude(status__in=['failed', 'harvested']).count()
@@ -323,6 +387,11 @@ class DiseaseDetection(models.Model):
     
     # Image analysis
     image = models.ImageField(upload_to='disease_detection/')
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Resized WebP/JPEG copies of image (see utils.images)"
+    )
     
     # AI Detection results
     disease_name = models.CharField(max_length=200, null=True, blank=True)
@@ -360,6 +429,13 @@ class DiseaseDetection(models.Model):
     
     def __str__(self):
         return f"Disease detection for {self.crop.name} - {self.disease_name or 'Analyzing'}"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        
+        from utils.images import schedule_derivatives
+        from .tasks import generate_detection_images
+        schedule_derivatives(self, 'image', 'image_variants', generate_detection_images, kwargs.get('update_fields'))
 
 
 class WeatherAlert(models.Model):
@@ -5,6 +5,7 @@ AgroMentor 360 - Farming Serializers
 from rest_framework import serializers
 from .models import Farm, Crop, FarmTask, WeatherAlert, DiseaseDetection
 from accounts.serializers import UserProfileSerializer
+from utils.images import ImageVariantsField
 
 
 class FarmSerializer(serializers.ModelSerializer):
@@ -21,6 +22,24 @@ class FarmSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'owner', 'created_at', 'updated_at']
 
 
+class NearbyFarmSerializer(serializers.ModelSerializer):
+    """
+    Public farm card for proximity search results
+    """
+    owner_name = serializers.CharField(source='owner.get_full_name', read_only=True)
+    distance_km = serializers.FloatField(read_only=True)
+    cover_images = ImageVariantsField('cover_image', 'cover_image_variants')
+    
+    class Meta: #type:ignore
+        model = Farm
+        fields = [
+            'id', 'name', 'owner_name', 'farm_type', 'size',
+            'city', 'state', 'latitude', 'longitude', 'cover_images',
+            'is_verified', 'open_for_investment', 'distance_km'
+        ]
+        read_only_fields = fields
+
+
 class CropSerializer(serializers.ModelSerializer):
     farm_name = serializers.CharField(source='farm.name', read_only=True)
     days_to_harvest = serializers.IntegerField(read_only=True)
@@ -65,11 +84,12 @@ class WeatherDataSerializer(serializers.ModelSerializer):
 
 class DiseaseDetectionSerializer(serializers.ModelSerializer):
     crop_name = serializers.CharField(source='crop.crop_type', read_only=True)
+    images = ImageVariantsField('image', 'image_variants')
     
     class Meta: #type:ignore
         model = DiseaseDetection
         fields = [
-            'id', 'crop', 'crop_name', 'image', 'disease_name',
+            'id', 'crop', 'crop_name', 'image', 'images', 'disease_name',
             'confidence', 'recommendations', 'status', 'detected_at'
         ]
         read_only_fields = ['id', 'detected_at']
@@ -80,11 +100,12 @@ class FarmDetailSerializer(serializers.ModelSerializer):
     crops = CropSerializer(many=True, read_only=True)
     tasks = FarmTaskSerializer(many=True, read_only=True)
     recent_weather = WeatherDataSerializer(source='weather_data.first', read_only=True)
+    cover_images = ImageVariantsField('cover_image', 'cover_image_variants')
     
     class Meta: #type:ignore
         model = Farm
         fields = [
-            'id', 'owner', 'name', 'location', 'size', 'latitude', 'longitude',
+            'id', 'owner', 'name', 'location', 'size', 'latitude', 'longitude', 'cover_images',
             'description', 'crops', 'tasks', 'recent_weather', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
\ No newline at end of file
@@ -0,0 +1,56 @@
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def generate_farm_cover_images(farm_id):
+    """
+    Generate resized WebP/JPEG copies of a farm's cover image
+    Queued when a farm is saved with a new cover image
+    """
+    try:
+        from farming.models import Farm
+        from utils.images import refresh_derivatives
+        
+        farm = Farm.objects.filter(id=farm_id).only(
+            'id', 'cover_image', 'cover_image_variants'
+        ).first()
+        if farm is None:
+            return {'status': 'missing'}
+        
+        variants = refresh_derivatives(farm, 'cover_image', 'cover_image_variants')
+        if variants is None:
+            return {'status': 'skipped'}
+        return {'status': 'success', 'widths': sorted(variants['webp'], key=int)}
+    
+    except Exception as e:
+        logger.error(f"Error generating cover images for farm {farm_id}: {str(e)}")
+        return {'error': str(e)}
+
+
+@shared_task
+def generate_detection_images(detection_id):
+    """
+    Generate resized WebP/JPEG copies of a disease detection photo
+    Queued when a detection is saved with a new image
+    """
+    try:
+        from farming.models import DiseaseDetection
+        from utils.images import refresh_derivatives
+        
+        detection = DiseaseDetection.objects.filter(id=detection_id).only(
+            'id', 'image', 'image_variants'
+        ).first()
+        if detection is None:
+            return {'status': 'missing'}
+        
+        variants = refresh_derivatives(detection, 'image', 'image_variants')
+        if variants is None:
+            return {'status': 'skipped'}
+        return {'status': 'success', 'widths': sorted(variants['webp'], key=int)}
+    
+    except Exception as e:
+        logger.error(f"Error generating images for detection {detection_id}: {str(e)}")
+        return {'error': str(e)}
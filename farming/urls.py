@@ -11,6 +11,7 @@ urlpatterns = [
     # Farms
     path('farms/', views.farm_list, name='farm-list'),
     path('farms/create/', views.create_farm, name='create-farm'),
+    path('farms/nearby/', views.nearby_farms, name='nearby-farms'),
     path('farms/<uuid:pk>/', views.farm_detail, name='farm-detail'),
     
     # Crops
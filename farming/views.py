@@ -2,14 +2,17 @@ from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes, parser_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 from typing import Dict, Any # Added for type hinting
 
 from .models import Farm, Crop, FarmTask
+from utils.geo import nearby, parse_point
+
 from .serializers import (
     FarmSerializer, 
+    NearbyFarmSerializer,
     CropSerializer, 
     FarmTaskSerializer,
 )
@@ -26,6 +29,27 @@ def farm_list(request):
     serializer = FarmSerializer(farms, many=True)
     return Response(serializer.data)
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def nearby_farms(request):
+    """
+    Active farms within a radius, nearest first
+    GET /api/v1/farming/farms/nearby/?lat=9.08&lon=7.49&radius_km=30&open_for_investment=true
+    """
+    params = request.query_params
+    try:
+        lat, lon, radius_km = parse_point(params.get('lat'), params.get('lon'), params.get('radius_km'))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    farms = Farm.objects.filter(is_active=True).select_related('owner')
+    if params.get('open_for_investment') == 'true':
+        farms = farms.filter(open_for_investment=True)
+
+    results = nearby(farms, lat, lon, radius_km, limit=100)
+    serializer = NearbyFarmSerializer(results, many=True)
+    return Response(serializer.data)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_farm(request):
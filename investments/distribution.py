@@ -0,0 +1,189 @@
+"""
+AgroMentor 360 - Return Distribution
+Splits a return amount across an opportunity's investors in proportion to
+their stakes, exactly to the kobo-equivalent minor unit
+
+Amounts are converted to integer minor units (1 AC = 100) and each share is
+floor(total * stake / total_stake), computed over int64 NumPy arrays (or
+Python integers when the products could overflow). The units left over by
+flooring are handed out one each to the investors with the largest
+remainders, so the payouts always add up to the amount distributed.
+"""
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from decimal import Decimal, InvalidOperation
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+MINOR_UNITS = 100                 # AC amounts have two decimal places
+SYNC_LIMIT = 300                  # Larger distributions run in the background
+WRITE_BATCH_SIZE = 1000
+PROGRESS_TIMEOUT = 24 * 60 * 60
+
+INT64_MAX = np.iinfo(np.int64).max
+
+
+class DistributionError(ValueError):
+    """Raised when returns cannot be distributed"""
+    pass
+
+
+def to_minor(amount):
+    """Decimal AC amount -> integer minor units"""
+    return int(Decimal(amount).quantize(Decimal('0.01')) * MINOR_UNITS)
+
+
+def from_minor(units):
+    return Decimal(units) / MINOR_UNITS
+
+
+def parse_amount(value):
+    """
+    Validate a requested distribution amount
+
+    Raises:
+        DistributionError: If the amount is missing, not a number or not positive
+    """
+    if value in (None, ''):
+        raise DistributionError('Return amount required')
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise DistributionError('Return amount must be a number')
+    if not amount.is_finite() or amount <= 0:
+        raise DistributionError('Return amount must be positive')
+    if amount != amount.quantize(Decimal('0.01')):
+        raise DistributionError('Return amount can have at most 2 decimal places')
+    return amount
+
+
+def allocate(total, weights):
+    """
+    Split `total` integer units in proportion to integer `weights`
+
+    Largest-remainder method: every share is floored, then the leftover
+    units go to the largest remainders (earlier positions win ties).
+
+    Returns:
+        list: Integer shares summing exactly to `total`
+    """
+    if not weights:
+        return []
+    weight_sum = sum(weights)
+    if weight_sum <= 0:
+        raise DistributionError('Investments have no stake to distribute over')
+
+    # int64 while total * weight cannot overflow, Python integers otherwise
+    dtype = np.int64 if total * max(weights) <= INT64_MAX and weight_sum <= INT64_MAX else object
+    stakes = np.array(weights, dtype=dtype)
+
+    products = stakes * total
+    shares, remainders = products // weight_sum, products % weight_sum
+    leftover = total - int(shares.sum())
+
+    order = np.argsort(-remainders, kind='stable')
+    shares[order[:leftover]] += 1
+    return [int(share) for share in shares]
+
+
+def _progress_key(distribution_id):
+    return f'investments:distribution:{distribution_id}:progress'
+
+
+def get_progress(distribution):
+    """
+    Returns:
+        dict: {'processed', 'total'} investors written so far
+    """
+    if distribution.status == 'completed':
+        return {'processed': distribution.investor_count, 'total': distribution.investor_count}
+    progress = cache.get(_progress_key(distribution.id))
+    return progress or {'processed': 0, 'total': distribution.investor_count}
+
+
+def active_investments(opportunity):
+    """Active stakes in the opportunity's farm, oldest first"""
+    from investments.models import FarmInvestment
+
+    # FarmInvestment is linked to the farm, not to the opportunity
+    return FarmInvestment.objects.filter(farm_id=opportunity.farm_id, status='active')
+
+
+def run_distribution(distribution_id):
+    """
+    Create the InvestmentReturn rows of a pending distribution
+
+    All rows are written in one transaction; progress is published to the
+    cache after each batch.
+
+    Returns:
+        int: Number of returns created (0 if the distribution was already run)
+    """
+    from investments.models import InvestmentReturn, ReturnDistribution
+    from investments.portfolio import add_delta, apply_deltas
+
+    try:
+        with transaction.atomic():
+            claimed = ReturnDistribution.objects.filter(
+                pk=distribution_id,
+                status='pending'
+            ).update(status='running')
+            if not claimed:
+                return 0
+
+            distribution = ReturnDistribution.objects.select_related('opportunity').get(pk=distribution_id)
+            stakes = list(
+                active_investments(distribution.opportunity)
+                .order_by('created_at', 'id')
+                .values_list('id', 'amount', 'investor_id')
+            )
+            if not stakes:
+                raise DistributionError('No active investments found')
+
+            shares = allocate(to_minor(distribution.amount), [to_minor(amount) for _, amount, _ in stakes])
+
+            total = len(stakes)
+            created = 0
+            for start in range(0, total, WRITE_BATCH_SIZE):
+                end = start + WRITE_BATCH_SIZE
+                batch = [
+                    InvestmentReturn(
+                        investment_id=investment_id,
+                        amount=from_minor(share),
+                        distribution_date=distribution.distribution_date,
+                        distribution=distribution
+                    )
+                    for (investment_id, _, _), share in zip(stakes[start:end], shares[start:end])
+                    if share
+                ]
+                InvestmentReturn.objects.bulk_create(batch)
+
+                deltas = {}
+                for (_, _, investor_id), share in zip(stakes[start:end], shares[start:end]):
+                    if share:
+                        add_delta(deltas, investor_id, returns=from_minor(share))
+                apply_deltas(deltas)
+                created += len(batch)
+                cache.set(
+                    _progress_key(distribution_id),
+                    {'processed': min(end, total), 'total': total},
+                    PROGRESS_TIMEOUT
+                )
+
+            ReturnDistribution.objects.filter(pk=distribution_id).update(
+                status='completed',
+                investor_count=created,
+                completed_at=timezone.now()
+            )
+
+    except Exception as e:
+        ReturnDistribution.objects.filter(pk=distribution_id).update(status='failed', error=str(e))
+        raise
+
+    logger.info(f"Distributed {distribution.amount} AC to {created} investors ({distribution_id})")
+    return created
@@ -0,0 +1,312 @@
+"""
+AgroMentor 360 - Investment Funding
+Commits investments against the internal ledger and settles them on-chain later
+
+An investment commits in one short transaction with no network calls:
+- the opportunity's funding is reserved with a conditional UPDATE that only
+  matches while current_amount_ac + amount <= target_amount_ac, so two
+  investors racing for the last slot cannot oversubscribe it
+- the investor's wallet is debited with a conditional UPDATE on the ledger
+  balance, which is the balance check
+- the Investment and its pending payment Transaction are written
+
+The token transfer to the farm owner runs in a background task once the
+commit lands. The investment is already active by then. The transfer is
+signed first and its hash recorded before it is sent: a failure up to there
+(or a transfer mined as failed) marks the transaction failed and releases the
+reservation and debit. Any other error leaves the outcome unknown, so the
+transaction stays processing and sync_pending_transactions settles it by hash.
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, When, Value, F, DecimalField, IntegerField
+from django.db.models.functions import Now
+from django.utils import timezone
+from decimal import Decimal, InvalidOperation
+import hashlib
+import logging
+
+from blockchain.rates import get_rate
+
+logger = logging.getLogger(__name__)
+
+
+AMOUNT_FIELD = DecimalField(max_digits=20, decimal_places=2)
+
+
+class FundingError(ValueError):
+    """Raised when an investment cannot be committed"""
+    pass
+
+
+def parse_amount(value):
+    """
+    Raises:
+        FundingError: If the amount is missing, not a number or not positive
+    """
+    if value in (None, ''):
+        raise FundingError('Investment amount required')
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise FundingError('Investment amount must be a number')
+    if not amount.is_finite() or amount <= 0:
+        raise FundingError('Investment amount must be positive')
+    if amount != amount.quantize(Decimal('0.01')):
+        raise FundingError('Investment amount can have at most 2 decimal places')
+    return amount
+
+
+def _reserve(opportunity_id, amount):
+    """
+    Add `amount` to the opportunity's funding unless it would pass the target
+
+    Returns:
+        bool: Whether the funding was reserved
+    """
+    from investments.models import InvestmentOpportunity
+
+    new_amount = F('current_amount_ac') + amount
+    # Conditions inside the UPDATE see the row as it was before it
+    fills_target = When(current_amount_ac__gte=F('target_amount_ac') - amount, then=Value('funded'))
+
+    return bool(InvestmentOpportunity.objects.filter(
+        id=opportunity_id,
+        status='open',
+        current_amount_ac__lte=F('target_amount_ac') - amount
+    ).update(
+        current_amount_ac=new_amount,
+        total_investors=F('total_investors') + 1,
+        funding_percentage=new_amount * 100 / F('target_amount_ac'),
+        status=Case(fills_target, default=Value('open')),
+        funded_at=Case(
+            When(current_amount_ac__gte=F('target_amount_ac') - amount, then=Now()),
+            default=F('funded_at')
+        )
+    ))
+
+
+def _release(opportunity_id, amount):
+    from investments.models import InvestmentOpportunity
+    from investments.milestones import FUNDING_MILESTONES
+
+    new_amount = F('current_amount_ac') - amount
+    # Reopened: the milestone follows the new funding, so filling the target
+    # again announces it and schedules a fresh halfway date
+    reached = [
+        When(status='funded', current_amount_ac__gte=F('target_amount_ac') * milestone / 100 + amount, then=Value(milestone))
+        for milestone in sorted(FUNDING_MILESTONES, reverse=True)
+    ]
+    InvestmentOpportunity.objects.filter(id=opportunity_id).update(
+        current_amount_ac=new_amount,
+        total_investors=F('total_investors') - 1,
+        funding_percentage=new_amount * 100 / F('target_amount_ac'),
+        status=Case(When(status='funded', then=Value('open')), default=F('status')),
+        funded_at=Case(When(status='funded', then=Value(None)), default=F('funded_at')),
+        funding_milestone=Case(
+            *reached, When(status='funded', then=Value(0)),
+            default=F('funding_milestone'),
+            output_field=IntegerField()
+        ),
+        halfway_date=Case(When(status='funded', then=Value(None)), default=F('halfway_date'))
+    )
+
+
+def _move_balance(wallet_id, change, rate, **conditions):
+    from blockchain.models import Wallet
+
+    new_balance = F('agrocoin_balance') + change
+    return Wallet.objects.filter(id=wallet_id, **conditions).update(
+        agrocoin_balance=new_balance,
+        naira_equivalent=new_balance * Value(rate, output_field=AMOUNT_FIELD),
+        updated_at=timezone.now()
+    )
+
+
+def commit_investment(investor, opportunity_id, amount):
+    """
+    Reserve funding, debit the investor's ledger balance and record the
+    investment; on-chain settlement is queued for after the commit
+
+    Returns:
+        Investment: The active investment, with payment_transaction pending
+
+    Raises:
+        FundingError: If the opportunity or wallet cannot take the investment
+    """
+    from investments.models import Investment, InvestmentOpportunity
+    from investments.milestones import check_funding_milestones
+    from investments.portfolio import add_delta, apply_deltas
+    from blockchain.models import Wallet, Transaction
+    from investments.tasks import settle_investment
+
+    opportunity = InvestmentOpportunity.objects.filter(id=opportunity_id).values(
+        'status', 'title', 'minimum_investment_ac', 'target_amount_ac', 'current_amount_ac',
+        'expected_roi_percentage', 'maturity_date', 'farm_owner__wallet__id'
+    ).first()
+    if opportunity is None:
+        raise FundingError('Investment opportunity not found')
+    if opportunity['status'] != 'open':
+        raise FundingError('Investment opportunity is not open')
+    remaining = max(Decimal('0'), opportunity['target_amount_ac'] - opportunity['current_amount_ac'])
+    # Below the minimum is fine when it takes everything left
+    if amount < opportunity['minimum_investment_ac'] and amount != remaining:
+        raise FundingError(f"Minimum investment is {opportunity['minimum_investment_ac']}")
+
+    wallet_id = Wallet.objects.filter(user=investor, is_active=True).values_list('id', flat=True).first()
+    if wallet_id is None:
+        raise FundingError('Create a wallet before investing')
+    if opportunity['farm_owner__wallet__id'] is None:
+        raise FundingError('This farm cannot receive investments yet')
+
+    rate = get_rate()
+
+    with transaction.atomic():
+        if not _reserve(opportunity_id, amount):
+            raise FundingError(f'Investment would exceed funding goal ({remaining} AC remaining)')
+
+        if not _move_balance(wallet_id, -amount, rate, agrocoin_balance__gte=amount):
+            raise FundingError('Insufficient wallet balance')
+
+        payment = Transaction.objects.create(
+            from_wallet_id=wallet_id,
+            to_wallet_id=opportunity['farm_owner__wallet__id'],
+            transaction_type='investment',
+            amount=amount,
+            naira_value=amount * rate,
+            status='pending',
+            description=f"Investment: {opportunity['title']}"
+        )
+        roi = opportunity['expected_roi_percentage'] / Decimal('100')
+        investment = Investment.objects.create(
+            opportunity_id=opportunity_id,
+            investor=investor,
+            amount_ac=amount,
+            expected_return_ac=(amount * (1 + roi)).quantize(Decimal('0.01')),
+            maturity_date=opportunity['maturity_date'],
+            payment_transaction=payment,
+            status='active'
+        )
+
+        apply_deltas(add_delta({}, investor.id, invested=amount, active=1))
+        check_funding_milestones([opportunity_id])
+        transaction.on_commit(lambda: settle_investment.delay(str(payment.id)))
+
+    return investment
+
+
+def settle_payment(transaction_id):
+    """
+    Transfer a committed investment's tokens to the farm owner on-chain
+
+    Returns:
+        str: 'confirmed', 'failed', or 'processing' if the transfer was sent
+            but its outcome is unknown; None if the transaction was not pending
+    """
+    from blockchain.models import Transaction
+    from blockchain.tasks import dispatch_outbox_events, handle_failed_transaction
+
+    # Claim it, so a duplicate task never sends the transfer twice
+    if not Transaction.objects.filter(id=transaction_id, status='pending').update(status='processing'):
+        return None
+
+    tx = Transaction.objects.select_related('from_wallet').get(id=transaction_id)
+
+    def fail(error):
+        logger.error(f"Settlement of investment transaction {transaction_id} failed: {error}")
+        Transaction.objects.filter(id=transaction_id, status='processing').update(status='failed')
+        handle_failed_transaction.delay(str(transaction_id)) # type: ignore
+        return 'failed'
+
+    if settings.DEMO_MODE or not settings.ENABLE_WEB3:
+        tx_hash = '0x' + hashlib.sha256(f'{tx.id}{tx.from_wallet.public_key}{tx.amount}'.encode()).hexdigest()
+    else:
+        from blockchain.ethereum_service import ethereum_service, TransactionReverted
+
+        try:
+            signed_txn = ethereum_service.sign_token_transfer(
+                ethereum_service.decrypt_private_key(tx.from_wallet.encrypted_private_key),
+                tx.to_wallet.public_key,
+                tx.amount
+            )
+        except Exception as e:
+            # Nothing was sent
+            return fail(str(e))
+
+        tx_hash = signed_txn.hash.hex()
+        Transaction.objects.filter(id=transaction_id).update(ethereum_tx_hash=tx_hash)
+
+        try:
+            ethereum_service.send_signed_transaction(signed_txn)
+        except TransactionReverted as e:
+            return fail(str(e))
+        except Exception as e:
+            # May have been broadcast: not retried, left for the sync to
+            # confirm or fail by its hash
+            logger.error(f"Settlement of investment transaction {transaction_id} unresolved: {str(e)}")
+            return 'processing'
+
+    if confirm_payment(transaction_id, ethereum_tx_hash=tx_hash):
+        dispatch_outbox_events.delay() # type: ignore
+    return 'confirmed'
+
+
+def confirm_payment(transaction_id, **fields):
+    """
+    Confirm a processing investment payment and credit the farm owner
+
+    Called by settlement and by sync_pending_transactions; only the first call
+    for a transaction does anything. Extra fields (ethereum_tx_hash,
+    block_number, gas_used) are saved with the status.
+
+    Returns:
+        bool: Whether the payment was confirmed by this call
+    """
+    from blockchain.models import Transaction
+    from blockchain.outbox import enqueue_confirmation_events
+
+    with transaction.atomic():
+        if not Transaction.objects.filter(id=transaction_id, status='processing').update(
+            status='confirmed',
+            confirmed_at=timezone.now(),
+            **fields
+        ):
+            return False
+
+        tx = Transaction.objects.select_related('from_wallet__user', 'to_wallet__user').get(id=transaction_id)
+        if tx.to_wallet_id:
+            _move_balance(tx.to_wallet_id, tx.amount, get_rate())
+        enqueue_confirmation_events([tx])
+
+    return True
+
+
+def release_investment(transaction_id):
+    """
+    Undo an investment whose payment failed: cancel it, give back its funding
+    reservation and refund the investor's ledger debit
+
+    Returns:
+        bool: Whether an investment was released
+    """
+    from investments.models import Investment
+    from investments.portfolio import add_delta, apply_deltas
+
+    with transaction.atomic():
+        investment = (
+            Investment.objects.select_for_update()
+            .filter(payment_transaction_id=transaction_id, status='active')
+            .values('id', 'opportunity_id', 'investor_id', 'amount_ac', 'payment_transaction__from_wallet_id')
+            .first()
+        )
+        if investment is None:
+            return False
+
+        Investment.objects.filter(id=investment['id']).update(status='cancelled')
+        _release(investment['opportunity_id'], investment['amount_ac'])
+        _move_balance(investment['payment_transaction__from_wallet_id'], investment['amount_ac'], get_rate())
+        apply_deltas(add_delta({}, investment['investor_id'], invested=-investment['amount_ac'], active=-1))
+
+    logger.info(f"Released investment {investment['id']} after failed payment")
+    return True
@@ -0,0 +1,19 @@
+"""
+AgroMentor 360 - Milestone Backfill
+One-off recording of milestones for opportunities funded before they were tracked
+"""
+
+from django.core.management.base import BaseCommand
+
+from investments.milestones import backfill_milestones
+
+
+class Command(BaseCommand):
+    help = 'Record funding milestones and halfway dates of opportunities funded before they were tracked'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        updated = backfill_milestones(options['database'])
+        self.stdout.write(self.style.SUCCESS(f'Recorded milestones of {updated} opportunities'))
@@ -0,0 +1,161 @@
+"""
+AgroMentor 360 - Investment Maturity
+Pays out matured investments in chunks with set-based updates
+
+Each chunk is claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several
+workers can drain the due investments in parallel without overlapping. A
+chunk's payout transactions, wallet credits and status change commit
+together: an investment leaves 'active' in the same transaction that pays
+it, so a retry never pays twice. Investors are notified with one SMS batch
+task per chunk once it commits.
+"""
+
+from django.db import transaction
+from django.db.models import Case, When, Value, F, DecimalField, UUIDField
+from django.utils import timezone
+from decimal import Decimal
+import logging
+
+from blockchain.rates import get_rate
+
+logger = logging.getLogger(__name__)
+
+
+CHUNK_SIZE = 500
+MAX_PARALLEL_CHUNKS = 8           # Drain tasks queued per run
+
+AMOUNT_FIELD = DecimalField(max_digits=20, decimal_places=2)
+
+
+def due_investments(today=None):
+    """Active investments at or past their maturity date"""
+    from investments.models import Investment
+
+    return Investment.objects.filter(
+        status='active',
+        maturity_date__lte=today or timezone.localdate()
+    )
+
+
+def _by_id(values, output_field=AMOUNT_FIELD):
+    """CASE mapping primary keys to per-row values"""
+    return Case(
+        *[When(pk=pk, then=Value(value)) for pk, value in values.items()],
+        output_field=output_field
+    )
+
+
+def pay_out_chunk(chunk_size=CHUNK_SIZE, today=None):
+    """
+    Claim one chunk of due investments and pay them out
+
+    Returns:
+        dict: Number of investments paid out and AC paid
+    """
+    from investments.models import Investment
+    from blockchain.models import Wallet, Transaction
+    from notifications.tasks import send_sms_batch
+    from investments.portfolio import add_delta, apply_deltas
+
+    rate = get_rate()
+    now = timezone.now()
+
+    with transaction.atomic():
+        claimed = list(
+            due_investments(today)
+            .filter(investor__wallet__isnull=False)
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('maturity_date', 'id')
+            .values(
+                'id', 'investor_id', 'amount_ac', 'expected_return_ac',
+                'opportunity__title', 'investor__phone_number'
+            )[:chunk_size]
+        )
+        if not claimed:
+            return {'paid': 0, 'total_ac': Decimal('0')}
+
+        # Lock wallets in id order so parallel chunks cannot deadlock
+        wallets = dict(
+            Wallet.objects.select_for_update()
+            .filter(user_id__in={row['investor_id'] for row in claimed})
+            .order_by('id')
+            .values_list('user_id', 'id')
+        )
+
+        payouts = [
+            Transaction(
+                to_wallet_id=wallets[row['investor_id']],
+                transaction_type='investment_return',
+                amount=row['expected_return_ac'],
+                naira_value=row['expected_return_ac'] * rate,
+                status='confirmed',
+                description=f"Investment return: {row['opportunity__title']}",
+                confirmed_at=now,
+                metadata={
+                    'investment_id': str(row['id']),
+                    'profit': float(row['expected_return_ac'] - row['amount_ac'])
+                }
+            )
+            for row in claimed
+        ]
+        Transaction.objects.bulk_create(payouts)
+
+        rate_value = Value(rate, output_field=AMOUNT_FIELD)
+        Investment.objects.filter(id__in=[row['id'] for row in claimed]).update(
+            status='paid_out',
+            actual_return_ac=F('expected_return_ac'),
+            actual_return_naira=F('expected_return_ac') * rate_value,
+            payout_transaction_id=_by_id(
+                {row['id']: tx.id for row, tx in zip(claimed, payouts)},
+                output_field=UUIDField()
+            ),
+            paid_out_at=now
+        )
+
+        credits = {}
+        for row in claimed:
+            wallet_id = wallets[row['investor_id']]
+            credits[wallet_id] = credits.get(wallet_id, Decimal('0')) + row['expected_return_ac']
+        new_balance = F('agrocoin_balance') + _by_id(credits)
+        Wallet.objects.filter(id__in=list(credits)).update(
+            agrocoin_balance=new_balance,
+            naira_equivalent=new_balance * rate_value,
+            updated_at=now
+        )
+
+        deltas = {}
+        for row in claimed:
+            add_delta(deltas, row['investor_id'], returns=row['expected_return_ac'], active=-1, matured=1)
+        apply_deltas(deltas)
+
+        messages = [
+            [
+                row['investor__phone_number'],
+                f"🎉 Investment matured! Return: {row['expected_return_ac']} AC "
+                f"(Profit: {row['expected_return_ac'] - row['amount_ac']} AC)"
+            ]
+            for row in claimed
+            if row['investor__phone_number']
+        ]
+        if messages:
+            transaction.on_commit(lambda: send_sms_batch.delay(messages))
+
+    total = sum((row['expected_return_ac'] for row in claimed), Decimal('0'))
+    return {'paid': len(claimed), 'total_ac': total}
+
+
+def drain(chunk_size=CHUNK_SIZE, today=None):
+    """
+    Pay out chunks until no unclaimed due investment is left
+
+    Returns:
+        dict: Totals over all chunks
+    """
+    totals = {'chunks': 0, 'paid': 0, 'total_ac': Decimal('0')}
+    while True:
+        result = pay_out_chunk(chunk_size, today)
+        if not result['paid']:
+            return totals
+        totals['chunks'] += 1
+        totals['paid'] += result['paid']
+        totals['total_ac'] += result['total_ac']
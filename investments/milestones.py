@@ -0,0 +1,149 @@
+"""
+AgroMentor 360 - Investment Milestones
+Funding and timeline milestone notices, detected as they happen
+
+Funding milestones are checked whenever an opportunity's funding changes:
+each opportunity remembers the highest milestone its investors were told
+about, and one conditional UPDATE per milestone claims the opportunities
+whose funding has reached it since. A jump past several milestones sends
+only the highest, and a retry or a second worker claims nothing twice.
+
+The halfway-to-maturity notice is due on a date fixed when the opportunity
+is fully funded. That date is indexed, so the daily run reads only the
+opportunities due that day and clears the date as it claims them.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
+import logging
+
+from .transitions import notify_investors, update_returning
+
+logger = logging.getLogger(__name__)
+
+
+# Funding percentage -> message, checked highest first
+FUNDING_MILESTONES = {
+    100: "{title} is fully funded!",
+    50: "🎯 {title} is 50% funded!",
+}
+
+HALFWAY_MESSAGE = "⏰ {title} is halfway to maturity!"
+HALFWAY_STATUSES = ['funded', 'active']
+
+
+def halfway_date(funded_at, maturity_date):
+    """Midpoint between funding and maturity, or None if already past maturity"""
+    funded_on = timezone.localdate(funded_at) if funded_at else timezone.localdate()
+    days = (maturity_date - funded_on).days
+    if days <= 0:
+        return None
+    return funded_on + timedelta(days=days // 2)
+
+
+def _schedule_halfway(opportunity_ids):
+    from investments.models import InvestmentOpportunity
+
+    opportunities = list(
+        InvestmentOpportunity.objects.filter(id__in=opportunity_ids)
+        .only('id', 'funded_at', 'maturity_date')
+    )
+    for opportunity in opportunities:
+        opportunity.halfway_date = halfway_date(opportunity.funded_at, opportunity.maturity_date)
+    InvestmentOpportunity.objects.bulk_update(opportunities, ['halfway_date'])
+
+
+def check_funding_milestones(opportunity_ids):
+    """
+    Notify investors of funding milestones reached since the last check
+
+    Call after changing the funding of these opportunities, inside the same
+    transaction; notices are sent once it commits.
+
+    Returns:
+        int: Number of messages queued
+    """
+    from investments.models import InvestmentOpportunity
+
+    remaining = set(opportunity_ids)
+    templates = {}
+
+    for milestone in sorted(FUNDING_MILESTONES, reverse=True):
+        if not remaining:
+            break
+        claimed = update_returning(
+            InvestmentOpportunity.objects.filter(
+                id__in=list(remaining),
+                funding_percentage__gte=milestone,
+                funding_milestone__lt=milestone
+            ),
+            funding_milestone=milestone
+        )
+        if milestone == 100 and claimed:
+            _schedule_halfway(claimed)
+        for opportunity_id in claimed:
+            templates[opportunity_id] = FUNDING_MILESTONES[milestone]
+        remaining.difference_update(claimed)
+
+    return notify_investors(templates)
+
+
+def send_due_milestones(today=None):
+    """
+    Notify investors of opportunities that reached halfway to maturity
+
+    Returns:
+        dict: Opportunities claimed and messages queued
+    """
+    from investments.models import InvestmentOpportunity
+
+    with transaction.atomic():
+        claimed = update_returning(
+            InvestmentOpportunity.objects.filter(
+                status__in=HALFWAY_STATUSES,
+                halfway_date__lte=today or timezone.localdate()
+            ),
+            halfway_date=None
+        )
+        notified = notify_investors({opportunity_id: HALFWAY_MESSAGE for opportunity_id in claimed})
+
+    return {'halfway': len(claimed), 'notified': notified}
+
+
+def backfill_milestones(using='default'):
+    """
+    Record the milestones of opportunities funded before they were tracked
+    One-off, run by the backfill_milestones command; nothing is sent, the old
+    polling task already announced these. Halfway dates are set only where
+    the midpoint is ahead.
+
+    Returns:
+        int: Number of opportunities updated
+    """
+    from investments.models import InvestmentOpportunity
+
+    opportunities = InvestmentOpportunity.objects.using(using)
+    today = timezone.localdate()
+
+    with transaction.atomic(using=using):
+        # Fully funded ones: a milestone below 100 means never scheduled
+        funded = list(
+            opportunities.select_for_update()
+            .filter(status__in=HALFWAY_STATUSES, funding_milestone__lt=100)
+            .only('id', 'funded_at', 'maturity_date')
+        )
+        for opportunity in funded:
+            due = halfway_date(opportunity.funded_at, opportunity.maturity_date) if opportunity.funded_at else None
+            opportunity.funding_milestone = 100
+            opportunity.halfway_date = due if due and due > today else None
+        updated = opportunities.bulk_update(funded, ['funding_milestone', 'halfway_date'])
+
+        for milestone in sorted(FUNDING_MILESTONES, reverse=True):
+            updated += opportunities.filter(
+                status='open',
+                funding_percentage__gte=milestone,
+                funding_milestone__lt=milestone
+            ).update(funding_milestone=milestone)
+
+    return updated
@@ -5,6 +5,8 @@ from decimal import Decimal
 from django.utils import timezone
 import uuid
 
+from blockchain.rates import get_rate
+
 class FarmInvestment(models.Model):
     """
     Tracks financial investments made by users into farms or specific crop cycles.
@@ -117,6 +119,15 @@ class InvestmentReturn(models.Model):
     # Optional: Transaction reference if paid on-chain
     transaction_hash = models.CharField(max_length=255, null=True, blank=True)
     
+    # Distribution run that created this return (see investments.distribution)
+    distribution = models.ForeignKey(
+        'ReturnDistribution',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='returns'
+    )
+    
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -127,6 +138,54 @@ class InvestmentReturn(models.Model):
     def __str__(self):
         return f"{self.amount} AC return for {self.investment}"
 
+
+class ReturnDistribution(models.Model):
+    """
+    One distribution of returns across an opportunity's investors
+    Large distributions run in the background; this row reports progress
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    opportunity = models.ForeignKey(
+        'InvestmentOpportunity',
+        on_delete=models.CASCADE,
+        related_name='distributions'
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='return_distributions'
+    )
+    amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        help_text="Total amount distributed in AC"
+    )
+    distribution_date = models.DateField(default=timezone.localdate)
+    
+    # Progress
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    investor_count = models.IntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Return Distribution"
+        verbose_name_plural = "Return Distributions"
+    
+    def __str__(self):
+        return f"{self.amount} AC to {self.investor_count} investors ({self.status})"
+
 class InvestmentOpportunity(models.Model):
     """
     Farm investment opportunities open to investors
@@ -233,6 +292,15 @@ class InvestmentOpportunity(models.Model):
         default=Decimal('0'),
         help_text="Percentage of target funded"
     )
+    funding_milestone = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Highest funding milestone (%) investors were notified of"
+    )
+    halfway_date = models.DateField(
+        null=True,
+        blank=True,
+        help_text="Date the halfway-to-maturity notice is due; cleared once sent"
+    )
     
     # Status
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
@@ -258,6 +326,7 @@ class InvestmentOpportunity(models.Model):
         indexes = [
             models.Index(fields=['status']),
             models.Index(fields=['category']),
+            models.Index(fields=['halfway_date']),
         ]
     
     def __str__(self):
@@ -265,7 +334,7 @@ class InvestmentOpportunity(models.Model):
     
     def save(self, *args, **kwargs):
         """Auto-calculate Naira values and funding percentage"""
-        conversion_rate = Decimal(str(settings.ETHEREUM_CONFIG['AGROCOIN_TO_NAIRA_RATE']))
+        conversion_rate = get_rate()
         self.target_amount_naira = self.target_amount_ac * conversion_rate
         self.minimum_investment_naira = self.minimum_investment_ac * conversion_rate
         
@@ -394,6 +463,8 @@ class Investment(models.Model):
         indexes = [
             models.Index(fields=['investor', 'status']),
             models.Index(fields=['opportunity', 'status']),
+            # Maturity payouts (see investments.maturity)
+            models.Index(fields=['status', 'maturity_date']),
         ]
     
     def __str__(self):
@@ -401,7 +472,7 @@ class Investment(models.Model):
     
     def save(self, *args, **kwargs):
         """Auto-calculate Naira values"""
-        conversion_rate = Decimal(str(settings.ETHEREUM_CONFIG['AGROCOIN_TO_NAIRA_RATE']))
+        conversion_rate = get_rate()
         self.amount_naira = self.amount_ac * conversion_rate
         self.expected_return_naira = self.expected_return_ac * conversion_rate
         
@@ -430,7 +501,7 @@ class Investment(models.Model):
     @property
     def profit_naira(self):
         """Calculate profit in Naira"""
-        conversion_rate = Decimal(str(settings.ETHEREUM_CONFIG['AGROCOIN_TO_NAIRA_RATE']))
+        conversion_rate = get_rate()
         return self.profit_ac * conversion_rate
     
     @property
@@ -547,30 +618,11 @@ class Portfolio(models.Model):
         return f"Portfolio: {self.user.get_full_name()}"
     
     def update_stats(self):
-        """Recalculate portfolio statistics"""
-        from django.db.models import Sum, Count
+        """Recalculate portfolio statistics from the investment tables"""
+        from .portfolio import reconcile_users
         
-        investments = Investment.objects.filter(investor=self.user)
-        
-        # Calculate totals
-        stats = investments.aggregate(
-            total_invested=Sum('amount_ac'),
-            total_returns=Sum('actual_return_ac'),
-            active_count=Count('id', filter=models.Q(status='active')),
-            matured_count=Count('id', filter=models.Q(status__in=['matured', 'paid_out']))
-        )
-        
-        self.total_invested_ac = stats['total_invested'] or Decimal('0')
-        self.total_returns_ac = stats['total_returns'] or Decimal('0')
-        self.active_investments_count = stats['active_count'] or 0
-        self.matured_investments_count = stats['matured_count'] or 0
-        
-        # Calculate Naira equivalents
-        conversion_rate = Decimal(str(settings.ETHEREUM_CONFIG['AGROCOIN_TO_NAIRA_RATE']))
-        self.total_invested_naira = self.total_invested_ac * conversion_rate
-        self.total_returns_naira = self.total_returns_ac * conversion_rate
-        
-        self.save()
+        reconcile_users([self.user_id])
+        self.refresh_from_db()
     
     @property
     def total_profit_ac(self):
@@ -0,0 +1,273 @@
+"""
+AgroMentor 360 - Investor Portfolios
+Portfolio rows kept current from investment events instead of recomputed
+
+An investor's Portfolio totals both kinds of stake: farm investments (with
+returns distributed as InvestmentReturn rows) and opportunity investments
+(paid out at maturity). Each event that changes those totals (investing,
+activation, a return distribution, a payout) adds its deltas to the rows of
+the investors involved with a single F() UPDATE, in the same transaction as
+the event. A periodic reconciliation recomputes the rows from the investment
+tables and corrects any drift. The dashboard summary is a one-row read,
+cached per investor until the next event touches it.
+"""
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, When, Value, F, Q, Sum, Count, DecimalField, IntegerField
+from django.utils import timezone
+from decimal import Decimal
+import logging
+
+from blockchain.rates import get_rate
+from utils.constants import CACHE_TIMEOUTS
+
+logger = logging.getLogger(__name__)
+
+
+RECONCILE_BATCH_SIZE = 1000
+SUMMARY_TIMEOUT = CACHE_TIMEOUTS['long']
+
+AMOUNT_FIELD = DecimalField(max_digits=15, decimal_places=2)
+
+# Delta name -> Portfolio field
+FIELDS = {
+    'invested': 'total_invested_ac',
+    'returns': 'total_returns_ac',
+    'active': 'active_investments_count',
+    'matured': 'matured_investments_count',
+}
+NAIRA_FIELDS = {
+    'total_invested_ac': 'total_invested_naira',
+    'total_returns_ac': 'total_returns_naira',
+}
+
+# Statuses counted towards the totals
+FARM_STATUSES = ['active', 'matured']
+OPPORTUNITY_STATUSES = ['active', 'matured', 'paid_out']
+
+
+def _summary_key(user_id):
+    return f'investments:portfolio:{user_id}:summary'
+
+
+def add_delta(deltas, user_id, **changes):
+    """
+    Accumulate changes for one investor, e.g. add_delta(d, user.id, invested=amount, active=1)
+    """
+    delta = deltas.setdefault(user_id, {})
+    for name, value in changes.items():
+        delta[name] = delta.get(name, 0) + value
+    return deltas
+
+
+def _clear_summaries(user_ids):
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: cache.delete_many([_summary_key(user_id) for user_id in user_ids]))
+
+
+def apply_deltas(deltas):
+    """
+    Add per-investor deltas to their Portfolio rows, creating missing rows
+
+    Args:
+        deltas: {user id: {'invested', 'returns', 'active', 'matured': change}}
+
+    Returns:
+        int: Number of portfolios updated
+    """
+    from investments.models import Portfolio
+
+    deltas = {user_id: delta for user_id, delta in deltas.items() if any(delta.values())}
+    if not deltas:
+        return 0
+
+    rate = Value(get_rate(), output_field=AMOUNT_FIELD)
+
+    with transaction.atomic():
+        Portfolio.objects.bulk_create(
+            [Portfolio(user_id=user_id) for user_id in deltas],
+            ignore_conflicts=True
+        )
+        # Lock in user order so concurrent events cannot deadlock
+        list(
+            Portfolio.objects.select_for_update()
+            .filter(user_id__in=list(deltas))
+            .order_by('user_id')
+            .values_list('id', flat=True)
+        )
+
+        values = {'updated_at': timezone.now()}
+        for name, field in FIELDS.items():
+            changes = {user_id: delta[name] for user_id, delta in deltas.items() if delta.get(name)}
+            if not changes:
+                continue
+            output = AMOUNT_FIELD if field in NAIRA_FIELDS else IntegerField()
+            new_value = F(field) + Case(
+                *[When(user_id=user_id, then=Value(change)) for user_id, change in changes.items()],
+                default=Value(0),
+                output_field=output
+            )
+            values[field] = new_value
+            if field in NAIRA_FIELDS:
+                values[NAIRA_FIELDS[field]] = new_value * rate
+
+        updated = Portfolio.objects.filter(user_id__in=list(deltas)).update(**values)
+        _clear_summaries(deltas)
+
+    return updated
+
+
+def _expected(user_ids):
+    """
+    Portfolio totals recomputed from the investment tables
+    """
+    from investments.models import FarmInvestment, Investment, InvestmentReturn
+
+    expected = {
+        user_id: {'invested': Decimal('0'), 'returns': Decimal('0'), 'active': 0, 'matured': 0}
+        for user_id in user_ids
+    }
+
+    farm_rows = FarmInvestment.objects.filter(
+        investor_id__in=user_ids,
+        status__in=FARM_STATUSES
+    ).order_by().values('investor_id').annotate(
+        invested=Sum('amount'),
+        active=Count('id', filter=Q(status='active')),
+        matured=Count('id', filter=Q(status='matured'))
+    )
+    opportunity_rows = Investment.objects.filter(
+        investor_id__in=user_ids,
+        status__in=OPPORTUNITY_STATUSES
+    ).order_by().values('investor_id').annotate(
+        invested=Sum('amount_ac'),
+        returns=Sum('actual_return_ac'),
+        active=Count('id', filter=Q(status='active')),
+        matured=Count('id', filter=Q(status__in=['matured', 'paid_out']))
+    )
+    return_rows = InvestmentReturn.objects.filter(
+        investment__investor_id__in=user_ids
+    ).order_by().values('investment__investor_id').annotate(returns=Sum('amount'))
+
+    for rows, user_field in [
+        (farm_rows, 'investor_id'),
+        (opportunity_rows, 'investor_id'),
+        (return_rows, 'investment__investor_id'),
+    ]:
+        for row in rows:
+            totals = expected[row[user_field]]
+            for name in totals:
+                totals[name] += row.get(name) or 0
+
+    return expected
+
+
+def reconcile_users(user_ids):
+    """
+    Recompute the portfolios of these investors and fix the rows that drifted
+
+    Returns:
+        int: Number of portfolios corrected (including rows created)
+    """
+    from investments.models import Portfolio
+
+    user_ids = list(user_ids)
+    if not user_ids:
+        return 0
+
+    rate = get_rate()
+    now = timezone.now()
+
+    with transaction.atomic():
+        Portfolio.objects.bulk_create(
+            [Portfolio(user_id=user_id) for user_id in user_ids],
+            ignore_conflicts=True
+        )
+        # Locked before reading the totals: an event still in flight either
+        # committed first (and is counted) or applies its delta after us
+        portfolios = list(
+            Portfolio.objects.select_for_update()
+            .filter(user_id__in=user_ids)
+            .order_by('user_id')
+        )
+        expected = _expected(user_ids)
+
+        drifted = []
+        for portfolio in portfolios:
+            totals = expected[portfolio.user_id]
+            if all(getattr(portfolio, field) == totals[name] for name, field in FIELDS.items()):
+                continue
+            for name, field in FIELDS.items():
+                setattr(portfolio, field, totals[name])
+            for field, naira_field in NAIRA_FIELDS.items():
+                setattr(portfolio, naira_field, getattr(portfolio, field) * rate)
+            portfolio.updated_at = now
+            drifted.append(portfolio)
+
+        Portfolio.objects.bulk_update(
+            drifted,
+            list(FIELDS.values()) + list(NAIRA_FIELDS.values()) + ['updated_at']
+        )
+        _clear_summaries(portfolio.user_id for portfolio in drifted)
+
+    return len(drifted)
+
+
+def investor_ids():
+    """Everyone with a stake or an existing portfolio"""
+    from investments.models import FarmInvestment, Investment, Portfolio
+
+    ids = set(FarmInvestment.objects.order_by().values_list('investor_id', flat=True).distinct())
+    ids.update(Investment.objects.order_by().values_list('investor_id', flat=True).distinct())
+    ids.update(Portfolio.objects.values_list('user_id', flat=True))
+    return sorted(ids, key=str)
+
+
+def reconcile_all(batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Returns:
+        dict: Investors checked and portfolios corrected
+    """
+    ids = investor_ids()
+    corrected = 0
+    for start in range(0, len(ids), batch_size):
+        corrected += reconcile_users(ids[start:start + batch_size])
+    return {'checked': len(ids), 'corrected': corrected}
+
+
+def get_summary(user_id):
+    """
+    Dashboard summary of one investor's portfolio
+
+    Returns:
+        dict: total_invested, total_returns, net_profit, roi_percentage,
+            active_investments, matured_investments, total_investments
+    """
+    from investments.models import Portfolio
+
+    key = _summary_key(user_id)
+    summary = cache.get(key)
+    if summary is not None:
+        return summary
+
+    fields = list(FIELDS.values())
+    row = Portfolio.objects.filter(user_id=user_id).values(*fields).first()
+    if row is None:
+        # First visit since portfolios were introduced
+        reconcile_users([user_id])
+        row = Portfolio.objects.filter(user_id=user_id).values(*fields).first()
+
+    invested = row['total_invested_ac']
+    returns = row['total_returns_ac']
+    summary = {
+        'total_invested': float(invested),
+        'total_returns': float(returns),
+        'net_profit': float(returns - invested),
+        'roi_percentage': float((returns / invested * 100) if invested > 0 else 0),
+        'active_investments': row['active_investments_count'],
+        'matured_investments': row['matured_investments_count'],
+        'total_investments': row['active_investments_count'] + row['matured_investments_count'],
+    }
+    cache.set(key, summary, SUMMARY_TIMEOUT)
+    return summary
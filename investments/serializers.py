@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from decimal import Decimal
 from django.utils import timezone
-from .models import FarmInvestment, InvestmentOpportunity, InvestmentReturn
+from .models import FarmInvestment, InvestmentOpportunity, InvestmentReturn, ReturnDistribution
 
 # ----------------------------------------------------------------
 # Return Serializer (Required for distribute_returns view)
@@ -16,6 +16,24 @@ class InvestmentReturnSerializer(serializers.ModelSerializer):
         fields = ['id', 'amount', 'distribution_date', 'created_at']
 
 
+class ReturnDistributionSerializer(serializers.ModelSerializer):
+    """
+    Status and progress of a return distribution
+    """
+    progress = serializers.SerializerMethodField()
+    
+    class Meta: #type:ignore
+        model = ReturnDistribution
+        fields = [
+            'id', 'opportunity', 'amount', 'distribution_date', 'status',
+            'investor_count', 'progress', 'error', 'created_at', 'completed_at'
+        ]
+    
+    def get_progress(self, obj):
+        from .distribution import get_progress
+        return get_progress(obj)
+
+
 # ----------------------------------------------------------------
 # Opportunity Serializers
 # ----------------------------------------------------------------
@@ -1,3 +1,59 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from .distribution import INT64_MAX, DistributionError, allocate
+
+
+class AllocateTests(SimpleTestCase):
+    """Largest-remainder split of return amounts in minor units"""
+
+    def test_shares_sum_exactly(self):
+        cases = [
+            (100, [1, 1, 1]),
+            (1, [3, 3, 3]),
+            (999_999, [7, 13, 29, 1, 50]),
+            (10, [1_000_000, 1]),
+            (12345, [250_000, 100_000, 100_000, 5]),
+        ]
+        for total, weights in cases:
+            with self.subTest(total=total, weights=weights):
+                shares = allocate(total, weights)
+                self.assertEqual(sum(shares), total)
+                self.assertEqual(len(shares), len(weights))
+                # Each share is its floored proportion or one unit more
+                for share, weight in zip(shares, weights):
+                    self.assertIn(share - total * weight // sum(weights), (0, 1))
+
+    def test_exact_proportions_have_no_leftover(self):
+        self.assertEqual(allocate(600, [1, 2, 3]), [100, 200, 300])
+
+    def test_largest_remainder_gets_leftover(self):
+        # 10 * 2 / 3 leaves the larger remainder on the second stake
+        self.assertEqual(allocate(10, [1, 2]), [3, 7])
+
+    def test_ties_go_to_earlier_positions(self):
+        self.assertEqual(allocate(2, [1, 1, 1]), [1, 1, 0])
+        self.assertEqual(allocate(1, [5, 5]), [1, 0])
+        self.assertEqual(allocate(4, [1, 1, 1, 1, 1, 1]), [1, 1, 1, 1, 0, 0])
+
+    def test_overflowing_products_use_python_integers(self):
+        # total * weight passes int64, so int64 arithmetic would wrap
+        total = INT64_MAX // 3 + 7
+        weights = [4, 1, 2]
+        self.assertGreater(total * max(weights), INT64_MAX)
+
+        shares = allocate(total, weights)
+        self.assertEqual(sum(shares), total)
+        # Remainders 1, 2, 4 out of 7: the one leftover unit goes to the last
+        self.assertEqual(shares, [total * 4 // 7, total // 7, total * 2 // 7 + 1])
+        self.assertTrue(all(type(share) is int for share in shares))
+
+    def test_large_stakes_beyond_int64(self):
+        weights = [10 ** 20, 3 * 10 ** 20]
+        self.assertEqual(allocate(4, weights), [1, 3])
+
+    def test_zero_total_stake_raises(self):
+        with self.assertRaises(DistributionError):
+            allocate(100, [0, 0])
+
+    def test_no_investors(self):
+        self.assertEqual(allocate(100, []), [])
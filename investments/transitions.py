@@ -0,0 +1,138 @@
+"""
+AgroMentor 360 - Opportunity Status Transitions
+Funded and matured transitions as conditional bulk UPDATEs
+
+Each transition is one UPDATE ... RETURNING id (on PostgreSQL; elsewhere a
+locking SELECT of the ids followed by the UPDATE), so a run costs the same
+handful of queries however many opportunities exist. Matured opportunities
+are announced to their investors in one batch per run; newly funded ones go
+through the funding milestones, which remember what was already sent.
+"""
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.functions import Coalesce, Now
+from django.db.models.sql import UpdateQuery
+from django.utils import timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+SMS_CHUNK_SIZE = 100
+
+TRANSITION_MESSAGES = {
+    'matured': "🌾 {title} has reached maturity. Returns will be paid out shortly.",
+}
+
+
+def update_returning(queryset, **values):
+    """
+    queryset.update(**values), returning the primary keys of updated rows
+
+    Returns:
+        list: Primary keys of the rows updated
+    """
+    model = queryset.model
+
+    if connection.vendor == 'postgresql':
+        query = queryset.query.chain(UpdateQuery)
+        query.add_update_values(values)
+        sql, params = query.get_compiler(queryset.db).as_sql()
+        if not sql:
+            return []
+        pk = connection.ops.quote_name(model._meta.pk.column)
+        table = connection.ops.quote_name(model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f'{sql} RETURNING {table}.{pk}', params)
+            return [row[0] for row in cursor.fetchall()]
+
+    with transaction.atomic():
+        ids = list(queryset.select_for_update().values_list('pk', flat=True))
+        if ids:
+            model.objects.filter(pk__in=ids).update(**values)
+        return ids
+
+
+def advance_opportunities(today=None):
+    """
+    Move opportunities to 'funded' once fully funded and to 'matured' once
+    their maturity date has passed
+
+    Returns:
+        dict: {'funded': [ids], 'matured': [ids]}
+    """
+    from investments.models import InvestmentOpportunity
+
+    today = today or timezone.localdate()
+    opportunities = InvestmentOpportunity.objects.all()
+
+    with transaction.atomic():
+        funded = update_returning(
+            opportunities.filter(status='open', funding_percentage__gte=100),
+            status='funded',
+            funded_at=Coalesce('funded_at', Now())
+        )
+        matured = update_returning(
+            opportunities.filter(status__in=['funded', 'active'], maturity_date__lte=today),
+            status='matured',
+            halfway_date=None
+        )
+
+    return {'funded': funded, 'matured': matured}
+
+
+def notify_investors(templates):
+    """
+    Queue SMS batches to the investors of several opportunities
+
+    Args:
+        templates: {opportunity id: message with a {title} placeholder}
+
+    Returns:
+        int: Number of messages queued
+    """
+    from investments.models import Investment
+    from notifications.tasks import send_sms_batch
+
+    if not templates:
+        return 0
+
+    # One message per investor per opportunity
+    recipients = Investment.objects.filter(
+        ~Q(status__in=['pending', 'cancelled']),
+        opportunity_id__in=list(templates),
+        investor__phone_number__isnull=False
+    ).order_by().values_list('opportunity_id', 'opportunity__title', 'investor__phone_number').distinct()
+
+    messages = [
+        [phone, templates[opportunity_id].format(title=title)]
+        for opportunity_id, title, phone in recipients
+        if phone
+    ]
+    for i in range(0, len(messages), SMS_CHUNK_SIZE):
+        chunk = messages[i:i + SMS_CHUNK_SIZE]
+        transaction.on_commit(lambda chunk=chunk: send_sms_batch.delay(chunk))
+
+    return len(messages)
+
+
+def notify_transitions(transitions):
+    """
+    Tell investors their opportunities changed status
+
+    Args:
+        transitions: Output of advance_opportunities
+
+    Returns:
+        int: Number of messages queued
+    """
+    from .milestones import check_funding_milestones
+
+    notified = check_funding_milestones(transitions.get('funded', []))
+    return notified + notify_investors({
+        opportunity_id: TRANSITION_MESSAGES[new_status]
+        for new_status, ids in transitions.items()
+        if new_status in TRANSITION_MESSAGES
+        for opportunity_id in ids
+    })
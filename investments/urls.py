@@ -14,6 +14,7 @@ urlpatterns = [
     path('opportunities/create/', views.create_opportunity, name='create-opportunity'),
     path('opportunities/<uuid:opportunity_id>/invest/', views.invest, name='invest'),
     path('opportunities/<uuid:opportunity_id>/returns/', views.distribute_returns, name='distribute-returns'),
+    path('opportunities/<uuid:opportunity_id>/returns/<uuid:distribution_id>/', views.distribution_status, name='distribution-status'),
     
     # User Investments
     path('my-investments/', views.my_investments, name='my-investments'),
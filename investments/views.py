@@ -12,13 +12,22 @@ from django.db.models import Sum, Count, Q
 from django.utils import timezone
 from decimal import Decimal
 
-from .models import FarmInvestment, InvestmentOpportunity, InvestmentReturn
+from .models import FarmInvestment, InvestmentOpportunity, ReturnDistribution
 from .serializers import (
     FarmInvestmentSerializer,
     InvestmentOpportunitySerializer,
-    InvestmentReturnSerializer
+    InvestmentReturnSerializer,
+    ReturnDistributionSerializer
+)
+from .funding import FundingError, commit_investment, parse_amount as parse_investment_amount
+from .portfolio import get_summary
+from .distribution import (
+    SYNC_LIMIT,
+    DistributionError,
+    active_investments,
+    parse_amount,
+    run_distribution
 )
-from blockchain.ethereum_service import EthereumService
 
 
 @api_view(['GET'])
@@ -78,75 +87,27 @@ def create_opportunity(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def invest(request, opportunity_id):
-    """Invest in an opportunity"""
-    opportunity = get_object_or_404(InvestmentOpportunity, id=opportunity_id)
-    
-    if opportunity.status != 'active':
-        return Response(
-            {'error': 'Investment opportunity is not active'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
-    if opportunity.closed_at < timezone.now().date():
-        return Response(
-            {'error': 'Investment opportunity has ended'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
-    amount = request.data.get('amount')
-    if not amount:
-        return Response(
-            {'error': 'Investment amount required'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
-    amount = Decimal(amount)
-    
-    # Check minimum investment
-    if amount < opportunity.minimum_investment_ac:
-        return Response(
-            {'error': f'Minimum investment is {opportunity.minimum_investment_ac}'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
-    # Check if funding target exceeded
-    current_funding = opportunity.current_amount_ac + amount
-    if current_funding > opportunity.target_amount_ac:
-        return Response(
-            {'error': 'Investment would exceed funding goal'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
-    # Check user's wallet balance
-    eth_service = EthereumService()
-    wallet = request.user.wallet
-    balance = eth_service.get_balance(wallet.address)
-    
-    if balance < float(amount):
-        return Response(
-            {'error': 'Insufficient wallet balance'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
-    # Create investment
-    investment = FarmInvestment.objects.create(
-        investor=request.user,
-        opportunity=opportunity,
-        amount=amount,
-        status='active'
-    )
-    
-    # Update opportunity funding
-    opportunity.current_amount_ac = current_funding
-    if current_funding >= opportunity.target_amount_ac:
-        opportunity.status = 'funded'
-    opportunity.save()
+    """
+    Invest in an opportunity
+    Funding and the wallet debit commit at once; on-chain settlement follows
+    """
+    try:
+        amount = parse_investment_amount(request.data.get('amount'))
+        investment = commit_investment(request.user, opportunity_id, amount)
+    except FundingError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Process blockchain transaction (simplified)
-    # In production, this would lock tokens in smart contract
-    
-    serializer = FarmInvestmentSerializer(investment)
-    return Response(serializer.data, status=status.HTTP_201_CREATED)
+    return Response({
+        'id': str(investment.id),
+        'opportunity': str(opportunity_id),
+        'amount_ac': float(investment.amount_ac),
+        'amount_naira': float(investment.amount_naira),
+        'expected_return_ac': float(investment.expected_return_ac),
+        'maturity_date': investment.maturity_date,
+        'status': investment.status,
+        'payment_transaction': str(investment.payment_transaction_id),
+        'settlement': 'pending'
+    }, status=status.HTTP_201_CREATED)
 
 
 @api_view(['GET'])
@@ -198,32 +159,7 @@ def investment_returns(request, investment_id):
 @permission_classes([IsAuthenticated])
 def portfolio_summary(request):
     """Get investment portfolio summary"""
-    investments = FarmInvestment.objects.filter(investor=request.user)
-    
-    total_invested = investments.aggregate(
-        total=Sum('amount')
-    )['total'] or Decimal('0')
-    
-    total_returns = InvestmentReturn.objects.filter(
-        investment__investor=request.user
-    ).aggregate(
-        total=Sum('amount')
-    )['total'] or Decimal('0')
-    
-    active_investments = investments.filter(status='active').count()
-    matured_investments = investments.filter(status='matured').count()
-    
-    summary = {
-        'total_invested': float(total_invested),
-        'total_returns': float(total_returns),
-        'net_profit': float(total_returns - total_invested),
-        'roi_percentage': float((total_returns / total_invested * 100) if total_invested > 0 else 0),
-        'active_investments': active_investments,
-        'matured_investments': matured_investments,
-        'total_investments': investments.count()
-    }
-    
-    return Response(summary)
+    return Response(get_summary(request.user.id))
 
 
 @api_view(['GET'])
@@ -249,8 +185,14 @@ def farm_investments(request, farm_id):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def distribute_returns(request, opportunity_id):
-    """Distribute returns to investors (for farm owners)"""
-    opportunity = get_object_or_404(InvestmentOpportunity, id=opportunity_id)
+    """
+    Distribute returns to investors (for farm owners)
+    
+    Shares are exact to 0.01 AC and add up to the amount. Distributions over
+    more than SYNC_LIMIT investors run in the background: the response is
+    202 with the distribution to poll for progress.
+    """
+    opportunity = get_object_or_404(InvestmentOpportunity.objects.select_related('farm'), id=opportunity_id)
     
     # Verify user owns the farm
     if opportunity.farm.owner != request.user:
@@ -259,46 +201,66 @@ def distribute_returns(request, opportunity_id):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    return_amount = request.data.get('amount')
-    if not return_amount:
-        return Response(
-            {'error': 'Return amount required'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
-    return_amount = Decimal(return_amount)
-    
-    # Get active investments
-    investments = FarmInvestment.objects.filter(opportunity=opportunity, status='active')
+    try:
+        return_amount = parse_amount(request.data.get('amount'))
+    except DistributionError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
-    if not investments.exists():
+    investor_count = active_investments(opportunity).count()
+    if not investor_count:
         return Response(
             {'error': 'No active investments found'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Calculate proportional returns
-    total_invested = investments.aggregate(Sum('amount'))['amount__sum']
+    distribution = ReturnDistribution.objects.create(
+        opportunity=opportunity,
+        created_by=request.user,
+        amount=return_amount,
+        investor_count=investor_count
+    )
     
-    returns_created = []
-    for investment in investments:
-        proportion = investment.amount / total_invested
-        investor_return = return_amount * proportion
-        
-        return_obj = InvestmentReturn.objects.create(
-            investment=investment,
-            amount=investor_return,
-            distribution_date=timezone.now().date()
-        )
-        returns_created.append(return_obj)
+    if investor_count > SYNC_LIMIT:
+        from .tasks import distribute_returns as distribute_returns_task
+        distribute_returns_task.delay(str(distribution.id)) # type: ignore
+        return Response({
+            'message': f'Distributing returns to {investor_count} investors',
+            'distribution': ReturnDistributionSerializer(distribution).data
+        }, status=status.HTTP_202_ACCEPTED)
     
+    try:
+        created = run_distribution(distribution.id)
+    except DistributionError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    distribution.refresh_from_db()
     return Response({
-        'message': f'Returns distributed to {len(returns_created)} investors',
+        'message': f'Returns distributed to {created} investors',
         'total_amount': float(return_amount),
-        'returns': InvestmentReturnSerializer(returns_created, many=True).data
+        'distribution': ReturnDistributionSerializer(distribution).data,
+        'returns': InvestmentReturnSerializer(distribution.returns.all(), many=True).data
     })
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def distribution_status(request, opportunity_id, distribution_id):
+    """Progress of a return distribution (for farm owners)"""
+    distribution = get_object_or_404(
+        ReturnDistribution.objects.select_related('opportunity__farm'),
+        id=distribution_id,
+        opportunity_id=opportunity_id
+    )
+    
+    if distribution.opportunity.farm.owner != request.user:
+        return Response(
+            {'error': 'Unauthorized'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    return Response(ReturnDistributionSerializer(distribution).data)
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def investment_stats(request):
@@ -0,0 +1,318 @@
+"""
+AgroMentor 360 - Search Autocomplete
+Prefix suggestions for product and crop names without touching the database
+
+The shared snapshot lives in Redis: a hash of normalised product name ->
+number of available products with that name (plus a hash of display
+spellings) and a version counter. Product saves apply +1/-1 deltas to it
+as they commit; a nightly task rebuilds it from the database to correct
+drift. Each worker keeps a sorted array of every word-start of every name
+in memory and answers a keystroke with two binary searches. When the
+version moves, a background thread loads the snapshot and builds a new
+index while keystrokes keep using the old one, which is then swapped out.
+"""
+
+from django.db import transaction
+from django.db.models import Count
+from bisect import bisect_left
+import heapq
+import re
+import threading
+import time
+import logging
+
+from utils.constants import COMMON_CROPS
+
+logger = logging.getLogger(__name__)
+
+
+TERMS_KEY = 'ac:terms'
+DISPLAY_KEY = 'ac:display'
+VERSION_KEY = 'ac:version'
+REBUILD_LOCK_KEY = 'ac:rebuilding'
+
+LOCAL_CHECK_INTERVAL = 10         # Seconds between version checks per worker
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+MAX_WORDS = 6                     # Word starts indexed per name
+PRECOMPUTED_PREFIX = 2            # Prefixes this short are answered from a table
+CROP_WEIGHT = 1000                # Known crops rank above individual listings
+
+
+# KEYS: terms hash, display hash, version
+# ARGV: term, delta, display spelling
+DELTA_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+local count = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+if count <= 0 then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    redis.call('HDEL', KEYS[2], ARGV[1])
+elseif ARGV[3] ~= '' then
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[3])
+end
+return redis.call('INCR', KEYS[3])
+"""
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+_scripts = {}
+
+
+def _script(name, source):
+    if name not in _scripts:
+        _scripts[name] = _redis().register_script(source)
+    return _scripts[name]
+
+
+def normalise(text):
+    """Lowercase words separated by single spaces: 'Roma  Tomatoes!' -> 'roma tomatoes'"""
+    return ' '.join(re.sub(r'[^\w]+', ' ', (text or '').lower()).split())
+
+
+CROPS = {
+    normalise(crop): crop
+    for crops in COMMON_CROPS.values()
+    for crop in crops
+}
+
+
+class PrefixIndex:
+    """
+    Sorted array of (word start, term) entries with per-term weights
+    """
+
+    def __init__(self, counts, display):
+        terms = {term: count for term, count in counts.items() if count > 0}
+        for crop in CROPS:
+            terms[crop] = terms.get(crop, 0) + CROP_WEIGHT
+
+        self.terms = sorted(terms)
+        self.weights = [terms[term] for term in self.terms]
+        self.display = [display.get(term) or CROPS.get(term) or term for term in self.terms]
+        self.counts = [terms[term] - (CROP_WEIGHT if term in CROPS else 0) for term in self.terms]
+
+        entries = []
+        for position, term in enumerate(self.terms):
+            words = term.split(' ')
+            for start in range(min(len(words), MAX_WORDS)):
+                entries.append((' '.join(words[start:]), position))
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.refs = [ref for _, ref in entries]
+
+        # Very short prefixes match a large slice; rank those once up front
+        self.top = {}
+        for key, ref in entries:
+            for length in range(1, PRECOMPUTED_PREFIX + 1):
+                if len(key) >= length:
+                    self.top.setdefault(key[:length], set()).add(ref)
+        self.top = {prefix: self._rank(refs, MAX_LIMIT) for prefix, refs in self.top.items()}
+
+    def _rank(self, refs, limit):
+        return heapq.nsmallest(
+            limit, refs,
+            key=lambda ref: (-self.weights[ref], len(self.terms[ref]), self.terms[ref])
+        )
+
+    def lookup(self, prefix, limit=DEFAULT_LIMIT):
+        """
+        Best `limit` terms with a word starting with `prefix`
+
+        Returns:
+            list: Term positions, best first
+        """
+        if not prefix:
+            return []
+        if len(prefix) <= PRECOMPUTED_PREFIX:
+            return self.top.get(prefix, [])[:limit]
+
+        low = bisect_left(self.keys, prefix)
+        high = bisect_left(self.keys, prefix + '\uffff', low)
+        return self._rank(set(self.refs[low:high]), limit)
+
+    def __len__(self):
+        return len(self.terms)
+
+
+_local = {'index': None, 'version': None, 'checked': 0.0, 'loading': False}
+_loading_lock = threading.Lock()
+
+
+def _fetch():
+    """
+    Build an index from the Redis snapshot
+
+    Returns:
+        tuple: (PrefixIndex, version it was built from)
+    """
+    pipe = _redis().pipeline()
+    pipe.hgetall(TERMS_KEY)
+    pipe.hgetall(DISPLAY_KEY)
+    pipe.get(VERSION_KEY)
+    counts, display, version = pipe.execute()
+    index = PrefixIndex(
+        {term.decode(): int(count) for term, count in counts.items()},
+        {term.decode(): name.decode() for term, name in display.items()}
+    )
+    return index, version
+
+
+def _reload():
+    try:
+        _local['index'], _local['version'] = _fetch()
+    except Exception as e:
+        logger.error(f"Error loading autocomplete index: {str(e)}")
+    finally:
+        _local['loading'] = False
+
+
+def _load():
+    """
+    This worker's index; a moved version starts a reload in the background
+    """
+    now = time.monotonic()
+    if _local['index'] is not None and now - _local['checked'] < LOCAL_CHECK_INTERVAL:
+        return _local['index']
+    _local['checked'] = now
+
+    try:
+        redis = _redis()
+        version = redis.get(VERSION_KEY)
+        if version is None:
+            schedule_rebuild()
+        elif _local['index'] is None:
+            # First keystroke in this worker: there is no older index to serve
+            _local['index'], _local['version'] = _fetch()
+        elif version != _local['version']:
+            with _loading_lock:
+                start = not _local['loading']
+                _local['loading'] = True
+            if start:
+                threading.Thread(target=_reload, daemon=True).start()
+    except Exception as e:
+        # Keep serving the last snapshot (or crops alone) while Redis is away
+        logger.error(f"Error loading autocomplete index: {str(e)}")
+
+    if _local['index'] is None:
+        _local['index'] = PrefixIndex({}, {})
+    return _local['index']
+
+
+def suggest(query, limit=DEFAULT_LIMIT):
+    """
+    Product and crop names with a word starting with `query`
+
+    Returns:
+        list: [{'text', 'type', 'count'}] best first; type is 'crop' for a
+            known crop and 'product' otherwise, count is available listings
+    """
+    prefix = normalise(query)
+    index = _load()
+    return [
+        {
+            'text': index.display[ref],
+            'type': 'crop' if index.terms[ref] in CROPS else 'product',
+            'count': index.counts[ref],
+        }
+        for ref in index.lookup(prefix, min(limit, MAX_LIMIT))
+    ]
+
+
+def _term(name, status):
+    return normalise(name) if status == 'available' and name else ''
+
+
+def product_changed(previous, current):
+    """
+    Move a product's weight between names once the write commits
+
+    Args:
+        previous: (name, status) the product was loaded with, or None if new
+        current: (name, status) after the write, or None if deleted
+    """
+    old = _term(*previous) if previous else ''
+    new = _term(*current) if current else ''
+    if old == new:
+        return
+
+    deltas = []
+    if old:
+        deltas.append((old, -1, ''))
+    if new:
+        deltas.append((new, 1, current[0].strip()))
+    transaction.on_commit(lambda: _apply(deltas))
+
+
+def products_created(products):
+    """
+    Count products created in bulk, one delta per distinct name
+    """
+    counts, display = {}, {}
+    for product in products:
+        term = _term(product.name, product.status)
+        if term:
+            counts[term] = counts.get(term, 0) + 1
+            display.setdefault(term, product.name.strip())
+
+    deltas = [(term, count, display[term]) for term, count in counts.items()]
+    if deltas:
+        transaction.on_commit(lambda: _apply(deltas))
+
+
+def _apply(deltas):
+    try:
+        script = _script('delta', DELTA_SCRIPT)
+        for term, delta, display in deltas:
+            script(keys=[TERMS_KEY, DISPLAY_KEY, VERSION_KEY], args=[term, delta, display])
+    except Exception as e:
+        # The nightly rebuild catches up
+        logger.error(f"Error updating autocomplete index: {str(e)}")
+
+
+def schedule_rebuild():
+    """Queue a rebuild unless one was queued in the last few minutes"""
+    from .tasks import rebuild_autocomplete_index
+
+    if _redis().set(REBUILD_LOCK_KEY, 1, nx=True, ex=300):
+        rebuild_autocomplete_index.delay()
+
+
+def rebuild():
+    """
+    Replace the Redis snapshot with counts read from the database
+
+    Returns:
+        int: Number of distinct product names
+    """
+    from .models import Product
+
+    counts, display = {}, {}
+    rows = Product.objects.filter(status='available').order_by().values('name').annotate(total=Count('id'))
+    for row in rows.iterator(chunk_size=5000):
+        term = normalise(row['name'])
+        if not term:
+            continue
+        counts[term] = counts.get(term, 0) + row['total']
+        display.setdefault(term, row['name'].strip())
+
+    redis = _redis()
+    pipe = redis.pipeline()
+    pipe.delete(TERMS_KEY, DISPLAY_KEY)
+    if counts:
+        pipe.hset(TERMS_KEY, mapping=counts)
+        pipe.hset(DISPLAY_KEY, mapping=display)
+    else:
+        # Keep the hash present so deltas are applied to an empty catalogue
+        pipe.hset(TERMS_KEY, '', 0)
+    pipe.incr(VERSION_KEY)
+    pipe.delete(REBUILD_LOCK_KEY)
+    pipe.execute()
+
+    logger.info(f"Rebuilt autocomplete index: {len(counts)} names")
+    return len(counts)
@@ -0,0 +1,211 @@
+"""
+AgroMentor 360 - Marketplace Response Cache
+Versioned caching of anonymous catalogue responses with conditional GET support
+
+Every cached response is keyed by its normalised query parameters plus the
+current value of the version counters it depends on (all listings, one
+category, one seller or one product). Product writes bump only the counters
+they affect, so stale entries are never read again and simply expire.
+
+The ETag is a hash of the cached body, stored with it. Parts of a response
+that no counter tracks (counts, seller profiles, rolling date windows) are
+refreshed when the entry expires, and the rebuilt body gets a new ETag.
+"""
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+from rest_framework import status
+from rest_framework.response import Response
+from urllib.parse import urlencode
+import hashlib
+import json
+import time
+import logging
+
+from utils.constants import CACHE_TIMEOUTS
+
+logger = logging.getLogger(__name__)
+
+
+KEY_PREFIX = 'mkt'
+
+# How long a cached body may live once written. Version bumps make entries
+# unreachable long before this; the TTL only bounds data we cannot version
+# (seller profiles, order and review counts).
+RESPONSE_TIMEOUTS = {
+    'product_list': CACHE_TIMEOUTS['medium'],
+    'product_detail': CACHE_TIMEOUTS['medium'],
+    'marketplace_stats': CACHE_TIMEOUTS['short'],
+    'trending_products': CACHE_TIMEOUTS['short'],
+    'product_recommendations': CACHE_TIMEOUTS['medium'],
+    'product_facets': CACHE_TIMEOUTS['medium'],
+    'crop_prices': CACHE_TIMEOUTS['medium'],
+}
+
+
+def version_key(scope, value=None):
+    """
+    Cache key of a version counter, e.g. ('category', 'tubers')
+    """
+    if value is None:
+        return f'{KEY_PREFIX}:ver:{scope}'
+    return f'{KEY_PREFIX}:ver:{scope}:{value}'
+
+
+def _seed():
+    # Seeding with the clock means a counter lost to eviction never
+    # restarts at a value an old entry was cached under
+    return int(time.time() * 1000)
+
+
+def get_versions(keys):
+    """
+    Current values of several version counters in one cache round-trip
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _seed(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(keys):
+    """
+    Invalidate every cached response that depends on any of these counters
+    """
+    for key in set(keys):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _seed(), None)
+
+
+def product_version_keys(product, previous=None):
+    """
+    Counters a product write affects
+
+    Args:
+        product: Product being written
+        previous: Optional dict of the product's category/seller_id before the
+            write, so pages it is leaving are invalidated too
+    """
+    keys = [
+        version_key('listings'),
+        version_key('product', product.pk),
+        version_key('category', product.category),
+        version_key('seller', product.seller_id),
+    ]
+    if previous:
+        if previous.get('category'):
+            keys.append(version_key('category', previous['category']))
+        if previous.get('seller_id'):
+            keys.append(version_key('seller', previous['seller_id']))
+    return keys
+
+
+def invalidate_product(product, previous=None):
+    """
+    Bump the versions a product write affects once the write commits
+    """
+    keys = product_version_keys(product, previous)
+    transaction.on_commit(lambda: bump_versions(keys))
+
+
+def invalidate_products(products):
+    """
+    Bump versions for several products changed by a bulk or F() update
+    """
+    keys = []
+    for product in products:
+        keys.extend(product_version_keys(product))
+    if keys:
+        transaction.on_commit(lambda: bump_versions(keys))
+
+
+def normalise_params(params):
+    """
+    Canonical query string: blank values dropped, keys sorted
+    """
+    items = sorted(
+        (key, str(value).strip())
+        for key, value in params.items()
+        if value is not None and str(value).strip() != ''
+    )
+    return urlencode(items)
+
+
+def _fingerprint(params, scopes):
+    versions = get_versions(list(scopes))
+    fingerprint = f"{normalise_params(params)}|{'.'.join(str(v) for v in versions)}"
+    return hashlib.md5(fingerprint.encode()).hexdigest()
+
+
+def cached_data(name, params, scopes, builder):
+    """
+    Cache an intermediate result under the same version counters as responses
+
+    Unlike cached_response this serves authenticated requests too, so use it
+    only for data that does not depend on the user.
+    """
+    cache_key = f'{KEY_PREFIX}:data:{name}:{_fingerprint(params, scopes)}'
+    data = cache.get(cache_key)
+    if data is None:
+        data = builder()
+        cache.set(cache_key, data, RESPONSE_TIMEOUTS.get(name, CACHE_TIMEOUTS['short']))
+    return data
+
+
+def _body_etag(data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return f'W/"{hashlib.md5(body.encode()).hexdigest()}"'
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get('If-None-Match', '')
+    candidates = {tag.strip() for tag in header.split(',')}
+    return etag in candidates or '*' in candidates
+
+
+def cached_response(request, name, params, scopes, builder):
+    """
+    Serve a catalogue response from the versioned cache
+
+    Only anonymous requests use the cache; authenticated requests always call
+    the builder. A matching If-None-Match is answered with 304 only while the
+    cached entry it was issued for is still there; a miss rebuilds and sends
+    200.
+
+    Args:
+        request: DRF request
+        name: View name (see RESPONSE_TIMEOUTS)
+        params: Dict of the parameters the response depends on
+        scopes: List of version keys the response depends on
+        builder: Callable returning the response data on a cache miss
+
+    Returns:
+        Response: 200 with data, or 304 Not Modified
+    """
+    if request.user.is_authenticated:
+        return Response(builder())
+
+    # Every response embeds Naira prices, which change with the AgroCoin rate
+    digest = _fingerprint(params, list(scopes) + [version_key('rate')])
+    # Entries hold the body and its ETag
+    cache_key = f'{KEY_PREFIX}:entry:{name}:{digest}'
+
+    entry = cache.get(cache_key)
+    if entry is not None and _etag_matches(request, entry['etag']):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        if entry is None:
+            data = builder()
+            entry = {'etag': _body_etag(data), 'data': data}
+            cache.set(cache_key, entry, RESPONSE_TIMEOUTS.get(name, CACHE_TIMEOUTS['short']))
+        response = Response(entry['data'])
+
+    response['ETag'] = entry['etag']
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
@@ -0,0 +1,351 @@
+"""
+AgroMentor 360 - Cart Service
+Shopping carts kept in Redis with write-behind persistence to the Cart table
+
+Each cart is four hashes keyed by user id:
+    cart:{user}:lines  product id -> JSON snapshot (name, prices, image)
+    cart:{user}:qty    product id -> quantity in hundredths
+    cart:{user}:sums   product id -> line total in 1/10000 AC
+    cart:{user}:meta   running 'total' (1/10000 AC) and 'loaded' flag
+
+Every change is one Lua script that updates the line and adjusts the running
+total by the difference, so no operation re-reads the whole cart. Changed
+carts are added to a dirty set and written to the database in batches by
+flush_dirty_carts, or immediately at checkout.
+"""
+
+from decimal import Decimal
+from uuid import UUID
+import json
+import logging
+
+from blockchain.rates import get_rate
+
+logger = logging.getLogger(__name__)
+
+
+CART_TTL = 60 * 60 * 24 * 30      # Idle carts expire from Redis after 30 days
+DIRTY_CARTS_KEY = 'cart:dirty'
+FLUSH_BATCH_SIZE = 500
+
+UNITS = Decimal('100')            # Quantities and prices stored in hundredths
+TOTAL_UNITS = UNITS * UNITS       # Line totals are price units x quantity units
+
+
+class CartError(ValueError):
+    """Raised for invalid cart operations"""
+    pass
+
+
+# KEYS: lines, qty, sums, meta, dirty
+# ARGV: product_id, mode ('add' or 'set'), qty_units, price_units, line_json, user_id, ttl
+UPDATE_SCRIPT = """
+local pid = ARGV[1]
+local q
+if ARGV[2] == 'add' then
+    q = redis.call('HINCRBY', KEYS[2], pid, ARGV[3])
+else
+    q = tonumber(ARGV[3])
+    redis.call('HSET', KEYS[2], pid, q)
+end
+local old = tonumber(redis.call('HGET', KEYS[3], pid) or '0')
+if q <= 0 then
+    redis.call('HDEL', KEYS[1], pid)
+    redis.call('HDEL', KEYS[2], pid)
+    redis.call('HDEL', KEYS[3], pid)
+    redis.call('HINCRBY', KEYS[4], 'total', -old)
+    q = 0
+else
+    local sum = q * tonumber(ARGV[4])
+    redis.call('HSET', KEYS[3], pid, sum)
+    redis.call('HINCRBY', KEYS[4], 'total', sum - old)
+    redis.call('HSET', KEYS[1], pid, ARGV[5])
+end
+redis.call('HSET', KEYS[4], 'loaded', 1)
+redis.call('SADD', KEYS[5], ARGV[6])
+for i = 1, 4 do
+    redis.call('EXPIRE', KEYS[i], ARGV[7])
+end
+return q
+"""
+
+# KEYS: lines, qty, sums, meta
+# ARGV: ttl, then (product_id, qty_units, sum_units, line_json) per line
+WARM_SCRIPT = """
+if redis.call('EXISTS', KEYS[4]) == 1 then
+    return 0
+end
+local total = 0
+for i = 2, #ARGV, 4 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 3])
+    redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 1])
+    redis.call('HSET', KEYS[3], ARGV[i], ARGV[i + 2])
+    total = total + tonumber(ARGV[i + 2])
+end
+redis.call('HSET', KEYS[4], 'total', total, 'loaded', 1)
+for i = 1, 4 do
+    redis.call('EXPIRE', KEYS[i], ARGV[1])
+end
+return 1
+"""
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+_scripts = {}
+
+
+def _script(name, source):
+    if name not in _scripts:
+        _scripts[name] = _redis().register_script(source)
+    return _scripts[name]
+
+
+def _keys(user_id):
+    return [
+        f'cart:{user_id}:lines',
+        f'cart:{user_id}:qty',
+        f'cart:{user_id}:sums',
+        f'cart:{user_id}:meta',
+    ]
+
+
+def _units(value):
+    return int((Decimal(str(value)) * UNITS).to_integral_value())
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _ensure_loaded(user_id):
+    """
+    Copy the persisted cart into Redis the first time it is used
+    """
+    from .models import Cart
+
+    keys = _keys(user_id)
+    if _redis().exists(keys[3]):
+        return
+
+    items = Cart.objects.filter(user_id=user_id).values_list('items', flat=True).first() or []
+
+    args = [CART_TTL]
+    for item in items:
+        qty = _units(item['quantity'])
+        price = _units(item['price_ac'])
+        args.extend([
+            item['product_id'],
+            qty,
+            qty * price,
+            json.dumps({k: v for k, v in item.items() if k != 'quantity'}),
+        ])
+
+    _script('warm', WARM_SCRIPT)(keys=keys, args=args)
+
+
+def _update(user_id, product, quantity, mode):
+    from utils.images import thumbnail_url
+    
+    _ensure_loaded(user_id)
+
+    line = {
+        'product_id': str(product.id),
+        'name': product.name,
+        'price_ac': float(product.price_agrocoin),
+        'price_ngn': float(product.price_naira),
+        'image': thumbnail_url(product.primary_image, product.image_variants),
+    }
+
+    return _script('update', UPDATE_SCRIPT)(
+        keys=_keys(user_id) + [DIRTY_CARTS_KEY],
+        args=[
+            str(product.id),
+            mode,
+            _units(quantity),
+            _units(product.price_agrocoin),
+            json.dumps(line),
+            str(user_id),
+            CART_TTL,
+        ]
+    )
+
+
+def _get_product(product_id):
+    from .models import Product
+
+    try:
+        product_id = UUID(str(product_id))
+    except ValueError:
+        raise CartError('Product not found')
+
+    product = Product.objects.filter(id=product_id).only(
+        'id', 'name', 'price_agrocoin', 'price_naira', 'primary_image', 'image_variants',
+        'status', 'quantity_available'
+    ).first()
+    if product is None:
+        raise CartError('Product not found')
+    return product
+
+
+def _quantity(value):
+    try:
+        quantity = Decimal(str(value))
+    except ArithmeticError:
+        raise CartError('Quantity must be a number')
+    if not quantity.is_finite() or quantity < 0:
+        raise CartError('Quantity must not be negative')
+    return quantity
+
+
+def add_item(user_id, product_id, quantity):
+    """
+    Add quantity of a product to the cart (merging with an existing line)
+    """
+    quantity = _quantity(quantity)
+    if quantity == 0:
+        raise CartError('Quantity must be positive')
+
+    product = _get_product(product_id)
+    if not product.is_available:
+        raise CartError(f'{product.name} is not available')
+
+    _update(user_id, product, quantity, 'add')
+    return get_cart(user_id)
+
+
+def set_quantity(user_id, product_id, quantity):
+    """
+    Set the quantity of a cart line; zero removes it
+    """
+    quantity = _quantity(quantity)
+    if quantity == 0:
+        return remove_item(user_id, product_id)
+
+    product = _get_product(product_id)
+    if not product.is_available:
+        raise CartError(f'{product.name} is not available')
+
+    _update(user_id, product, quantity, 'set')
+    return get_cart(user_id)
+
+
+def remove_item(user_id, product_id):
+    """
+    Remove a line from the cart
+    """
+    _ensure_loaded(user_id)
+
+    _script('update', UPDATE_SCRIPT)(
+        keys=_keys(user_id) + [DIRTY_CARTS_KEY],
+        args=[str(product_id), 'set', 0, 0, '', str(user_id), CART_TTL]
+    )
+    return get_cart(user_id)
+
+
+def clear(user_id):
+    """
+    Empty the cart
+    """
+    conn = _redis()
+    keys = _keys(user_id)
+    pipe = conn.pipeline()
+    pipe.delete(*keys[:3])
+    pipe.hset(keys[3], mapping={'total': 0, 'loaded': 1})
+    pipe.expire(keys[3], CART_TTL)
+    pipe.sadd(DIRTY_CARTS_KEY, str(user_id))
+    pipe.execute()
+
+
+def _read(user_id):
+    """
+    Current cart lines and running total straight from Redis
+
+    Returns:
+        tuple: (items, total_ac)
+    """
+    _ensure_loaded(user_id)
+
+    lines_key, qty_key, _, meta_key = _keys(user_id)
+    pipe = _redis().pipeline()
+    pipe.hgetall(lines_key)
+    pipe.hgetall(qty_key)
+    pipe.hget(meta_key, 'total')
+    lines, quantities, total = pipe.execute()
+
+    quantities = {_decode(k): int(v) for k, v in quantities.items()}
+    items = []
+    for product_id, raw in lines.items():
+        product_id = _decode(product_id)
+        item = json.loads(raw)
+        item['quantity'] = float(Decimal(quantities.get(product_id, 0)) / UNITS)
+        items.append(item)
+
+    total_ac = (Decimal(int(total or 0)) / TOTAL_UNITS).quantize(Decimal('0.01'))
+    return items, total_ac
+
+
+def get_cart(user_id):
+    """
+    Get the cart for display
+
+    Returns:
+        dict: items, item_count, total_ac and total_naira
+    """
+    items, total_ac = _read(user_id)
+    conversion_rate = get_rate()
+
+    return {
+        'items': items,
+        'item_count': len(items),
+        'total_ac': str(total_ac),
+        'total_naira': str((total_ac * conversion_rate).quantize(Decimal('0.01'))),
+    }
+
+
+def flush(user_id):
+    """
+    Write a cart from Redis to the Cart table in one statement
+    """
+    from .models import Cart
+
+    # Clear the dirty flag first so changes made during the flush mark it again
+    _redis().srem(DIRTY_CARTS_KEY, str(user_id))
+
+    items, total_ac = _read(user_id)
+    conversion_rate = get_rate()
+
+    Cart.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'items': items,
+            'total_ac': total_ac,
+            'total_naira': total_ac * conversion_rate,
+        }
+    )
+
+
+def flush_dirty(batch_size=FLUSH_BATCH_SIZE):
+    """
+    Persist a batch of carts changed since their last flush
+
+    Returns:
+        dict: Number of carts flushed and failed
+    """
+    conn = _redis()
+    user_ids = [_decode(u) for u in conn.spop(DIRTY_CARTS_KEY, batch_size) or []]
+
+    flushed = failed = 0
+    for user_id in user_ids:
+        try:
+            flush(user_id)
+            flushed += 1
+        except Exception as e:
+            logger.error(f"Error flushing cart for user {user_id}: {str(e)}")
+            conn.sadd(DIRTY_CARTS_KEY, user_id)
+            failed += 1
+
+    return {'flushed': flushed, 'failed': failed}
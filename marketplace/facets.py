@@ -0,0 +1,99 @@
+"""
+AgroMentor 360 - Marketplace Facets
+Filter counts for the product listing from a single grouped query
+
+Counts are computed over the listing's non-facet filters (search, seller,
+location) with one GROUP BY over every facet column. Each facet's counts
+then apply every *other* selected facet, so a shopper filtering on
+category still sees how many products each other category has. The grouped
+rows are cached per non-facet filter set, so changing facet selections
+costs no query at all.
+"""
+
+from django.db.models import Count
+
+from .cache import cached_data
+
+
+# Query parameter -> Product column
+FACETS = {
+    'category': 'category',
+    'state': 'location_state',
+    'grade': 'quality_grade',
+    'organic': 'organic_certified',
+    'delivery': 'delivery_available',
+}
+
+
+def facet_filters(selected):
+    """
+    Queryset filter kwargs for the selected facet values
+    """
+    return {
+        FACETS[name]: value
+        for name, value in selected.items()
+        if value is not None and value != ''
+    }
+
+
+def _grouped_counts(queryset):
+    """
+    [(facet values tuple, count)] for every combination present
+    """
+    columns = list(FACETS.values())
+    rows = queryset.order_by().values(*columns).annotate(total=Count('id'))
+    return [
+        (tuple(row[column] for column in columns), row['total'])
+        for row in rows
+    ]
+
+
+def compute_facets(groups, selected):
+    """
+    Per-facet value counts from grouped rows
+
+    Args:
+        groups: Output of _grouped_counts
+        selected: {facet name: selected value or None}
+
+    Returns:
+        dict: {facet name: [{'value', 'count', 'selected'}] most common first}
+    """
+    names = list(FACETS)
+    active = {
+        names.index(name): value
+        for name, value in selected.items()
+        if name in FACETS and value is not None and value != ''
+    }
+
+    facets = {}
+    for position, name in enumerate(names):
+        others = [(i, v) for i, v in active.items() if i != position]
+        counts = {}
+        for values, total in groups:
+            if all(values[i] == v for i, v in others):
+                counts[values[position]] = counts.get(values[position], 0) + total
+
+        facets[name] = [
+            {'value': value, 'count': count, 'selected': active.get(position) == value}
+            for value, count in sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))
+            if value is not None and value != ''
+        ]
+    return facets
+
+
+def get_facets(queryset, base_params, selected, scopes):
+    """
+    Facet counts for a listing
+
+    Args:
+        queryset: Listing queryset with every filter except the facets applied
+        base_params: Dict of the non-facet filters, used in the cache key
+        selected: {facet name: selected value or None}
+        scopes: Version keys the listing depends on
+
+    Returns:
+        dict: See compute_facets
+    """
+    groups = cached_data('product_facets', base_params, scopes, lambda: _grouped_counts(queryset))
+    return compute_facets(groups, selected)
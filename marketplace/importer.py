@@ -0,0 +1,363 @@
+"""
+AgroMentor 360 - Bulk Product Import
+CSV/XLSX uploads of produce lots for cooperatives listing many products at once
+
+Rows are read one at a time (the csv module, or openpyxl in read-only mode)
+and checked with plain field validators instead of a serializer per row.
+Valid rows are priced with one rate lookup for the whole file and written
+with bulk_create in chunks, all in one transaction; each chunk refreshes the
+search index, autocomplete counts and listing caches once. Invalid rows are
+reported by row number and never block the rest of the file.
+
+A primary_image cell names an image already uploaded to one of the seller's
+listings; other paths and URLs are rejected rather than stored.
+"""
+
+from django.db import transaction
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+import csv
+import io
+import logging
+
+from blockchain.rates import get_rate
+from utils.geo import encode_geohash
+
+logger = logging.getLogger(__name__)
+
+
+MAX_IMPORT_ROWS = 10000
+MAX_IMPORT_FILE_SIZE = 10 * 1024 * 1024
+CHUNK_SIZE = 500
+MAX_AMOUNT = Decimal('99999999.99')   # Product price and quantity columns are 10 digits
+MAX_REPORTED_ERRORS = 1000
+
+REQUIRED_COLUMNS = [
+    'name', 'category', 'description', 'price_agrocoin', 'quantity_available',
+    'unit', 'harvest_date', 'location_city', 'location_state',
+]
+OPTIONAL_COLUMNS = [
+    'minimum_order', 'primary_image', 'organic_certified', 'quality_grade',
+    'latitude', 'longitude', 'delivery_available', 'pickup_available',
+    'delivery_fee_naira', 'status',
+]
+
+# Header spellings accepted for a column
+COLUMN_ALIASES = {
+    'price': 'price_agrocoin',
+    'price_ac': 'price_agrocoin',
+    'quantity': 'quantity_available',
+    'image': 'primary_image',
+    'city': 'location_city',
+    'state': 'location_state',
+    'grade': 'quality_grade',
+    'organic': 'organic_certified',
+}
+
+IMPORT_STATUSES = ['draft', 'available']
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y']
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', ''}
+
+
+class ProductImportError(ValueError):
+    """Raised when an upload cannot be read as a product sheet"""
+    pass
+
+
+def _header(name):
+    key = '_'.join(str(name or '').strip().lower().split())
+    return COLUMN_ALIASES.get(key, key)
+
+
+def _csv_rows(upload):
+    text = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    try:
+        header = next(reader)
+    except StopIteration:
+        return [], iter(())
+    except UnicodeDecodeError:
+        raise ProductImportError('CSV files must be UTF-8 encoded')
+    return [_header(name) for name in header], reader
+
+
+def _xlsx_rows(upload):
+    from openpyxl import load_workbook
+
+    try:
+        workbook = load_workbook(upload, read_only=True, data_only=True)
+    except Exception:
+        raise ProductImportError('Could not read the XLSX file')
+    rows = workbook.active.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return [], iter(())
+    return [_header(name) for name in header], rows
+
+
+def read_rows(upload, filename):
+    """
+    Yield (row number, {column: raw value}) from a CSV or XLSX upload
+
+    Raises:
+        ProductImportError: For unsupported files or missing columns
+    """
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        header, rows = _csv_rows(upload)
+    elif name.endswith('.xlsx'):
+        header, rows = _xlsx_rows(upload)
+    else:
+        raise ProductImportError('Upload a .csv or .xlsx file')
+
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ProductImportError(f"Missing columns: {', '.join(missing)}")
+
+    known = set(REQUIRED_COLUMNS) | set(OPTIONAL_COLUMNS)
+    columns = [(i, column) for i, column in enumerate(header) if column in known]
+
+    # Row 1 is the header
+    number = 1
+    try:
+        for number, values in enumerate(rows, start=2):
+            row = {
+                column: values[i] if i < len(values) else None
+                for i, column in columns
+            }
+            if all(value is None or str(value).strip() == '' for value in row.values()):
+                continue
+            yield number, row
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ProductImportError(f'Could not read the file after row {number}: {e}')
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _decimal(value, minimum, places=2, maximum=MAX_AMOUNT):
+    try:
+        number = Decimal(_text(value).replace(',', ''))
+    except InvalidOperation:
+        raise ValueError('Enter a number')
+    if not number.is_finite():
+        raise ValueError('Enter a number')
+    if number < minimum:
+        raise ValueError(f'Must be at least {minimum}')
+    if number > maximum:
+        raise ValueError(f'Must be at most {maximum}')
+    return number.quantize(Decimal(1).scaleb(-places))
+
+
+def _date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = _text(value)
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError('Use YYYY-MM-DD')
+
+
+def _bool(value, default):
+    if value is None or _text(value) == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    text = _text(value).lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError('Use yes or no')
+
+
+def _choice(value, choices, field):
+    text = _text(value).lower()
+    if text not in choices:
+        raise ValueError(f"'{_text(value)}' is not a valid {field}")
+    return text
+
+
+class RowValidator:
+    """
+    Turns raw sheet rows into Product field dicts, collecting errors per field
+    """
+
+    def __init__(self, seller):
+        from .models import Product
+
+        fields = {field.name: field for field in Product._meta.get_fields() if hasattr(field, 'choices')}
+        self.categories = {value for value, _ in fields['category'].choices}
+        self.units = {value for value, _ in fields['unit'].choices}
+        self.grades = {value for value, _ in fields['quality_grade'].choices}
+        self.max_lengths = {
+            name: fields[name].max_length
+            for name in ['name', 'location_city', 'location_state', 'primary_image']
+        }
+        # Image name -> derivatives, for images already on this seller's listings
+        self.images = dict(
+            Product.objects.filter(seller=seller).exclude(primary_image='')
+            .order_by().values_list('primary_image', 'image_variants')
+        )
+        self.stored = {}
+
+    def _image(self, value):
+        """
+        An image already uploaded to one of the seller's listings, by its
+        stored name; arbitrary paths and URLs are never accepted
+        """
+        from django.core.files.storage import default_storage
+
+        name = _text(value)
+        if not name:
+            return ''
+        if len(name) > self.max_lengths['primary_image']:
+            raise ValueError(f"At most {self.max_lengths['primary_image']} characters")
+        if name not in self.stored:
+            self.stored[name] = name in self.images and default_storage.exists(name)
+        if not self.stored[name]:
+            raise ValueError('Use the file name of an image already uploaded to one of your listings')
+        return name
+
+    def __call__(self, row):
+        """
+        Returns:
+            tuple: (fields dict or None, {column: error message})
+        """
+        data, errors = {}, {}
+
+        def check(column, parse):
+            try:
+                data[column] = parse(row.get(column))
+            except ValueError as e:
+                errors[column] = str(e)
+
+        for column in ['name', 'description', 'location_city', 'location_state']:
+            def required(value, column=column):
+                text = _text(value)
+                if not text:
+                    raise ValueError('This field is required')
+                if column in self.max_lengths and len(text) > self.max_lengths[column]:
+                    raise ValueError(f'At most {self.max_lengths[column]} characters')
+                return text
+            check(column, required)
+
+        check('category', lambda v: _choice(v, self.categories, 'category'))
+        check('unit', lambda v: _choice(v, self.units, 'unit'))
+        check('price_agrocoin', lambda v: _decimal(v, Decimal('0.01')))
+        check('quantity_available', lambda v: _decimal(v, Decimal('0')))
+        check('minimum_order', lambda v: _decimal(v, Decimal('0.01')) if _text(v) else Decimal('1.0'))
+        check('delivery_fee_naira', lambda v: _decimal(v, Decimal('0')) if _text(v) else Decimal('0.00'))
+        check('harvest_date', _date)
+        check('organic_certified', lambda v: _bool(v, False))
+        check('delivery_available', lambda v: _bool(v, True))
+        check('pickup_available', lambda v: _bool(v, True))
+        check('quality_grade', lambda v: _choice(v, {g.lower() for g in self.grades}, 'grade').upper() if _text(v) else None)
+        check('status', lambda v: _choice(v, IMPORT_STATUSES, 'status') if _text(v) else 'draft')
+        check('primary_image', self._image)
+        check('latitude', lambda v: _decimal(v, Decimal('-90'), 6, Decimal('90')) if _text(v) else None)
+        check('longitude', lambda v: _decimal(v, Decimal('-180'), 6, Decimal('180')) if _text(v) else None)
+
+        if (data.get('latitude') is None) != (data.get('longitude') is None) and not errors.keys() & {'latitude', 'longitude'}:
+            errors['longitude' if data.get('latitude') is not None else 'latitude'] = 'Give both latitude and longitude'
+        if data.get('status') == 'available' and not data.get('primary_image') and 'primary_image' not in errors:
+            errors['primary_image'] = 'Required for available listings; import as draft and add a photo later'
+        if data.get('primary_image'):
+            # Same file, so the listing's derivatives carry over
+            data['image_variants'] = self.images[data['primary_image']] or {}
+
+        return (None, errors) if errors else (data, {})
+
+
+def _write_chunk(seller, rows, rate):
+    """
+    bulk_create one chunk and refresh what Product.save would have
+    """
+    from .models import Product
+    from .search import index_products
+    from .cache import invalidate_products
+    from .autocomplete import products_created
+
+    products = []
+    for data in rows:
+        product = Product(seller=seller, **data)
+        product.price_naira = product.price_agrocoin * rate
+        if product.latitude is not None:
+            product.geohash = encode_geohash(product.latitude, product.longitude)
+        products.append(product)
+
+    Product.objects.bulk_create(products)
+    index_products(products)
+    products_created(products)
+    # One product per category is enough to reach every listing counter
+    invalidate_products(list({p.category: p for p in products}.values()))
+
+    return len(products)
+
+
+def import_products(seller, upload, filename, dry_run=False):
+    """
+    Validate a product sheet row by row and create the valid rows
+
+    Args:
+        seller: User the products are listed for
+        upload: File object of the CSV/XLSX upload
+        filename: Original file name (selects the reader)
+        dry_run: Validate only, create nothing
+
+    Returns:
+        dict: rows, created, failed, errors [{'row', 'errors': {column: message}}]
+            (at most MAX_REPORTED_ERRORS) and truncated
+
+    Raises:
+        ProductImportError: If the file cannot be read
+    """
+    validate = RowValidator(seller)
+    rate = get_rate()
+
+    rows = created = failed = 0
+    errors = []
+    chunk = []
+
+    # One transaction: a file that turns out to be malformed creates nothing
+    with transaction.atomic():
+        for number, raw in read_rows(upload, filename):
+            if rows == MAX_IMPORT_ROWS:
+                failed += 1
+                errors.append({'row': number, 'errors': {
+                    'file': f'At most {MAX_IMPORT_ROWS} rows per import; this row and the rest were not imported'
+                }})
+                break
+            rows += 1
+
+            data, row_errors = validate(raw)
+            if row_errors:
+                failed += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({'row': number, 'errors': row_errors})
+                continue
+
+            chunk.append(data)
+            if len(chunk) == CHUNK_SIZE:
+                created += len(chunk) if dry_run else _write_chunk(seller, chunk, rate)
+                chunk = []
+
+        if chunk:
+            created += len(chunk) if dry_run else _write_chunk(seller, chunk, rate)
+
+    logger.info(f"Product import for {seller.id}: {created} created, {failed} failed of {rows} rows")
+    return {
+        'rows': rows,
+        'created': created,
+        'failed': failed,
+        'errors': errors,
+        'truncated': failed > len(errors),
+        'dry_run': dry_run,
+    }
@@ -0,0 +1,236 @@
+"""
+AgroMentor 360 - Marketplace Listing Engine
+Whitelisted sorts, opaque keyset cursors and sparse fieldsets for product listings
+"""
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from utils.constants import MAX_PAGE_SIZE
+
+
+# Sort key -> ordering. Every ordering ends in a unique column so keyset
+# pagination is stable, and each is backed by a composite index on Product.
+SORT_OPTIONS = {
+    'newest': ('-created_at', '-id'),
+    'oldest': ('created_at', 'id'),
+    'price_low': ('price_agrocoin', 'id'),
+    'price_high': ('-price_agrocoin', '-id'),
+    'rating': ('-average_rating', '-id'),
+    'popular': ('-view_count', '-id'),
+    'relevance': ('-search_rank', '-id'),
+}
+
+# Raw order_by values accepted before sort keys were whitelisted
+LEGACY_SORTS = {
+    '-created_at': 'newest',
+    'created_at': 'oldest',
+    'price_agrocoin': 'price_low',
+    '-price_agrocoin': 'price_high',
+    '-average_rating': 'rating',
+}
+
+DEFAULT_SORT = 'newest'
+
+# Short names clients may use in `fields=` and the serializer fields they expand to
+FIELD_ALIASES = {
+    'price': ['price_agrocoin', 'price_naira'],
+    'thumbnail': ['images'],
+    'quantity': ['quantity_available'],
+    'rating': ['average_rating'],
+}
+
+# Serializer fields that are not plain Product columns
+FIELD_COLUMNS = {
+    'seller_name': ['seller__first_name', 'seller__last_name'],
+    'seller_location': ['location_city'],
+    'images': ['primary_image', 'image_variants'],
+}
+
+CURSOR_SALT = 'marketplace.listing.cursor'
+
+
+class ListingError(ValueError):
+    """Raised for invalid sort, cursor, limit or fields parameters"""
+    pass
+
+
+def resolve_sort(sort, searching=False):
+    """
+    Validate a requested sort key
+
+    Returns:
+        tuple: (sort_key, ordering)
+    """
+    if not sort:
+        sort = 'relevance' if searching else DEFAULT_SORT
+    sort = LEGACY_SORTS.get(sort, sort)
+
+    if sort not in SORT_OPTIONS:
+        raise ListingError(f"Invalid sort '{sort}'. Choose from: {', '.join(SORT_OPTIONS)}")
+    if sort == 'relevance' and not searching:
+        raise ListingError("Sort 'relevance' requires a search query")
+
+    return sort, SORT_OPTIONS[sort]
+
+
+def resolve_limit(limit):
+    """
+    Clamp the requested page size to [1, MAX_PAGE_SIZE]
+    """
+    default = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+    if limit in (None, ''):
+        return default
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ListingError('limit must be an integer')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def resolve_uuid(value, name):
+    """
+    Validate an optional UUID filter parameter
+    """
+    if not value:
+        return None
+    try:
+        return str(UUID(value))
+    except (TypeError, ValueError):
+        raise ListingError(f'{name} must be a valid id')
+
+
+def resolve_bool(value, name):
+    """
+    Parse an optional true/false filter parameter
+    """
+    if value in (None, ''):
+        return None
+    value = str(value).strip().lower()
+    if value in ('1', 'true', 'yes'):
+        return True
+    if value in ('0', 'false', 'no'):
+        return False
+    raise ListingError(f'{name} must be true or false')
+
+
+def resolve_fields(fields_param, available):
+    """
+    Parse a comma-separated `fields=` parameter against the serializer's fields
+
+    Returns:
+        list or None: Requested field names (always including 'id'), or None for all
+    """
+    if not fields_param:
+        return None
+
+    requested = ['id']
+    for name in fields_param.split(','):
+        name = name.strip()
+        if not name:
+            continue
+        for field in FIELD_ALIASES.get(name, [name]):
+            if field not in available:
+                raise ListingError(f"Unknown field '{name}'")
+            if field not in requested:
+                requested.append(field)
+    return requested
+
+
+def columns_for_fields(fields, ordering=()):
+    """
+    Product columns needed to serialize the given fields and build the
+    next cursor from `ordering` (for QuerySet.only)
+    """
+    from marketplace.models import Product
+
+    concrete = {f.name for f in Product._meta.concrete_fields}
+
+    columns = {'id'}
+    for field in fields:
+        columns.update(FIELD_COLUMNS.get(field, [field]))
+    columns.update(f.lstrip('-') for f in ordering if f.lstrip('-') in concrete)
+    return sorted(columns)
+
+
+def _json_value(value):
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(sort, values):
+    """
+    Build an opaque, tamper-proof cursor from the last row's sort values
+    """
+    return signing.dumps(
+        {'s': sort, 'v': [_json_value(v) for v in values]},
+        salt=CURSOR_SALT,
+        compress=True
+    )
+
+
+def decode_cursor(cursor, sort, ordering=None):
+    """
+    Decode a cursor produced by encode_cursor for the same sort key
+
+    `ordering` defaults to the product sort option named `sort`.
+    """
+    try:
+        payload = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        raise ListingError('Invalid cursor')
+
+    size = len(ordering if ordering is not None else SORT_OPTIONS[sort])
+    if payload.get('s') != sort or len(payload.get('v', [])) != size:
+        raise ListingError('Cursor does not match the requested sort')
+    return payload['v']
+
+
+def keyset_filter(ordering, values):
+    """
+    Q object selecting rows strictly after `values` in `ordering`
+
+    For ordering (a, b) this is: a > va OR (a = va AND b > vb),
+    with < in place of > for descending columns.
+    """
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+
+        clause = Q(**{f'{name}__{lookup}': values[i]})
+        for prev_field, prev_value in zip(ordering[:i], values[:i]):
+            clause &= Q(**{prev_field.lstrip('-'): prev_value})
+        condition |= clause
+    return condition
+
+
+def paginate(queryset, sort, ordering, cursor=None, limit=None):
+    """
+    Fetch one page of a queryset using keyset pagination
+
+    Returns:
+        tuple: (rows, next_cursor) where next_cursor is None on the last page
+    """
+    limit = resolve_limit(limit)
+
+    if cursor:
+        queryset = queryset.filter(keyset_filter(ordering, decode_cursor(cursor, sort, ordering)))
+
+    rows = list(queryset.order_by(*ordering)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, [getattr(last, f.lstrip('-')) for f in ordering])
+
+    return rows, next_cursor
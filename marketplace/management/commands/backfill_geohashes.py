@@ -0,0 +1,23 @@
+"""
+AgroMentor 360 - Geohash Backfill
+One-off geohashing of farms and products saved before the column existed
+"""
+
+from django.core.management.base import BaseCommand
+
+from farming.models import Farm
+from marketplace.models import Product
+from utils.geo import backfill_geohashes
+
+
+class Command(BaseCommand):
+    help = 'Geohash farms and products saved before the column existed, so nearby lookups find them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for model in (Farm, Product):
+            filled = backfill_geohashes(model.objects.using(options['database']), options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Geohashed {filled} {str(model._meta.verbose_name_plural).lower()}'))
@@ -0,0 +1,19 @@
+"""
+AgroMentor 360 - Rating Sum Backfill
+One-off fill of Product.rating_sum for products reviewed before it existed
+"""
+
+from django.core.management.base import BaseCommand
+
+from marketplace.models import backfill_rating_sums
+
+
+class Command(BaseCommand):
+    help = 'Fill the rating sum of products reviewed before it existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        filled = backfill_rating_sums(options['database'])
+        self.stdout.write(self.style.SUCCESS(f'Filled rating sums of {filled} products'))
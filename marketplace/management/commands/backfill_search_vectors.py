@@ -0,0 +1,20 @@
+"""
+AgroMentor 360 - Search Vector Backfill
+One-off fill of Product.search_vector for products written before it existed
+"""
+
+from django.core.management.base import BaseCommand
+
+from marketplace.search import BACKFILL_BATCH_SIZE, backfill_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Fill the search vector of products written before it existed (PostgreSQL only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        filled = backfill_search_vectors(options['database'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Filled search vectors of {filled} products'))
@@ -1,10 +1,17 @@
-from django.db import models
-from django.db.models import Avg, Count
+from django.db import models, transaction
+from django.db.models import Count, Sum, F, Case, When, Value
+from django.db.models.functions import Cast
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
 import uuid
 
+from blockchain.rates import get_rate
+
+
+RATING_FIELD = models.DecimalField(max_digits=3, decimal_places=2)
+
 
 class Product(models.Model):
     """
@@ -87,6 +94,11 @@ class Product(models.Model):
     
     # Product images
     primary_image = models.ImageField(upload_to='marketplace/products/')
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Resized WebP/JPEG copies of primary_image (see utils.images)"
+    )
     additional_images = models.JSONField(
         default=list,
         help_text="Additional product images"
@@ -117,6 +129,15 @@ class Product(models.Model):
     # Location
     location_city = models.CharField(max_length=100)
     location_state = models.CharField(max_length=100)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    geohash = models.CharField(
+        max_length=12,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Geohash of latitude/longitude for proximity search"
+    )
     
     # Delivery options
     delivery_available = models.BooleanField(default=True)
@@ -138,6 +159,10 @@ class Product(models.Model):
         validators=[MinValueValidator(0), MaxValueValidator(5)]
     )
     total_reviews = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(
+        default=0,
+        help_text="Sum of review ratings, maintained incrementally with total_reviews"
+    )
     
     # Stats
     total_sold = models.DecimalField(
@@ -145,7 +170,13 @@ class Product(models.Model):
         decimal_places=2,
         default=Decimal('0.00')
     )
-    view_count = models.IntegerField(default=0)
+    view_count = models.IntegerField(
+        default=0,
+        help_text="Buffered in Redis and flushed periodically (see marketplace.view_counter)"
+    )
+    
+    # Full-text search document (PostgreSQL only, maintained by marketplace.search)
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -160,33 +191,138 @@ class Product(models.Model):
             models.Index(fields=['seller', 'status']),
             models.Index(fields=['category', 'status']),
             models.Index(fields=['location_city']),
+            # Keyset listing sorts (see marketplace.listing.SORT_OPTIONS)
+            models.Index(fields=['status', '-created_at', '-id']),
+            models.Index(fields=['status', 'category', '-created_at', '-id']),
+            models.Index(fields=['status', 'price_agrocoin', 'id']),
+            models.Index(fields=['status', '-average_rating', '-id']),
+            models.Index(fields=['status', '-view_count', '-id']),
+            # Proximity search (see utils.geo)
+            models.Index(fields=['status', 'geohash']),
         ]
     
     def __str__(self):
         return f"{self.name} - {self.price_agrocoin} AC (₦{self.price_naira})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember where the product was listed so moves invalidate both pages
+        instance._loaded_scope = {
+            'category': instance.__dict__.get('category'),
+            'seller_id': instance.__dict__.get('seller_id'),
+        }
+        instance._loaded_term = (instance.__dict__.get('name'), instance.__dict__.get('status'))
+        instance._loaded_text = tuple(instance.__dict__.get(field) for field in ('name', 'category', 'description'))
+        return instance
+    
     def save(self, *args, **kwargs):
         """Auto-calculate Naira price from AgroCoin price"""
-        conversion_rate = Decimal(str(settings.SOLANA_CONFIG['AGROCOIN_TO_NAIRA_RATE']))
+        conversion_rate = get_rate()
         self.price_naira = self.price_agrocoin * conversion_rate
+        
+        # Products listed from a farm are located at the farm by default
+        if self.latitude is None and self.farm_id and kwargs.get('update_fields') is None:
+            from farming.models import Farm
+            self.latitude, self.longitude = Farm.objects.filter(
+                pk=self.farm_id
+            ).values_list('latitude', 'longitude').first() or (None, None)
+        
+        from utils.geo import encode_geohash
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = None
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        
         super().save(*args, **kwargs)
+        
+        # Keep search index current when searchable text changed
+        update_fields = kwargs.get('update_fields')
+        text = (self.name, self.category, self.description)
+        text_saved = update_fields is None or {'name', 'category', 'description'} & set(update_fields)
+        if text_saved and text != getattr(self, '_loaded_text', None):
+            from .search import index_product
+            index_product(self)
+            self._loaded_text = text
+        
+        from .cache import invalidate_product
+        invalidate_product(self, getattr(self, '_loaded_scope', None))
+        self._loaded_scope = {'category': self.category, 'seller_id': self.seller_id}
+        
+        # Autocomplete counts available products per name
+        if update_fields is None or {'name', 'status'} & set(update_fields):
+            from .autocomplete import product_changed
+            product_changed(getattr(self, '_loaded_term', None), (self.name, self.status))
+            self._loaded_term = (self.name, self.status)
+        
+        # Stock or status may have changed; checkout holds reload it
+        from .reservations import reset_stock
+        product_id = self.pk
+        transaction.on_commit(lambda: reset_stock([product_id]))
+        
+        from utils.images import schedule_derivatives
+        from .tasks import generate_product_images
+        schedule_derivatives(self, 'primary_image', 'image_variants', generate_product_images, update_fields)
+    
+    def delete(self, *args, **kwargs):
+        from .search import remove_product
+        from .cache import invalidate_product
+        from .autocomplete import product_changed
+        product_id = self.pk
+        invalidate_product(self)
+        product_changed(getattr(self, '_loaded_term', (self.name, self.status)), None)
+        result = super().delete(*args, **kwargs)
+        remove_product(product_id)
+        return result
 
     reviews: models.Manager['Review']
 
     def update_rating(self):
-        """Recalculate average rating efficiently using DB aggregation"""
-        # This runs 1 fast SQL query instead of loading 1000s of objects
+        """Recalculate rating aggregates from scratch (corrects drift)"""
         stats = self.reviews.aggregate(
-            average=Avg('rating'), 
+            total=Sum('rating'),
             count=Count('id')
         )
         
-        # Safe handling if there are no reviews yet
-        self.average_rating = stats['average'] or Decimal('0.00')
+        self.rating_sum = stats['total'] or 0
         self.total_reviews = stats['count'] or 0
+        self.average_rating = (
+            Decimal(self.rating_sum) / self.total_reviews
+            if self.total_reviews else Decimal('0.00')
+        ).quantize(Decimal('0.01'))
         
         # Update only the specific fields to avoid overwriting other changes
-        self.save(update_fields=['average_rating', 'total_reviews'])
+        self.save(update_fields=['rating_sum', 'total_reviews', 'average_rating'])
+    
+    @classmethod
+    def apply_rating_delta(cls, product_id, rating_delta, count_delta):
+        """
+        Adjust a product's rating aggregates in one UPDATE, without reading reviews
+        
+        Args:
+            product_id: Product to update
+            rating_delta: Change in the sum of ratings
+            count_delta: Change in the number of reviews (-1, 0 or 1)
+        """
+        new_sum = F('rating_sum') + rating_delta
+        new_count = F('total_reviews') + count_delta
+        
+        cls.objects.filter(pk=product_id).update(
+            rating_sum=new_sum,
+            total_reviews=new_count,
+            average_rating=Case(
+                When(
+                    total_reviews__gt=-count_delta,
+                    then=Cast(new_sum, models.FloatField()) / new_count
+                ),
+                default=Value(Decimal('0.00')),
+                output_field=RATING_FIELD
+            )
+        )
     
     @property
     def is_available(self):
@@ -283,6 +419,17 @@ class Order(models.Model):
         related_name='marketplace_order'
     )
     paid_at = models.DateTimeField(null=True, blank=True)
+    reservation_id = models.CharField(
+        max_length=32,
+        null=True,
+        blank=True,
+        unique=True,
+        help_text="Checkout stock hold, committed to product stock on payment"
+    )
+    price_indexed = models.BooleanField(
+        default=False,
+        help_text="Lines folded into the crop price index (see marketplace.price_index)"
+    )
     
     # Delivery
     delivery_method = models.CharField(
@@ -320,6 +467,9 @@ class Order(models.Model):
             models.Index(fields=['buyer', 'status']),
             models.Index(fields=['seller', 'status']),
             models.Index(fields=['order_number']),
+            # Seller inbox, newest first, with and without a status filter
+            models.Index(fields=['seller', '-created_at', '-id']),
+            models.Index(fields=['seller', 'status', '-created_at', '-id']),
         ]
     
     def __str__(self):
@@ -337,7 +487,7 @@ class Order(models.Model):
     
     def calculate_totals(self):
         """Calculate order totals in AC and Naira"""
-        conversion_rate = Decimal(str(settings.SOLANA_CONFIG['AGROCOIN_TO_NAIRA_RATE']))
+        conversion_rate = get_rate()
         
         # Calculate subtotal
         self.subtotal_ac = sum(Decimal(str(item['price_ac'])) * Decimal(str(item['quantity'])) 
@@ -361,7 +511,7 @@ class OrderItem(models.Model):
     order = models.ForeignKey(
         Order,
         on_delete=models.CASCADE,
-        related_name='items'
+        related_name='line_items'
     )
     product = models.ForeignKey(
         Product,
@@ -444,10 +594,138 @@ class Review(models.Model):
     def __str__(self):
         return f"{self.rating}★ review for {self.product.name}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_rating = (instance.__dict__.get('product_id'), instance.__dict__.get('rating'))
+        return instance
+    
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Update product rating
-        self.product.update_rating()
+        """Save and adjust the product's rating aggregates by the difference"""
+        adding = self._state.adding
+        previous_product, previous_rating = getattr(self, '_loaded_rating', (None, None))
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            
+            if adding or previous_rating is None:
+                Product.apply_rating_delta(self.product_id, self.rating, 1)
+            elif previous_product != self.product_id:
+                Product.apply_rating_delta(previous_product, -previous_rating, -1)
+                Product.apply_rating_delta(self.product_id, self.rating, 1)
+            elif previous_rating != self.rating:
+                Product.apply_rating_delta(self.product_id, self.rating - previous_rating, 0)
+        
+        self._loaded_rating = (self.product_id, self.rating)
+        self._invalidate_products(previous_product)
+    
+    def delete(self, *args, **kwargs):
+        product_id, rating = getattr(self, '_loaded_rating', (self.product_id, self.rating))
+        
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Product.apply_rating_delta(product_id, -rating, -1)
+        
+        self._invalidate_products()
+        return result
+    
+    def _invalidate_products(self, previous_product=None):
+        from .cache import invalidate_products
+        
+        products = [self.product]
+        if previous_product and previous_product != self.product_id:
+            products.extend(Product.objects.filter(pk=previous_product).only('id', 'category', 'seller_id'))
+        invalidate_products(products)
+
+
+def backfill_rating_sums(using='default'):
+    """
+    Fill rating_sum for products reviewed before the column existed
+    One-off, run by the backfill_rating_sums command; ratings are at least 1,
+    so a zero sum with reviews only occurs on rows the incremental path has
+    never touched
+
+    Returns:
+        int: Number of products filled
+    """
+    from django.db.models import OuterRef, Subquery
+    from django.db.models.functions import Coalesce
+    
+    totals = Review.objects.using(using).filter(
+        product=OuterRef('pk')
+    ).order_by().values('product').annotate(total=Sum('rating')).values('total')
+    
+    return Product.objects.using(using).filter(rating_sum=0, total_reviews__gt=0).update(
+        rating_sum=Coalesce(Subquery(totals), Value(0), output_field=models.IntegerField())
+    )
+
+
+class ProductRecommendation(models.Model):
+    """
+    Precomputed "frequently bought together" neighbours of a product
+    Rebuilt nightly from order history (see marketplace.recommendations)
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='recommendation'
+    )
+    related = models.JSONField(
+        default=list,
+        help_text="[[product_id, score], ...] best first"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'marketplace_product_recommendations'
+        verbose_name = 'Product Recommendation'
+        verbose_name_plural = 'Product Recommendations'
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
+    
+    def __str__(self):
+        return f"Recommendations for {self.product_id}"
+
+
+class CropPriceBucket(models.Model):
+    """
+    One day of paid prices for a crop (or category) in a state and unit
+    Folded in incrementally as orders are paid (see marketplace.price_index)
+    """
+    category = models.CharField(max_length=50)
+    crop = models.CharField(max_length=50, blank=True, help_text="Known crop name, blank if unmatched")
+    state = models.CharField(max_length=100, blank=True)
+    unit = models.CharField(max_length=20, choices=Product.UNIT_CHOICES)
+    day = models.DateField()
+    
+    samples = models.PositiveIntegerField(default=0)
+    total_naira = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    min_naira = models.DecimalField(max_digits=15, decimal_places=2, null=True)
+    max_naira = models.DecimalField(max_digits=15, decimal_places=2, null=True)
+    histogram = models.JSONField(
+        default=dict,
+        help_text="{log-scale bin: count}, bins 2% wide"
+    )
+    
+    class Meta:
+        db_table = 'marketplace_crop_price_buckets'
+        verbose_name = 'Crop Price Bucket'
+        verbose_name_plural = 'Crop Price Buckets'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['category', 'crop', 'state', 'unit', 'day'],
+                name='unique_crop_price_bucket'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['crop', 'day']),
+            models.Index(fields=['category', 'day']),
+        ]
+    
+    def __str__(self):
+        return f"{self.crop or self.category} {self.state} per {self.unit} on {self.day}: {self.samples}"
 
 
 class Cart(models.Model):
@@ -494,7 +772,7 @@ class Cart(models.Model):
     
     def calculate_total(self):
         """Calculate cart total in AC and Naira"""
-        conversion_rate = Decimal(str(settings.SOLANA_CONFIG['AGROCOIN_TO_NAIRA_RATE']))
+        conversion_rate = get_rate()
         
         self.total_ac = sum(
             Decimal(str(item['price_ac'])) * Decimal(str(item['quantity']))
@@ -505,6 +783,8 @@ class Cart(models.Model):
     
     def add_item(self, product, quantity):
         """Add product to cart"""
+        from utils.images import thumbnail_url
+        
         # Check if item already in cart
         for item in self.items:
             if item['product_id'] == str(product.id):
@@ -519,7 +799,7 @@ class Cart(models.Model):
             'quantity': float(quantity),
             'price_ac': float(product.price_agrocoin),
             'price_ngn': float(product.price_naira),
-            'image': product.primary_image.url if product.primary_image else None
+            'image': thumbnail_url(product.primary_image, product.image_variants)
         })
         self.calculate_total()
     
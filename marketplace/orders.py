@@ -0,0 +1,460 @@
+"""
+AgroMentor 360 - Marketplace Order Placement
+Order creation, payment commit and cancellation with set-based stock updates
+"""
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, When, Value, F, DecimalField
+from django.utils import timezone
+from decimal import Decimal, InvalidOperation
+from uuid import UUID
+import logging
+
+from blockchain.rates import get_rate
+
+from . import autocomplete, reservations
+from .cache import invalidate_products
+
+logger = logging.getLogger(__name__)
+
+
+MAX_ORDER_LINES = 50
+
+CANCELLABLE_STATUSES = ['pending', 'confirmed']
+
+QUANTITY_FIELD = DecimalField(max_digits=10, decimal_places=2)
+
+
+# Statuses a seller may move an order to, and the statuses it may come from
+SELLER_TRANSITIONS = {
+    'processing': ['paid'],
+    'shipped': ['paid', 'processing'],
+    'delivered': ['shipped'],
+}
+
+# Older clients send 'confirmed', which is not an Order status
+STATUS_ALIASES = {'confirmed': 'processing'}
+
+MAX_BULK_ORDERS = 500
+
+
+class OrderError(ValueError):
+    """Raised when an order cannot be placed or cancelled"""
+    pass
+
+
+def normalise_items(items):
+    """
+    Validate requested order lines and merge repeated products
+
+    Args:
+        items: [{'product_id': ..., 'quantity': ...}]
+
+    Returns:
+        dict: {product_id (str): quantity (Decimal)}
+    """
+    if not items:
+        raise OrderError('Order items required')
+
+    quantities = {}
+    for item in items:
+        try:
+            product_id = str(UUID(str(item['product_id'])))
+            quantity = Decimal(str(item['quantity']))
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            raise OrderError('Each item needs a valid product_id and quantity')
+
+        if not quantity.is_finite() or quantity <= 0:
+            raise OrderError('Item quantities must be positive')
+
+        quantities[product_id] = quantities.get(product_id, Decimal('0')) + quantity
+
+    if len(quantities) > MAX_ORDER_LINES:
+        raise OrderError(f'An order can contain at most {MAX_ORDER_LINES} products')
+
+    return quantities
+
+
+def _per_product(quantities):
+    """
+    CASE expression mapping each product id to its quantity
+    """
+    return Case(
+        *[When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        default=Value(Decimal('0')),
+        output_field=QUANTITY_FIELD
+    )
+
+
+def _decrement_stock(quantities):
+    """
+    Take stock for every line in one conditional UPDATE
+    Stock mirrors used by checkout holds are dropped once this commits
+
+    Returns:
+        int: Number of products updated (less than len(quantities) means
+        at least one product no longer had enough stock)
+    """
+    from .models import Product
+
+    per_product = _per_product(quantities)
+
+    updated = Product.objects.filter(
+        id__in=list(quantities),
+        status='available',
+        quantity_available__gte=per_product
+    ).update(
+        quantity_available=F('quantity_available') - per_product,
+        total_sold=F('total_sold') + per_product
+    )
+
+    sold_out = list(Product.objects.filter(
+        id__in=list(quantities),
+        status='available',
+        quantity_available__lte=0
+    ).values_list('id', 'name'))
+    if sold_out:
+        Product.objects.filter(
+            id__in=[pid for pid, _ in sold_out], status='available'
+        ).update(status='sold_out')
+        for _, name in sold_out:
+            autocomplete.product_changed((name, 'available'), (name, 'sold_out'))
+
+    product_ids = list(quantities)
+    transaction.on_commit(lambda: reservations.reset_stock(product_ids))
+    return updated
+
+
+def restock(quantities):
+    """
+    Return stock for cancelled lines in one UPDATE, reopening sold-out products
+    """
+    from .models import Product
+
+    if not quantities:
+        return 0
+
+    per_product = _per_product(quantities)
+
+    restored = Product.objects.filter(id__in=list(quantities)).update(
+        quantity_available=F('quantity_available') + per_product,
+        total_sold=F('total_sold') - per_product
+    )
+
+    reopened = list(Product.objects.filter(
+        id__in=list(quantities),
+        status='sold_out',
+        quantity_available__gt=0
+    ).values_list('id', 'name'))
+    if reopened:
+        Product.objects.filter(
+            id__in=[pid for pid, _ in reopened], status='sold_out'
+        ).update(status='available')
+        for _, name in reopened:
+            autocomplete.product_changed((name, 'sold_out'), (name, 'available'))
+
+    product_ids = list(quantities)
+    transaction.on_commit(lambda: reservations.reset_stock(product_ids))
+    return restored
+
+
+def place_order(buyer, items, delivery, reservation_id=None):
+    """
+    Place an order for a basket of products from a single seller
+
+    Stock is held in Redis (see marketplace.reservations) rather than taken
+    from the database: either the buyer's checkout reservation is reused or
+    a new hold is placed here. The hold is extended for the payment window
+    and the stock is committed to the database once payment is confirmed
+    (commit_paid_orders). Products are fetched in one query and order lines
+    written with one bulk insert, so the query count does not depend on
+    basket size.
+
+    Args:
+        buyer: User placing the order
+        items: [{'product_id': ..., 'quantity': ...}]
+        delivery: dict with delivery_method, delivery_address, delivery_city,
+            delivery_state, delivery_phone and optional buyer_notes
+        reservation_id: Optional id returned by the checkout reserve endpoint
+
+    Returns:
+        Order: The created order
+
+    Raises:
+        OrderError: If any line is invalid or out of stock
+    """
+    from .models import Product, Order, OrderItem
+
+    quantities = normalise_items(items)
+    conversion_rate = get_rate()
+    delivery_method = delivery.get('delivery_method') or 'delivery'
+
+    products = list(Product.objects.filter(id__in=list(quantities)))
+    by_id = {str(p.id): p for p in products}
+
+    missing = set(quantities) - set(by_id)
+    if missing:
+        raise OrderError(f'Product not found: {sorted(missing)[0]}')
+
+    sellers = {p.seller_id for p in products}
+    if len(sellers) > 1:
+        raise OrderError('Products from different sellers must be ordered separately')
+    if buyer.id in sellers:
+        raise OrderError('You cannot order your own products')
+
+    for product_id, quantity in quantities.items():
+        product = by_id[product_id]
+        if not product.is_available:
+            raise OrderError(f'Insufficient stock for {product.name}')
+        if quantity < product.minimum_order:
+            raise OrderError(
+                f'Minimum order for {product.name} is {product.minimum_order} {product.unit}'
+            )
+        if delivery_method == 'delivery' and not product.delivery_available:
+            raise OrderError(f'{product.name} is not available for delivery')
+        if delivery_method == 'pickup' and not product.pickup_available:
+            raise OrderError(f'{product.name} is not available for pickup')
+
+    reserved_here = not reservation_id
+    try:
+        if reservation_id:
+            if reservations.get_reservation(reservation_id, buyer.id) != quantities:
+                raise OrderError('Order items do not match the reservation')
+            # One order per reservation: resending the id cannot reuse the hold
+            reservations.claim(reservation_id, buyer.id)
+        else:
+            reservation_id = reservations.reserve(buyer.id, quantities)['reservation_id']
+        reservations.extend(reservation_id, quantities)
+    except reservations.ReservationError as e:
+        raise OrderError(str(e))
+
+    lines = [(by_id[product_id], quantity) for product_id, quantity in quantities.items()]
+
+    subtotal_ac = sum(product.price_agrocoin * quantity for product, quantity in lines)
+    delivery_fee_naira = Decimal('0.00')
+    if delivery_method == 'delivery':
+        delivery_fee_naira = max(product.delivery_fee_naira for product, _ in lines)
+    delivery_fee_ac = (delivery_fee_naira / conversion_rate).quantize(Decimal('0.01'))
+    total_ac = subtotal_ac + delivery_fee_ac
+
+    try:
+        with transaction.atomic():
+            order = Order.objects.create(
+                buyer=buyer,
+                seller_id=products[0].seller_id,
+                items=[
+                    {
+                        'product_id': str(product.id),
+                        'name': product.name,
+                        'quantity': str(quantity),
+                        'price_ac': str(product.price_agrocoin),
+                        'price_ngn': str(product.price_naira),
+                    }
+                    for product, quantity in lines
+                ],
+                subtotal_ac=subtotal_ac,
+                subtotal_naira=subtotal_ac * conversion_rate,
+                delivery_fee_ac=delivery_fee_ac,
+                delivery_fee_naira=delivery_fee_naira,
+                platform_fee_ac=subtotal_ac * Decimal(str(settings.PLATFORM_COMMISSION_RATE)),
+                total_ac=total_ac,
+                total_naira=total_ac * conversion_rate,
+                delivery_method=delivery_method,
+                delivery_address=delivery.get('delivery_address', ''),
+                delivery_city=delivery.get('delivery_city', ''),
+                delivery_state=delivery.get('delivery_state', ''),
+                delivery_phone=delivery.get('delivery_phone', buyer.phone_number),
+                buyer_notes=delivery.get('buyer_notes'),
+                reservation_id=reservation_id
+            )
+
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product=product,
+                    quantity=quantity,
+                    price=product.price_naira,
+                    subtotal=product.price_naira * quantity
+                )
+                for product, quantity in lines
+            ])
+    except IntegrityError:
+        if not reserved_here and Order.objects.filter(reservation_id=reservation_id).exists():
+            # Another order already holds this reservation; its hold stays
+            raise OrderError('Reservation already used for an order')
+        reservations.release(reservation_id, quantities)
+        raise
+    except Exception:
+        reservations.release(reservation_id, quantities)
+        raise
+
+    logger.info(f"Order {order.order_number} placed: {len(lines)} lines, {total_ac} AC")
+    return order
+
+
+def _order_quantities(order_ids):
+    """
+    Total ordered quantity per product across orders
+
+    Returns:
+        dict: {order_id: {product_id: quantity}}
+    """
+    from .models import OrderItem
+
+    per_order = {}
+    rows = OrderItem.objects.filter(
+        order_id__in=order_ids,
+        product__isnull=False
+    ).values_list('order_id', 'product_id', 'quantity')
+
+    for order_id, product_id, quantity in rows:
+        lines = per_order.setdefault(order_id, {})
+        lines[str(product_id)] = lines.get(str(product_id), Decimal('0')) + quantity
+    return per_order
+
+
+def commit_paid_orders(orders):
+    """
+    Take stock in the database for newly paid orders and release their holds
+
+    Called from the payment confirmation path inside its transaction. All
+    orders in the batch are committed with one locking read and one UPDATE.
+    Orders placed before holds existed already took their stock at placement
+    and are skipped.
+
+    Returns:
+        int: Number of orders committed
+    """
+    from .models import Product
+
+    reserved = [o for o in orders if o.reservation_id]
+    if not reserved:
+        return 0
+
+    per_order = _order_quantities([o.id for o in reserved])
+    totals = {}
+    for lines in per_order.values():
+        for product_id, quantity in lines.items():
+            totals[product_id] = totals.get(product_id, Decimal('0')) + quantity
+
+    if totals:
+        stock = dict(
+            Product.objects.select_for_update()
+            .filter(id__in=list(totals))
+            .order_by('id')
+            .values_list('id', 'quantity_available')
+        )
+        stock = {str(pid): quantity for pid, quantity in stock.items()}
+
+        # Payment is already taken, so never fail here. A shortfall means a
+        # hold expired before payment confirmed and the stock was sold again.
+        for product_id, quantity in totals.items():
+            available = stock.get(product_id, Decimal('0'))
+            if quantity > available:
+                logger.error(
+                    f"Oversold product {product_id}: {quantity} paid, {available} in stock"
+                )
+                totals[product_id] = available
+
+        _decrement_stock(totals)
+        invalidate_products(
+            Product.objects.filter(id__in=list(totals)).only('id', 'category', 'seller_id')
+        )
+
+    for order in reserved:
+        reservations.release_on_commit(
+            order.reservation_id,
+            per_order.get(order.id, {}),
+            committed=True
+        )
+
+    return len(reserved)
+
+
+def cancel_order(order):
+    """
+    Cancel an order, releasing its holds or returning its stock
+
+    The status change is a conditional UPDATE, so an order cancelled twice
+    concurrently is only restocked once.
+
+    Raises:
+        OrderError: If the order is no longer cancellable
+    """
+    from .models import Order, Product
+
+    with transaction.atomic():
+        cancelled = Order.objects.filter(
+            id=order.id,
+            status__in=CANCELLABLE_STATUSES
+        ).update(status='cancelled', updated_at=timezone.now())
+
+        if not cancelled:
+            raise OrderError('Cannot cancel order in current status')
+
+        quantities = _order_quantities([order.id]).get(order.id, {})
+
+        if order.reservation_id and order.status == 'pending':
+            # Stock was never taken from the database
+            reservations.release_on_commit(order.reservation_id, quantities)
+        else:
+            restock(quantities)
+            invalidate_products(
+                Product.objects.filter(id__in=list(quantities)).only('id', 'category', 'seller_id')
+            )
+
+    order.status = 'cancelled'
+    return order
+
+
+def transition_orders(seller, order_ids, new_status):
+    """
+    Move several of a seller's orders to a new status in one UPDATE
+
+    Orders that belong to another seller, do not exist, or are not in a
+    status the transition allows are skipped rather than failing the batch.
+
+    Args:
+        seller: Selling user
+        order_ids: Order ids (at most MAX_BULK_ORDERS)
+        new_status: 'processing', 'shipped' or 'delivered'
+
+    Returns:
+        tuple: (updated_ids, skipped_ids) as lists of strings
+
+    Raises:
+        OrderError: If the status or ids are invalid
+    """
+    from .models import Order
+
+    new_status = STATUS_ALIASES.get(new_status, new_status)
+    if new_status not in SELLER_TRANSITIONS:
+        raise OrderError(f"Invalid status. Choose from: {', '.join(SELLER_TRANSITIONS)}")
+
+    if not isinstance(order_ids, list) or not order_ids:
+        raise OrderError('order_ids must be a non-empty list')
+    if len(order_ids) > MAX_BULK_ORDERS:
+        raise OrderError(f'At most {MAX_BULK_ORDERS} orders can be updated at once')
+
+    try:
+        requested = {str(UUID(str(order_id))) for order_id in order_ids}
+    except ValueError:
+        raise OrderError('order_ids must be valid ids')
+
+    changes = {'status': new_status, 'updated_at': timezone.now()}
+    if new_status == 'delivered':
+        changes['actual_delivery'] = timezone.now().date()
+
+    with transaction.atomic():
+        eligible = list(Order.objects.select_for_update().filter(
+            seller=seller,
+            id__in=list(requested),
+            status__in=SELLER_TRANSITIONS[new_status]
+        ).values_list('id', flat=True))
+
+        if eligible:
+            Order.objects.filter(id__in=eligible).update(**changes)
+
+    updated = sorted(str(order_id) for order_id in eligible)
+    return updated, sorted(requested - set(updated))
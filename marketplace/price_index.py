@@ -0,0 +1,290 @@
+"""
+AgroMentor 360 - Crop Price Index
+Rolling median and interquartile range of paid prices per crop, state and unit
+
+Each paid order line is folded into a daily bucket keyed by category, crop,
+state and unit. A bucket keeps its count, sum, min, max and a sparse
+log-scale histogram of the Naira price per unit (bins 2% wide), so any
+window of days is answered by adding up a few dozen small histograms and
+reading the quartiles off the running total - never by scanning orders.
+"""
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+import math
+import re
+import logging
+
+from utils.constants import COMMON_CROPS
+
+logger = logging.getLogger(__name__)
+
+
+BIN_RATIO = 1.02                  # Histogram bin width: each bin spans 2%
+DEFAULT_WINDOW_DAYS = 30
+MAX_WINDOW_DAYS = 365
+MIN_SAMPLES = 3                   # Fewer paid lines than this is not an index
+
+INDEXED_STATUSES = ['paid', 'processing', 'shipped', 'delivered']
+
+_LOG_RATIO = math.log(BIN_RATIO)
+
+
+class PriceIndexError(ValueError):
+    """Raised for invalid price index queries"""
+    pass
+
+
+def _crop_pattern(name):
+    # Match singular and plural forms: 'tomato', 'tomatoes', 'orange', 'oranges'
+    stem = re.sub(r'(?<=o)es$|s$', '', name.lower())
+    return re.compile(rf'\b{re.escape(stem)}(es|s)?\b')
+
+
+CROP_PATTERNS = [
+    (category, crop.lower(), _crop_pattern(crop))
+    for category, crops in COMMON_CROPS.items()
+    for crop in crops
+]
+
+
+def crop_key(name, category=None):
+    """
+    Canonical crop name for a product or query, e.g. 'Fresh Kano Tomato' -> 'tomatoes'
+
+    Returns:
+        str: Crop key, or '' when the name matches no known crop
+    """
+    text = (name or '').lower()
+    for crop_category, crop, pattern in CROP_PATTERNS:
+        if category and crop_category != category:
+            continue
+        if pattern.search(text):
+            return crop
+    return ''
+
+
+def normalise_state(state):
+    return ' '.join((state or '').split()).title()
+
+
+def bin_index(price):
+    return math.floor(math.log(float(price)) / _LOG_RATIO)
+
+
+def bin_price(index):
+    """Geometric centre of a histogram bin"""
+    return BIN_RATIO ** (index + 0.5)
+
+
+def _fold(bucket, prices):
+    """
+    Add (price, weight) samples to a bucket's running statistics
+    """
+    histogram = bucket.histogram
+    for price, weight in prices:
+        key = str(bin_index(price))
+        histogram[key] = histogram.get(key, 0) + weight
+        bucket.samples += weight
+        bucket.total_naira += price * weight
+        bucket.min_naira = price if bucket.min_naira is None else min(bucket.min_naira, price)
+        bucket.max_naira = price if bucket.max_naira is None else max(bucket.max_naira, price)
+
+
+def record_orders(order_ids):
+    """
+    Fold the lines of newly paid orders into their daily buckets
+
+    Each order is indexed exactly once: orders are claimed by flipping
+    price_indexed in the same transaction that updates the buckets.
+
+    Returns:
+        int: Number of order lines indexed
+    """
+    from .models import Order, OrderItem, CropPriceBucket
+
+    with transaction.atomic():
+        claimed = list(Order.objects.select_for_update(skip_locked=True).filter(
+            id__in=list(order_ids),
+            status__in=INDEXED_STATUSES,
+            price_indexed=False
+        ).values_list('id', flat=True))
+        if not claimed:
+            return 0
+        Order.objects.filter(id__in=claimed).update(price_indexed=True)
+
+        lines = OrderItem.objects.filter(
+            order_id__in=claimed,
+            product__isnull=False,
+            price__gt=0
+        ).values_list(
+            'order__paid_at', 'order__created_at', 'price',
+            'product__name', 'product__category', 'product__location_state', 'product__unit'
+        )
+
+        grouped = {}
+        for paid_at, created_at, price, name, category, state, unit in lines:
+            day = timezone.localdate(paid_at or created_at)
+            key = (category, crop_key(name, category), normalise_state(state), unit, day)
+            # Lines snapshot the Naira unit price at purchase
+            grouped.setdefault(key, []).append((price, 1))
+
+        # Lock buckets in key order so concurrent runs cannot deadlock
+        for key in sorted(grouped, key=lambda k: tuple(str(part) for part in k)):
+            category, crop, state, unit, day = key
+            bucket, _ = CropPriceBucket.objects.select_for_update().get_or_create(
+                category=category, crop=crop, state=state, unit=unit, day=day
+            )
+            _fold(bucket, grouped[key])
+            bucket.save()
+
+    return sum(len(prices) for prices in grouped.values())
+
+
+def record_on_commit(order_ids):
+    """
+    Queue indexing of newly paid orders once the payment transaction commits
+    """
+    from .tasks import update_price_index
+
+    order_ids = [str(order_id) for order_id in order_ids]
+    if order_ids:
+        transaction.on_commit(lambda: update_price_index.delay(order_ids))
+
+
+def _quantile(bins, total, q, low, high):
+    """
+    Approximate quantile from sorted (bin, count) pairs
+    """
+    target = q * total
+    seen = 0
+    for index, count in bins:
+        seen += count
+        if seen >= target:
+            return min(max(bin_price(index), low), high)
+    return high
+
+
+def get_price_index(crop=None, category=None, state=None, unit=None, days=DEFAULT_WINDOW_DAYS):
+    """
+    Price statistics over the last `days` days, one entry per unit
+
+    Args:
+        crop: Crop name (matched like product names), or None for a whole category
+        category: Product category; required when crop is not given
+        state: Optional state to restrict to
+        unit: Optional unit to restrict to
+
+    Returns:
+        dict: crop, category, state, window and a list of per-unit stats
+            (median, p25, p75, iqr, min, max, mean and samples in Naira)
+
+    Raises:
+        PriceIndexError: If neither a known crop nor a category is given
+    """
+    from .models import CropPriceBucket
+
+    try:
+        days = int(days)
+    except (TypeError, ValueError):
+        raise PriceIndexError('days must be an integer')
+    days = max(1, min(days, MAX_WINDOW_DAYS))
+
+    crop_name = crop_key(crop, category) if crop else ''
+    if crop and not crop_name:
+        raise PriceIndexError(f"Unknown crop '{crop}'")
+    if not crop_name and not category:
+        raise PriceIndexError('Provide a crop or a category')
+
+    until = timezone.localdate()
+    since = until - timedelta(days=days - 1)
+
+    buckets = CropPriceBucket.objects.filter(day__gte=since, day__lte=until)
+    if crop_name:
+        buckets = buckets.filter(crop=crop_name)
+    if category:
+        buckets = buckets.filter(category=category)
+    if state:
+        buckets = buckets.filter(state=normalise_state(state))
+    if unit:
+        buckets = buckets.filter(unit=unit)
+
+    merged = {}
+    for row in buckets.values_list('unit', 'samples', 'total_naira', 'min_naira', 'max_naira', 'histogram'):
+        row_unit, samples, total, low, high, histogram = row
+        entry = merged.setdefault(row_unit, {
+            'samples': 0, 'total': Decimal('0'), 'min': low, 'max': high, 'bins': {}
+        })
+        entry['samples'] += samples
+        entry['total'] += total
+        entry['min'] = min(entry['min'], low)
+        entry['max'] = max(entry['max'], high)
+        for index, count in histogram.items():
+            entry['bins'][int(index)] = entry['bins'].get(int(index), 0) + count
+
+    units = []
+    for row_unit, entry in sorted(merged.items(), key=lambda item: -item[1]['samples']):
+        if entry['samples'] < MIN_SAMPLES:
+            continue
+        bins = sorted(entry['bins'].items())
+        low, high = float(entry['min']), float(entry['max'])
+        p25, median, p75 = (
+            _quantile(bins, entry['samples'], q, low, high) for q in (0.25, 0.5, 0.75)
+        )
+        units.append({
+            'unit': row_unit,
+            'median': round(median, 2),
+            'p25': round(p25, 2),
+            'p75': round(p75, 2),
+            'iqr': round(p75 - p25, 2),
+            'min': round(low, 2),
+            'max': round(high, 2),
+            'mean': round(float(entry['total']) / entry['samples'], 2),
+            'samples': entry['samples'],
+        })
+
+    return {
+        'crop': crop_name or None,
+        'category': category,
+        'state': normalise_state(state) or None,
+        'from': since.isoformat(),
+        'to': until.isoformat(),
+        'days': days,
+        'units': units,
+    }
+
+
+def rebuild(days=MAX_WINDOW_DAYS):
+    """
+    Re-index paid orders of the last `days` days from scratch (backfill)
+
+    Returns:
+        int: Number of order lines indexed
+    """
+    from .models import Order, CropPriceBucket
+
+    since = timezone.now() - timedelta(days=days)
+    with transaction.atomic():
+        CropPriceBucket.objects.filter(day__gte=timezone.localdate(since)).delete()
+        Order.objects.filter(
+            Q(paid_at__gte=since) | Q(paid_at__isnull=True, created_at__gte=since)
+        ).update(price_indexed=False)
+
+    order_ids = Order.objects.filter(
+        status__in=INDEXED_STATUSES,
+        price_indexed=False
+    ).values_list('id', flat=True).iterator(chunk_size=1000)
+
+    indexed = 0
+    batch = []
+    for order_id in order_ids:
+        batch.append(order_id)
+        if len(batch) == 500:
+            indexed += record_orders(batch)
+            batch = []
+    if batch:
+        indexed += record_orders(batch)
+    return indexed
@@ -0,0 +1,273 @@
+"""
+AgroMentor 360 - Product Recommendations
+"Frequently bought together" neighbours computed offline from order history
+
+The nightly job streams (order, product) pairs from OrderItem in order-id
+order, turns each batch of baskets into co-occurring product pairs with
+NumPy, and accumulates the pair counts as a sparse matrix (parallel arrays
+of pair key and count). Pairs are scored by cosine similarity of the
+products' order sets and the best TOP_K neighbours of each product are
+written to ProductRecommendation, one row per product, so serving a
+product's recommendations is a single primary-key lookup.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+TOP_K = 20                        # Neighbours stored per product
+MIN_SUPPORT = 2                   # Orders a pair must share to count
+MAX_BASKET_SIZE = 50              # Larger baskets are skipped (bulk buyers, not affinity)
+
+COUNTED_STATUSES = ['paid', 'processing', 'shipped', 'delivered']
+
+READ_CHUNK_SIZE = 200000          # Order lines per NumPy batch
+MERGE_THRESHOLD = 5000000         # Pending pair entries before they are merged
+WRITE_BATCH_SIZE = 1000
+
+
+def _basket_pairs(orders, products):
+    """
+    All ordered (a, b) product pairs, a != b, within each basket
+
+    Args:
+        orders: int array of basket numbers, grouped (equal values adjacent)
+        products: int array of product indexes, aligned with orders
+
+    Returns:
+        tuple: (left, right) int arrays
+    """
+    if len(orders) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    starts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]])
+    sizes = np.diff(np.r_[starts, len(orders)])
+
+    # Every line is paired with every line of its basket
+    line_sizes = np.repeat(sizes, sizes)
+    line_starts = np.repeat(starts, sizes)
+    left = np.repeat(np.arange(len(orders)), line_sizes)
+    offsets = np.arange(len(left)) - np.repeat(np.cumsum(line_sizes) - line_sizes, line_sizes)
+    right = np.repeat(line_starts, line_sizes) + offsets
+
+    keep = left != right
+    return products[left[keep]], products[right[keep]]
+
+
+def _merge(keys, counts):
+    """
+    Sum counts of equal keys across several (keys, counts) batches
+    """
+    keys = np.concatenate(keys)
+    counts = np.concatenate(counts)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, np.bincount(inverse, weights=counts).astype(np.int64)
+
+
+class _Accumulator:
+    """
+    Sparse co-occurrence counts built up batch by batch
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.keys = []
+        self.counts = []
+        self.pending = 0
+        self.frequency = np.zeros(size, dtype=np.int64)
+
+    def add(self, orders, products):
+        # One line per product per basket
+        pairs = np.unique(np.stack([orders, products], axis=1), axis=0)
+        orders, products = pairs[:, 0], pairs[:, 1]
+
+        starts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]])
+        sizes = np.diff(np.r_[starts, len(orders)])
+        small = np.repeat(sizes <= MAX_BASKET_SIZE, sizes)
+        orders, products = orders[small], products[small]
+
+        self.frequency += np.bincount(products, minlength=self.size)
+
+        left, right = _basket_pairs(orders, products)
+        if len(left) == 0:
+            return
+        keys, counts = np.unique(left * self.size + right, return_counts=True)
+        self.keys.append(keys)
+        self.counts.append(counts)
+        self.pending += len(keys)
+
+        if self.pending > MERGE_THRESHOLD:
+            keys, counts = _merge(self.keys, self.counts)
+            self.keys, self.counts, self.pending = [keys], [counts], len(keys)
+
+    def result(self):
+        if not self.keys:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return _merge(self.keys, self.counts)
+
+
+def _baskets(product_index):
+    """
+    Yield (orders, products) int arrays of at most about READ_CHUNK_SIZE
+    lines, never splitting a basket across batches
+    """
+    from .models import OrderItem
+
+    rows = OrderItem.objects.filter(
+        order__status__in=COUNTED_STATUSES,
+        product__isnull=False
+    ).order_by('order_id').values_list('order_id', 'product_id').iterator(chunk_size=10000)
+
+    orders, products = [], []
+    basket = -1
+    current = None
+
+    for order_id, product_id in rows:
+        if order_id != current:
+            if len(orders) >= READ_CHUNK_SIZE:
+                yield np.array(orders, dtype=np.int64), np.array(products, dtype=np.int64)
+                orders, products = [], []
+            current = order_id
+            basket += 1
+
+        index = product_index.get(product_id)
+        if index is not None:
+            orders.append(basket)
+            products.append(index)
+
+    if orders:
+        yield np.array(orders, dtype=np.int64), np.array(products, dtype=np.int64)
+
+
+def top_neighbours(keys, counts, frequency, size, k=TOP_K, min_support=MIN_SUPPORT):
+    """
+    Best k neighbours of each product from sparse co-occurrence counts
+
+    Score is cosine similarity: shared orders / sqrt(orders of a * orders of b).
+
+    Returns:
+        tuple: (products, neighbours, scores) arrays, grouped by product
+            and best first within each group
+    """
+    keep = counts >= min_support
+    keys, counts = keys[keep], counts[keep]
+
+    left, right = keys // size, keys % size
+    scores = counts / np.sqrt(frequency[left].astype(float) * frequency[right])
+
+    order = np.lexsort((-scores, left))
+    left, right, scores = left[order], right[order], scores[order]
+
+    rank = np.arange(len(left)) - np.searchsorted(left, left, side='left')
+    top = rank < k
+    return left[top], right[top], scores[top]
+
+
+def build_recommendations(k=TOP_K):
+    """
+    Rebuild ProductRecommendation from order history
+
+    Returns:
+        dict: Counts of order lines read, products with neighbours and rows removed
+    """
+    from .models import Product, ProductRecommendation
+    from .cache import bump_versions, version_key
+
+    started = timezone.now()
+
+    product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=10000))
+    product_index = {pid: i for i, pid in enumerate(product_ids)}
+    size = max(len(product_ids), 1)
+
+    accumulator = _Accumulator(size)
+    lines = 0
+    for orders, products in _baskets(product_index):
+        accumulator.add(orders, products)
+        lines += len(orders)
+
+    keys, counts = accumulator.result()
+    products, neighbours, scores = top_neighbours(keys, counts, accumulator.frequency, size, k)
+
+    starts = np.flatnonzero(np.r_[True, products[1:] != products[:-1]]) if len(products) else []
+    ends = list(starts[1:]) + [len(products)]
+
+    batch = []
+    written = 0
+    for start, end in zip(starts, ends):
+        batch.append(ProductRecommendation(
+            product_id=product_ids[products[start]],
+            related=[
+                [str(product_ids[n]), round(float(s), 4)]
+                for n, s in zip(neighbours[start:end], scores[start:end])
+            ],
+            updated_at=started
+        ))
+        if len(batch) >= WRITE_BATCH_SIZE:
+            written += _write(batch)
+            batch = []
+    if batch:
+        written += _write(batch)
+
+    # Products that no longer have neighbours
+    removed, _ = ProductRecommendation.objects.filter(updated_at__lt=started).delete()
+
+    transaction.on_commit(lambda: bump_versions([version_key('recommendations')]))
+
+    logger.info(f"Built recommendations for {written} products from {lines} order lines")
+    return {'order_lines': lines, 'products': written, 'removed': removed}
+
+
+def _write(batch):
+    from .models import ProductRecommendation
+
+    ProductRecommendation.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=['related', 'updated_at']
+    )
+    return len(batch)
+
+
+def get_recommendations(product, limit=TOP_K):
+    """
+    Products frequently bought with `product`, topped up with similar
+    products from the same category when there are fewer than `limit`
+
+    Returns:
+        list: Product instances with `reason` and `score` attributes
+    """
+    from .models import Product, ProductRecommendation
+
+    related = ProductRecommendation.objects.filter(
+        product_id=product.pk
+    ).values_list('related', flat=True).first() or []
+
+    candidates = Product.objects.filter(status='available').select_related('seller')
+    by_id = {
+        str(pk): match
+        for pk, match in candidates.in_bulk([pid for pid, _ in related]).items()
+    }
+
+    results = []
+    for pid, score in related:
+        match = by_id.get(pid)
+        if match is None:
+            continue
+        match.reason, match.score = 'bought_together', score
+        results.append(match)
+        if len(results) == limit:
+            return results
+
+    similar = candidates.filter(category=product.category).exclude(
+        pk__in=[product.pk] + [p.pk for p in results]
+    ).order_by('-average_rating', '-id')[:limit - len(results)]
+    for match in similar:
+        match.reason, match.score = 'similar', None
+        results.append(match)
+
+    return results
@@ -0,0 +1,360 @@
+"""
+AgroMentor 360 - Checkout Inventory Holds
+Time-boxed stock reservations kept in Redis and committed to the database on payment
+
+Each product has four keys:
+    res:{id}:qty    mirror of the database stock (hundredths, short TTL)
+    res:{id}:held   total quantity currently on hold (hundredths)
+    res:{id}:holds  hash of reservation id -> held quantity
+    res:{id}:exp    sorted set of reservation id scored by expiry (ms)
+
+All checks and updates for a basket run in one Lua script, so concurrent
+checkouts are serialised by Redis instead of by row locks in the database.
+Expired holds are purged lazily by every script touching the product and by
+the periodic sweep task.
+"""
+
+from django.db import transaction
+from decimal import Decimal
+import json
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+CHECKOUT_HOLD_SECONDS = 600       # Basket held while the buyer checks out
+PAYMENT_HOLD_SECONDS = 1800       # Extended once an order is placed
+STOCK_MIRROR_TTL = 60             # Database stock mirror refresh interval
+
+ACTIVE_PRODUCTS_KEY = 'res:active'
+
+NEEDS_STOCK = -1
+INSUFFICIENT = -2
+
+
+class ReservationError(ValueError):
+    """Raised when a hold cannot be placed, found or extended"""
+    pass
+
+
+# Shared Lua: purge expired holds of the product whose keys start after `base`
+_PURGE = """
+local function purge(base, now)
+    local held, holds, exp = KEYS[base + 2], KEYS[base + 3], KEYS[base + 4]
+    local expired = redis.call('ZRANGEBYSCORE', exp, '-inf', now)
+    for _, id in ipairs(expired) do
+        local q = redis.call('HGET', holds, id)
+        if q then
+            redis.call('DECRBY', held, q)
+            redis.call('HDEL', holds, id)
+        end
+        redis.call('ZREM', exp, id)
+    end
+end
+"""
+
+# ARGV: now_ms, expires_ms, reservation_id, qty_1 .. qty_n
+RESERVE_SCRIPT = _PURGE + """
+local now, expires, id = ARGV[1], ARGV[2], ARGV[3]
+local n = #KEYS / 4
+for i = 1, n do
+    local base = (i - 1) * 4
+    purge(base, now)
+    local stock = redis.call('GET', KEYS[base + 1])
+    if not stock then
+        return {-1, i}
+    end
+    local held = tonumber(redis.call('GET', KEYS[base + 2]) or '0')
+    if tonumber(ARGV[3 + i]) > tonumber(stock) - held then
+        return {-2, i}
+    end
+end
+for i = 1, n do
+    local base = (i - 1) * 4
+    redis.call('INCRBY', KEYS[base + 2], ARGV[3 + i])
+    redis.call('HSET', KEYS[base + 3], id, ARGV[3 + i])
+    redis.call('ZADD', KEYS[base + 4], expires, id)
+end
+return {1, n}
+"""
+
+# ARGV: reservation_id, drop_stock_mirror (0/1)
+RELEASE_SCRIPT = """
+local id, drop = ARGV[1], ARGV[2]
+local released = 0
+for i = 1, #KEYS / 4 do
+    local base = (i - 1) * 4
+    local q = redis.call('HGET', KEYS[base + 3], id)
+    if q then
+        redis.call('DECRBY', KEYS[base + 2], q)
+        redis.call('HDEL', KEYS[base + 3], id)
+        released = released + 1
+    end
+    redis.call('ZREM', KEYS[base + 4], id)
+    if drop == '1' then
+        redis.call('DEL', KEYS[base + 1])
+    end
+end
+return released
+"""
+
+# ARGV: reservation_id, expires_ms
+EXTEND_SCRIPT = """
+local id, expires = ARGV[1], ARGV[2]
+for i = 1, #KEYS / 4 do
+    if not redis.call('ZSCORE', KEYS[(i - 1) * 4 + 4], id) then
+        return 0
+    end
+end
+for i = 1, #KEYS / 4 do
+    redis.call('ZADD', KEYS[(i - 1) * 4 + 4], 'XX', expires, id)
+end
+return 1
+"""
+
+# ARGV: now_ms; KEYS: one product's four keys
+PURGE_SCRIPT = _PURGE + """
+purge(0, ARGV[1])
+return redis.call('ZCARD', KEYS[4])
+"""
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+_scripts = {}
+
+
+def _script(name, source):
+    # Registered lazily so importing this module needs no Redis connection
+    if name not in _scripts:
+        _scripts[name] = _redis().register_script(source)
+    return _scripts[name]
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def to_units(quantity):
+    """Decimal quantity (2 d.p.) -> integer hundredths"""
+    return int((Decimal(str(quantity)) * 100).to_integral_value())
+
+
+def product_keys(product_id):
+    return [
+        f'res:{product_id}:qty',
+        f'res:{product_id}:held',
+        f'res:{product_id}:holds',
+        f'res:{product_id}:exp',
+    ]
+
+
+def _reservation_key(reservation_id):
+    return f'res:hold:{reservation_id}'
+
+
+def _claim_key(reservation_id):
+    return f'res:hold:{reservation_id}:order'
+
+
+def _load_stock(product_ids):
+    """
+    Mirror database stock for products that have no (or an expired) mirror
+    """
+    from .models import Product
+
+    conn = _redis()
+    rows = Product.objects.filter(id__in=product_ids).values_list('id', 'quantity_available', 'status')
+    pipe = conn.pipeline()
+    for product_id, quantity, product_status in rows:
+        units = to_units(quantity) if product_status == 'available' else 0
+        pipe.set(f'res:{product_id}:qty', units, ex=STOCK_MIRROR_TTL, nx=True)
+    pipe.execute()
+
+
+def reset_stock(product_ids):
+    """
+    Drop the stock mirror of products whose database stock changed
+    Call after the change commits; the next checkout reloads it
+    """
+    product_ids = [str(pid) for pid in product_ids]
+    if not product_ids:
+        return
+    try:
+        _redis().delete(*[f'res:{pid}:qty' for pid in product_ids])
+    except Exception as e:
+        # Mirrors expire on their own within STOCK_MIRROR_TTL
+        logger.error(f"Error resetting stock mirror: {str(e)}")
+
+
+def reserve(buyer_id, quantities, ttl=CHECKOUT_HOLD_SECONDS):
+    """
+    Hold stock for a basket
+
+    Args:
+        buyer_id: Id of the buyer the hold belongs to
+        quantities: {product_id (str): quantity (Decimal)}
+        ttl: Seconds until the hold is released automatically
+
+    Returns:
+        dict: reservation_id, expires_at (epoch seconds) and held items
+
+    Raises:
+        ReservationError: If any product lacks unheld stock
+    """
+    product_ids = sorted(quantities)
+    reservation_id = uuid.uuid4().hex
+    expires = _now_ms() + ttl * 1000
+
+    keys = []
+    for product_id in product_ids:
+        keys.extend(product_keys(product_id))
+    args = [_now_ms(), expires, reservation_id] + [to_units(quantities[pid]) for pid in product_ids]
+
+    script = _script('reserve', RESERVE_SCRIPT)
+    for _ in range(2):
+        code, index = script(keys=keys, args=args)
+        if code != NEEDS_STOCK:
+            break
+        _load_stock(product_ids)
+
+    if code == NEEDS_STOCK:
+        raise ReservationError(f'Product not found: {product_ids[index - 1]}')
+    if code == INSUFFICIENT:
+        raise ReservationError(f'Insufficient stock for product {product_ids[index - 1]}')
+
+    conn = _redis()
+    conn.sadd(ACTIVE_PRODUCTS_KEY, *product_ids)
+    conn.set(
+        _reservation_key(reservation_id),
+        json.dumps({
+            'buyer': str(buyer_id),
+            'items': {pid: str(quantities[pid]) for pid in product_ids},
+        }),
+        ex=PAYMENT_HOLD_SECONDS
+    )
+
+    return {
+        'reservation_id': reservation_id,
+        'expires_at': expires // 1000,
+        'items': {pid: str(quantities[pid]) for pid in product_ids},
+    }
+
+
+def get_reservation(reservation_id, buyer_id):
+    """
+    Look up a reservation made by this buyer
+
+    Returns:
+        dict: {product_id: quantity (Decimal)}
+    """
+    raw = _redis().get(_reservation_key(reservation_id))
+    if raw is None:
+        raise ReservationError('Reservation expired or not found')
+
+    data = json.loads(raw)
+    if data['buyer'] != str(buyer_id):
+        raise ReservationError('Reservation expired or not found')
+
+    return {pid: Decimal(quantity) for pid, quantity in data['items'].items()}
+
+
+def claim(reservation_id, buyer_id):
+    """
+    Take a reservation for one order; a second claim of the same id fails
+
+    Returns:
+        dict: {product_id: quantity (Decimal)}
+
+    Raises:
+        ReservationError: If the reservation is missing, not the buyer's or
+            already backs an order
+    """
+    quantities = get_reservation(reservation_id, buyer_id)
+    if not _redis().set(_claim_key(reservation_id), 1, nx=True, ex=PAYMENT_HOLD_SECONDS):
+        raise ReservationError('Reservation already used for an order')
+    return quantities
+
+
+def extend(reservation_id, product_ids, ttl=PAYMENT_HOLD_SECONDS):
+    """
+    Push back the expiry of every hold in a reservation
+
+    Raises:
+        ReservationError: If any of the holds has already expired
+    """
+    keys = []
+    for product_id in sorted(product_ids):
+        keys.extend(product_keys(product_id))
+
+    extended = _script('extend', EXTEND_SCRIPT)(
+        keys=keys,
+        args=[reservation_id, _now_ms() + ttl * 1000]
+    )
+    if not extended:
+        raise ReservationError('Reservation expired, please check out again')
+    pipe = _redis().pipeline()
+    pipe.expire(_reservation_key(reservation_id), ttl)
+    pipe.expire(_claim_key(reservation_id), ttl)
+    pipe.execute()
+
+
+def release(reservation_id, product_ids, committed=False):
+    """
+    Release a reservation's holds
+
+    Args:
+        committed: True when the stock was just taken in the database, which
+            also drops the stock mirrors so they reload the new quantity
+
+    Returns:
+        int: Number of holds released
+    """
+    keys = []
+    for product_id in sorted(product_ids):
+        keys.extend(product_keys(product_id))
+    if not keys:
+        return 0
+
+    released = _script('release', RELEASE_SCRIPT)(
+        keys=keys,
+        args=[reservation_id, 1 if committed else 0]
+    )
+    # The claim key stays until it expires so the id cannot be reused
+    _redis().delete(_reservation_key(reservation_id))
+    return released
+
+
+def release_on_commit(reservation_id, product_ids, committed=False):
+    """
+    Release holds once the surrounding database transaction commits
+    """
+    product_ids = list(product_ids)
+    transaction.on_commit(lambda: release(reservation_id, product_ids, committed))
+
+
+def purge_expired():
+    """
+    Release expired holds for every product with active holds
+
+    Returns:
+        int: Number of products checked
+    """
+    conn = _redis()
+    script = _script('purge', PURGE_SCRIPT)
+    now = _now_ms()
+    checked = 0
+
+    for product_id in conn.smembers(ACTIVE_PRODUCTS_KEY):
+        product_id = product_id.decode() if isinstance(product_id, bytes) else product_id
+        remaining = script(keys=product_keys(product_id), args=[now])
+        if not remaining:
+            conn.srem(ACTIVE_PRODUCTS_KEY, product_id)
+        checked += 1
+
+    return checked
@@ -0,0 +1,332 @@
+"""
+AgroMentor 360 - Marketplace Product Search
+Ranked, typo-tolerant full-text search over product listings
+
+PostgreSQL uses a weighted tsvector column plus a trigram GIN index on the
+product name. Other databases (SQLite in development) fall back to an
+in-process inverted index with trigram-based fuzzy term matching. That index
+is a snapshot: writes to product text bump a shared version counter, and each
+process rebuilds its snapshot before the next search once the counter moves.
+"""
+
+from django.db import connection, transaction
+from django.db.models import Case, When, Value, FloatField, F, Q
+from collections import defaultdict
+import math
+import re
+import threading
+import logging
+
+from .cache import bump_versions, get_versions, version_key
+
+logger = logging.getLogger(__name__)
+
+
+# Minimum trigram similarity for a misspelt term to count as a match
+TRIGRAM_THRESHOLD = 0.3
+
+# Field weights (name matches rank above category, category above description)
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'category': 2.0,
+    'description': 1.0,
+}
+
+# Upper bound on ids returned by the in-memory index per query
+MAX_FALLBACK_RESULTS = 1000
+
+# Products given a search vector per UPDATE when backfilling
+BACKFILL_BATCH_SIZE = 1000
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Bumped whenever searchable product text changes (fallback backend only)
+INDEX_VERSION_KEY = version_key('search')
+
+
+def _use_postgres():
+    return connection.vendor == 'postgresql'
+
+
+# ----------------------------------------------------------------
+# PostgreSQL backend
+# ----------------------------------------------------------------
+
+def _postgres_search_vector():
+    from django.contrib.postgres.search import SearchVector
+
+    return (
+        SearchVector('name', weight='A', config='english') +
+        SearchVector('category', weight='B', config='english') +
+        SearchVector('description', weight='C', config='english')
+    )
+
+
+def _postgres_search(queryset, query):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+
+    search_query = SearchQuery(query, search_type='websearch', config='english')
+
+    return queryset.annotate(
+        text_rank=SearchRank(F('search_vector'), search_query),
+        name_similarity=TrigramWordSimilarity(query, 'name'),
+    ).filter(
+        Q(search_vector=search_query) |
+        Q(name__trigram_word_similar=query)
+    ).annotate(
+        search_rank=F('text_rank') + F('name_similarity')
+    ).order_by('-search_rank', '-created_at')
+
+
+def ensure_postgres_indexes(sender=None, using='default', **kwargs):
+    """
+    Create the trigram extension and GIN indexes used by product search
+    Connected to post_migrate; a no-op on other databases. Products written
+    before the search column existed are filled by backfill_search_vectors.
+    """
+    from django.db import connections
+
+    conn = connections[using]
+    if conn.vendor != 'postgresql':
+        return
+
+    with conn.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS marketplace_products_search_gin "
+            "ON marketplace_products USING gin (search_vector)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS marketplace_products_name_trgm "
+            "ON marketplace_products USING gin (name gin_trgm_ops)"
+        )
+
+
+def backfill_search_vectors(using='default', batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Fill the search vector of products written before it existed
+    One-off, run by the backfill_search_vectors command; a no-op on other
+    databases
+
+    Returns:
+        int: Number of products filled
+    """
+    from django.db import connections
+    from .models import Product
+
+    if connections[using].vendor != 'postgresql':
+        return 0
+
+    missing = Product.objects.using(using).filter(search_vector__isnull=True)
+    filled = 0
+    while True:
+        ids = list(missing.order_by().values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return filled
+        filled += Product.objects.using(using).filter(pk__in=ids).update(search_vector=_postgres_search_vector())
+
+
+# ----------------------------------------------------------------
+# In-memory fallback backend
+# ----------------------------------------------------------------
+
+def tokenize(text):
+    """
+    Lowercase, split into words and strip simple plural suffixes
+    """
+    terms = []
+    for token in TOKEN_RE.findall((text or '').lower()):
+        if len(token) > 4 and token.endswith('es'):
+            token = token[:-2]
+        elif len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+def trigrams(term):
+    padded = f'  {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def trigram_similarity(a, b):
+    ta, tb = trigrams(a), trigrams(b)
+    return len(ta & tb) / len(ta | tb)
+
+
+class InMemorySearchIndex:
+    """
+    Inverted index of product text kept in process memory
+
+    postings:  term -> {product_id: weighted term frequency}
+    doc_terms: product_id -> set of terms
+    grams:     trigram -> set of terms (candidate lookup for fuzzy matching)
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.postings = defaultdict(dict)
+        self.doc_terms = {}
+        self.grams = defaultdict(set)
+        self.version = None
+
+    def build(self, version=None):
+        """Index every product from the database"""
+        from marketplace.models import Product
+
+        with self.lock:
+            self.postings.clear()
+            self.doc_terms.clear()
+            self.grams.clear()
+
+            rows = Product.objects.values_list('id', 'name', 'category', 'description')
+            for product_id, name, category, description in rows.iterator(chunk_size=2000):
+                self._add(str(product_id), name, category, description)
+
+            self.version = version
+            logger.info(f"Built in-memory product search index: {len(self.doc_terms)} products")
+
+    def ensure_current(self):
+        """Rebuild if product text changed in any process since the last build"""
+        version = get_versions([INDEX_VERSION_KEY])[0]
+        with self.lock:
+            if version != self.version:
+                self.build(version)
+
+    def _add(self, product_id, name, category, description):
+        weights = defaultdict(float)
+        for field, text in (('name', name), ('category', category), ('description', description)):
+            for term in tokenize(text):
+                weights[term] += FIELD_WEIGHTS[field]
+
+        for term, weight in weights.items():
+            if term not in self.postings:
+                for gram in trigrams(term):
+                    self.grams[gram].add(term)
+            self.postings[term][product_id] = weight
+
+        self.doc_terms[product_id] = set(weights)
+
+    def _expand(self, term):
+        """
+        Map a query term to indexed terms: exact match, or close misspellings
+        Returns list of (indexed_term, match_weight)
+        """
+        if term in self.postings:
+            return [(term, 1.0)]
+
+        candidates = set()
+        for gram in trigrams(term):
+            candidates |= self.grams.get(gram, set())
+
+        scored = [(c, trigram_similarity(term, c)) for c in candidates]
+        scored = [(c, s) for c, s in scored if s >= TRIGRAM_THRESHOLD]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:3]
+
+    def search(self, query, limit=MAX_FALLBACK_RESULTS):
+        """
+        Rank products for a query
+
+        Products matching more query terms rank first, then by tf-idf score.
+
+        Returns:
+            list: [(product_id, score)] best first
+        """
+        self.ensure_current()
+
+        with self.lock:
+            total_docs = max(len(self.doc_terms), 1)
+            scores = defaultdict(float)
+            matched = defaultdict(int)
+
+            for term in set(tokenize(query)):
+                hit = set()
+                for indexed_term, match_weight in self._expand(term):
+                    docs = self.postings[indexed_term]
+                    idf = math.log(1 + total_docs / len(docs))
+                    for product_id, weight in docs.items():
+                        scores[product_id] += weight * idf * match_weight
+                        hit.add(product_id)
+                for product_id in hit:
+                    matched[product_id] += 1
+
+        ranked = sorted(scores.items(), key=lambda item: (matched[item[0]], item[1]), reverse=True)
+        return [
+            (product_id, matched[product_id] + score / (1 + score))
+            for product_id, score in ranked[:limit]
+        ]
+
+
+memory_index = InMemorySearchIndex()
+
+
+# ----------------------------------------------------------------
+# Public API
+# ----------------------------------------------------------------
+
+def search_products(queryset, query):
+    """
+    Filter a Product queryset to matches for `query`, ranked by relevance
+
+    The returned queryset is annotated with `search_rank` (higher is better)
+    and ordered by it.
+    """
+    query = (query or '').strip()
+    if not query:
+        return queryset
+
+    if _use_postgres():
+        return _postgres_search(queryset, query)
+
+    ranked = memory_index.search(query)
+    if not ranked:
+        return queryset.none()
+
+    return queryset.filter(
+        id__in=[product_id for product_id, _ in ranked]
+    ).annotate(
+        search_rank=Case(
+            *[When(id=product_id, then=Value(score)) for product_id, score in ranked],
+            default=Value(0.0),
+            output_field=FloatField()
+        )
+    ).order_by('-search_rank', '-created_at')
+
+
+def _text_changed():
+    transaction.on_commit(lambda: bump_versions([INDEX_VERSION_KEY]))
+
+
+def index_product(product):
+    """
+    Update the search index for a single product after its text changed
+    """
+    from marketplace.models import Product
+
+    if _use_postgres():
+        Product.objects.filter(pk=product.pk).update(search_vector=_postgres_search_vector())
+    else:
+        _text_changed()
+
+
+def index_products(products):
+    """
+    Update the search index for products created in bulk
+    """
+    from marketplace.models import Product
+
+    if _use_postgres():
+        Product.objects.filter(
+            pk__in=[product.pk for product in products]
+        ).update(search_vector=_postgres_search_vector())
+    else:
+        _text_changed()
+
+
+def remove_product(product_id):
+    """
+    Drop a deleted product from the search index
+    """
+    if not _use_postgres():
+        _text_changed()
@@ -1,22 +1,23 @@
 from rest_framework import serializers
 from .models import Product, Order, OrderItem, Review
 from accounts.serializers import UserSerializer # Assuming you have this
+from utils.images import ImageVariantsField
 
 # ----------------------------------------------------------------
 # Review Serializers
 # ----------------------------------------------------------------
 
 class ReviewSerializer(serializers.ModelSerializer):
-    user_name = serializers.CharField(source='user.get_full_name', read_only=True)
-    user_avatar = serializers.ImageField(source='user.profile.avatar', read_only=True)
+    user_name = serializers.CharField(source='reviewer.get_full_name', read_only=True)
+    user_avatar = serializers.ImageField(source='reviewer.profile.avatar', read_only=True)
     
     class Meta: #type:ignore
         model = Review
         fields = [
-            'id', 'user', 'user_name', 'user_avatar', 
-            'rating', 'comment', 'created_at'
+            'id', 'reviewer', 'user_name', 'user_avatar', 
+            'rating', 'title', 'comment', 'verified_purchase', 'created_at'
         ]
-        read_only_fields = ['id', 'user', 'created_at']
+        read_only_fields = ['id', 'reviewer', 'verified_purchase', 'created_at']
 
 
 # ----------------------------------------------------------------
@@ -26,19 +27,31 @@ class ReviewSerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
     """
     Lightweight serializer for lists and cards
+    Pass `fields=[...]` to serialize only a subset (sparse fieldsets)
     """
     seller_name = serializers.CharField(source='seller.get_full_name', read_only=True)
     seller_location = serializers.CharField(source='location_city', read_only=True)
+    images = ImageVariantsField('primary_image', 'image_variants')
     
     class Meta: #type:ignore
         model = Product
         fields = [
-            'id', 'name', 'category', 'price', 'price_agrocoin',
-            'quantity', 'unit', 'primary_image', 
-            'seller_name', 'seller_location', 'rating', 
+            'id', 'name', 'category', 'price_agrocoin', 'price_naira',
+            'quantity_available', 'unit', 'primary_image', 'images',
+            'seller_name', 'seller_location', 'location_state',
+            'latitude', 'longitude',
+            'average_rating', 'total_reviews',
             'status', 'created_at'
         ]
-        read_only_fields = ['id', 'seller', 'rating', 'created_at']
+        read_only_fields = ['id', 'seller', 'price_naira', 'average_rating', 'total_reviews', 'created_at']
+    
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
 
 class ProductDetailSerializer(serializers.ModelSerializer):
@@ -48,21 +61,22 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     seller = UserSerializer(read_only=True)
     reviews = ReviewSerializer(many=True, read_only=True)
     review_count = serializers.IntegerField(source='reviews.count', read_only=True)
+    images = ImageVariantsField('primary_image', 'image_variants')
     
     class Meta: #type:ignore
         model = Product
         fields = [
             'id', 'name', 'category', 'description',
-            'price', 'price_agrocoin', 
-            'quantity', 'unit', 'minimum_order',
-            'primary_image', 'additional_images',
+            'price_agrocoin', 'price_naira',
+            'quantity_available', 'unit', 'minimum_order',
+            'primary_image', 'images', 'additional_images',
             'organic_certified', 'quality_grade',
             'harvest_date', 'location_city', 'location_state',
-            'delivery_available', 'pickup_available', 'delivery_fee',
-            'seller', 'rating', 'reviews', 'review_count',
+            'delivery_available', 'pickup_available', 'delivery_fee_naira',
+            'seller', 'average_rating', 'reviews', 'review_count',
             'status', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'seller', 'rating', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'seller', 'price_naira', 'average_rating', 'created_at', 'updated_at']
 
 
 # ----------------------------------------------------------------
@@ -85,29 +99,42 @@ class OrderSerializer(serializers.ModelSerializer):
     """
     Lightweight serializer for order history lists
     """
-    item_count = serializers.IntegerField(source='items.count', read_only=True)
+    item_count = serializers.IntegerField(source='line_items.count', read_only=True)
     first_item_name = serializers.SerializerMethodField()
     
     class Meta: #type:ignore
         model = Order
         fields = [
-            'id', 'order_number', 'status', 'total_amount', 
+            'id', 'order_number', 'status', 'total_ac', 'total_naira',
             'created_at', 'item_count', 'first_item_name'
         ]
         read_only_fields = ['id', 'order_number', 'created_at']
 
     def get_first_item_name(self, obj):
-        first_item = obj.items.first()
-        if first_item and first_item.product:
-            return first_item.product.name
+        if obj.items:
+            return obj.items[0].get('name', "Unknown Item")
         return "Unknown Item"
 
 
+class SellerOrderSerializer(OrderSerializer):
+    """
+    Seller inbox row; item_count comes from a queryset annotation
+    """
+    item_count = serializers.IntegerField(read_only=True)
+    buyer_name = serializers.CharField(source='buyer.get_full_name', read_only=True)
+    
+    class Meta(OrderSerializer.Meta): #type:ignore
+        fields = OrderSerializer.Meta.fields + [
+            'buyer_name', 'delivery_method', 'delivery_city', 'delivery_state',
+            'paid_at', 'updated_at'
+        ]
+
+
 class OrderDetailSerializer(serializers.ModelSerializer):
     """
     Full order details including all items and buyer info
     """
-    items = OrderItemSerializer(many=True, read_only=True)
+    items = OrderItemSerializer(source='line_items', many=True, read_only=True)
     buyer_name = serializers.CharField(source='buyer.get_full_name', read_only=True)
     buyer_phone = serializers.CharField(source='buyer.phone_number', read_only=True)
     
@@ -116,9 +143,10 @@ class OrderDetailSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'order_number', 'status', 
             'buyer', 'buyer_name', 'buyer_phone',
-            'items', 'total_amount', 
-            'shipping_address', 'phone_number', # Contact phone for this specific order
-            'tracking_number', 'notes',
+            'items', 'subtotal_ac', 'delivery_fee_ac', 'total_ac', 'total_naira',
+            'delivery_method', 'delivery_address', 'delivery_city', 'delivery_state',
+            'delivery_phone', # Contact phone for this specific order
+            'tracking_number', 'buyer_notes', 'seller_notes',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'order_number', 'buyer', 'total_amount', 'created_at']
\ No newline at end of file
+        read_only_fields = ['id', 'order_number', 'buyer', 'total_ac', 'total_naira', 'created_at']
\ No newline at end of file
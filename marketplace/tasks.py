@@ -0,0 +1,207 @@
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def release_expired_holds():
+    """
+    Release checkout stock holds whose time box has passed
+    Holds are also purged lazily at checkout; this catches products nobody
+    is currently buying. Runs every 5 minutes via Celery Beat
+    """
+    try:
+        from marketplace.reservations import purge_expired
+        
+        checked = purge_expired()
+        
+        logger.info(f"Checked checkout holds on {checked} products")
+        return {'products_checked': checked}
+    
+    except Exception as e:
+        logger.error(f"Error releasing expired holds: {str(e)}")
+        return {'error': str(e)}
+
+
+@shared_task
+def flush_dirty_carts():
+    """
+    Persist carts changed in Redis to the Cart table
+    Runs every 2 minutes via Celery Beat
+    """
+    try:
+        from marketplace.cart_service import flush_dirty
+        
+        result = flush_dirty()
+        
+        if result['flushed']:
+            logger.info(f"Flushed {result['flushed']} carts")
+        return result
+    
+    except Exception as e:
+        logger.error(f"Error flushing carts: {str(e)}")
+        return {'error': str(e)}
+
+
+@shared_task
+def recompute_product_ratings():
+    """
+    Recompute rating aggregates from reviews and fix products that drifted
+    (e.g. after bulk deletes that bypass Review.delete)
+    Runs daily at 3 AM via Celery Beat
+    """
+    try:
+        from django.db.models import OuterRef, Subquery, Sum, Count, Q, F, Value, IntegerField, FloatField
+        from django.db.models.functions import Coalesce, Cast, NullIf
+        from marketplace.models import Product, Review, RATING_FIELD
+        from marketplace.cache import invalidate_products
+        
+        reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+        actual_sum = Coalesce(
+            Subquery(reviews.annotate(total=Sum('rating')).values('total')),
+            Value(0),
+            output_field=IntegerField()
+        )
+        actual_count = Coalesce(
+            Subquery(reviews.annotate(count=Count('id')).values('count')),
+            Value(0),
+            output_field=IntegerField()
+        )
+        
+        drifted = list(
+            Product.objects.annotate(
+                actual_sum=actual_sum,
+                actual_count=actual_count
+            ).filter(
+                ~Q(rating_sum=F('actual_sum')) | ~Q(total_reviews=F('actual_count'))
+            ).values_list('id', flat=True)
+        )
+        
+        if drifted:
+            Product.objects.filter(id__in=drifted).update(
+                rating_sum=actual_sum,
+                total_reviews=actual_count,
+                average_rating=Coalesce(
+                    Cast(actual_sum, FloatField()) / NullIf(actual_count, Value(0)),
+                    Value(0),
+                    output_field=RATING_FIELD
+                )
+            )
+            invalidate_products(
+                Product.objects.filter(id__in=drifted).only('id', 'category', 'seller_id')
+            )
+            logger.info(f"Corrected rating drift on {len(drifted)} products")
+        
+        return {'corrected': len(drifted)}
+    
+    except Exception as e:
+        logger.error(f"Error recomputing product ratings: {str(e)}")
+        return {'error': str(e)}
+
+
+@shared_task
+def flush_product_views():
+    """
+    Apply product views buffered in Redis to Product.view_count
+    Runs every 5 minutes via Celery Beat
+    """
+    try:
+        from marketplace.view_counter import flush_views
+        
+        result = flush_views()
+        
+        if result['products']:
+            logger.info(f"Flushed {result['views']} views for {result['products']} products")
+        return result
+    
+    except Exception as e:
+        logger.error(f"Error flushing product views: {str(e)}")
+        return {'error': str(e)}
+
+
+@shared_task
+def generate_product_images(product_id):
+    """
+    Generate resized WebP/JPEG copies of a product's primary image
+    Queued when a product is saved with a new image
+    """
+    try:
+        from marketplace.models import Product
+        from marketplace.cache import invalidate_product
+        from utils.images import refresh_derivatives
+        
+        product = Product.objects.filter(id=product_id).only(
+            'id', 'category', 'seller_id', 'primary_image', 'image_variants'
+        ).first()
+        if product is None:
+            return {'status': 'missing'}
+        
+        variants = refresh_derivatives(product, 'primary_image', 'image_variants')
+        if variants is None:
+            return {'status': 'skipped'}
+        
+        # Cached listings embed the image URLs
+        invalidate_product(product)
+        return {'status': 'success', 'widths': sorted(variants['webp'], key=int)}
+    
+    except Exception as e:
+        logger.error(f"Error generating images for product {product_id}: {str(e)}")
+        return {'error': str(e)}
+
+
+@shared_task(time_limit=3 * 60 * 60, soft_time_limit=3 * 60 * 60 - 300)
+def build_product_recommendations():
+    """
+    Rebuild "frequently bought together" neighbours from order history
+    Runs nightly via Celery Beat; exempt from the default 5 minute limit
+    """
+    try:
+        from marketplace.recommendations import build_recommendations
+        
+        result = build_recommendations()
+        
+        logger.info(f"Built recommendations: {result}")
+        return result
+    
+    except Exception as e:
+        logger.error(f"Error building product recommendations: {str(e)}")
+        return {'error': str(e)}
+
+
+@shared_task
+def update_price_index(order_ids):
+    """
+    Fold newly paid orders into the crop market price index
+    Queued when a payment confirmation marks orders paid
+    """
+    try:
+        from marketplace.price_index import record_orders
+        from marketplace.cache import bump_versions, version_key
+        
+        lines = record_orders(order_ids)
+        
+        if lines:
+            bump_versions([version_key('price_index')])
+        return {'status': 'success', 'lines': lines}
+    
+    except Exception as e:
+        logger.error(f"Error updating crop price index: {str(e)}")
+        return {'error': str(e)}
+
+
+@shared_task
+def rebuild_autocomplete_index():
+    """
+    Rebuild the search autocomplete snapshot from available products
+    Runs nightly via Celery Beat, and on demand when the snapshot is missing
+    """
+    try:
+        from marketplace.autocomplete import rebuild
+        
+        names = rebuild()
+        return {'status': 'success', 'names': names}
+    
+    except Exception as e:
+        logger.error(f"Error rebuilding autocomplete index: {str(e)}")
+        return {'error': str(e)}
@@ -0,0 +1,51 @@
+"""
+AgroMentor 360 - Marketplace URL Configuration
+"""
+
+from django.urls import path
+from . import views
+
+app_name = 'marketplace'
+
+urlpatterns = [
+    # Products
+    path('products/', views.product_list, name='product-list'),
+    path('products/create/', views.create_product, name='create-product'),
+    path('products/import/', views.import_products_view, name='import-products'),
+    path('products/mine/', views.my_products, name='my-products'),
+    path('products/nearby/', views.nearby_products, name='nearby-products'),
+    path('products/trending/', views.trending_products, name='trending-products'),
+    path('products/autocomplete/', views.autocomplete, name='product-autocomplete'),
+    path('products/<uuid:product_id>/', views.product_detail, name='product-detail'),
+    path('products/<uuid:product_id>/update/', views.update_product, name='update-product'),
+    path('products/<uuid:product_id>/delete/', views.delete_product, name='delete-product'),
+    path('products/<uuid:product_id>/recommendations/', views.product_recommendations, name='product-recommendations'),
+    
+    # Reviews
+    path('products/<uuid:product_id>/reviews/', views.product_reviews, name='product-reviews'),
+    path('products/<uuid:product_id>/reviews/create/', views.create_review, name='create-review'),
+    
+    # Cart
+    path('cart/', views.cart, name='cart'),
+    path('cart/items/', views.add_to_cart, name='add-to-cart'),
+    path('cart/items/<uuid:product_id>/', views.cart_item, name='cart-item'),
+    
+    # Checkout
+    path('checkout/reserve/', views.reserve_stock, name='reserve-stock'),
+    path('checkout/reservations/<str:reservation_id>/', views.release_reservation, name='release-reservation'),
+    
+    # Orders
+    path('orders/', views.order_list, name='order-list'),
+    path('orders/create/', views.create_order, name='create-order'),
+    path('orders/selling/', views.seller_orders, name='seller-orders'),
+    path('orders/selling/status/', views.bulk_update_order_status, name='bulk-update-order-status'),
+    path('orders/<uuid:order_id>/', views.order_detail, name='order-detail'),
+    path('orders/<uuid:order_id>/cancel/', views.cancel_order, name='cancel-order'),
+    path('orders/<uuid:order_id>/status/', views.update_order_status, name='update-order-status'),
+    
+    # Prices
+    path('prices/', views.crop_prices, name='crop-prices'),
+    
+    # Stats
+    path('stats/', views.marketplace_stats, name='marketplace-stats'),
+]
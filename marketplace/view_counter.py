@@ -0,0 +1,162 @@
+"""
+AgroMentor 360 - Product View Counter
+Buffers product page views in Redis and flushes them to Product.view_count in batches
+
+A view is counted at most once per viewer per DEDUPE_WINDOW. Counted views
+go into a pending hash (HINCRBY) and an hourly trending sorted set. The flush
+task moves the pending hash aside and applies it with one UPDATE per chunk of
+products, so page views never write to the database directly.
+"""
+
+from django.db import transaction
+from django.db.models import Case, When, Value, F, IntegerField
+from django.utils import timezone
+from datetime import timedelta
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+DEDUPE_WINDOW = 1800              # One counted view per viewer per 30 minutes
+TRENDING_HOURS = 24
+TRENDING_LIMIT = 50
+FLUSH_CHUNK_SIZE = 1000
+
+PENDING_KEY = 'pv:pending'
+FLUSHING_KEY = 'pv:flushing'
+
+
+# KEYS: seen marker, pending hash, trending zset
+# ARGV: product_id, dedupe window, trending ttl
+RECORD_SCRIPT = """
+if redis.call('SET', KEYS[1], 1, 'NX', 'EX', ARGV[2]) then
+    redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+    redis.call('ZINCRBY', KEYS[3], 1, ARGV[1])
+    redis.call('EXPIRE', KEYS[3], ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+_scripts = {}
+
+
+def _script(name, source):
+    if name not in _scripts:
+        _scripts[name] = _redis().register_script(source)
+    return _scripts[name]
+
+
+def _trending_key(moment):
+    return f"pv:trending:{moment.strftime('%Y%m%d%H')}"
+
+
+def viewer_key(request):
+    """
+    Stable identifier for deduplicating views: user id, session, or a hash
+    of client address and user agent for anonymous clients without a session
+    """
+    if request.user.is_authenticated:
+        return f'u:{request.user.id}'
+
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        return f's:{session.session_key}'
+
+    raw = f"{request.META.get('REMOTE_ADDR', '')}|{request.META.get('HTTP_USER_AGENT', '')}"
+    return f'a:{hashlib.sha1(raw.encode()).hexdigest()[:16]}'
+
+
+def record_view(product_id, viewer):
+    """
+    Count a product view unless this viewer was counted recently
+
+    Never raises: view counting must not break the product page.
+
+    Returns:
+        bool: True if the view was counted
+    """
+    try:
+        return bool(_script('record', RECORD_SCRIPT)(
+            keys=[
+                f'pv:seen:{product_id}:{viewer}',
+                PENDING_KEY,
+                _trending_key(timezone.now()),
+            ],
+            args=[str(product_id), DEDUPE_WINDOW, (TRENDING_HOURS + 1) * 3600]
+        ))
+    except Exception as e:
+        logger.error(f"Error recording product view: {str(e)}")
+        return False
+
+
+def flush_views():
+    """
+    Apply buffered view counts to Product.view_count
+
+    The pending hash is renamed before reading so views recorded during the
+    flush land in a fresh hash. A hash left behind by a failed flush is
+    applied first on the next run.
+
+    Returns:
+        dict: Number of products updated and views applied
+    """
+    from .models import Product
+
+    conn = _redis()
+
+    if not conn.exists(FLUSHING_KEY) and conn.exists(PENDING_KEY):
+        conn.renamenx(PENDING_KEY, FLUSHING_KEY)
+
+    counts = {
+        (k.decode() if isinstance(k, bytes) else k): int(v)
+        for k, v in conn.hgetall(FLUSHING_KEY).items()
+    }
+    if not counts:
+        return {'products': 0, 'views': 0}
+
+    items = list(counts.items())
+    with transaction.atomic():
+        for i in range(0, len(items), FLUSH_CHUNK_SIZE):
+            chunk = items[i:i + FLUSH_CHUNK_SIZE]
+            Product.objects.filter(id__in=[pid for pid, _ in chunk]).update(
+                view_count=F('view_count') + Case(
+                    *[When(id=pid, then=Value(n)) for pid, n in chunk],
+                    default=Value(0),
+                    output_field=IntegerField()
+                )
+            )
+
+    conn.delete(FLUSHING_KEY)
+    return {'products': len(counts), 'views': sum(counts.values())}
+
+
+def trending_product_ids(hours=TRENDING_HOURS, limit=TRENDING_LIMIT):
+    """
+    Most viewed product ids over the last `hours` hours
+
+    Returns:
+        list: [(product_id, views)] most viewed first
+    """
+    now = timezone.now()
+    keys = [_trending_key(now - timedelta(hours=h)) for h in range(hours)]
+
+    conn = _redis()
+    union_key = f'pv:trending:union:{hours}'
+    pipe = conn.pipeline()
+    pipe.zunionstore(union_key, keys)
+    pipe.zrevrange(union_key, 0, limit - 1, withscores=True)
+    pipe.delete(union_key)
+    _, rows, _ = pipe.execute()
+
+    return [
+        (pid.decode() if isinstance(pid, bytes) else pid, int(score))
+        for pid, score in rows
+    ]
@@ -4,65 +4,310 @@ Product listings, orders, and reviews endpoints
 """
 
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Avg, Count
+from django.db.models import Count
 from django.utils import timezone
+from uuid import UUID
+
+from utils.geo import nearby, parse_point
 
 from .models import Product, Order, OrderItem, Review
+from .search import search_products
+from .cache import cached_response, version_key
+from .view_counter import record_view, trending_product_ids, viewer_key
+from .recommendations import TOP_K, get_recommendations
+from .facets import facet_filters, get_facets
+from .autocomplete import DEFAULT_LIMIT as AUTOCOMPLETE_LIMIT, suggest
+from .importer import MAX_IMPORT_FILE_SIZE, ProductImportError, import_products
+from .price_index import DEFAULT_WINDOW_DAYS, PriceIndexError, get_price_index
+from . import cart_service, reservations
+from .cart_service import CartError
+from .orders import (
+    OrderError,
+    normalise_items,
+    place_order,
+    transition_orders,
+    cancel_order as cancel_order_service
+)
+from .listing import (
+    ListingError,
+    resolve_sort,
+    resolve_fields,
+    resolve_limit,
+    resolve_uuid,
+    resolve_bool,
+    columns_for_fields,
+    paginate
+)
 from .serializers import (
     ProductSerializer,
     ProductDetailSerializer,
     OrderSerializer,
     OrderDetailSerializer,
+    SellerOrderSerializer,
     ReviewSerializer
 )
 
 
+SELLER_INBOX_ORDERING = ('-created_at', '-id')
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def product_list(request):
-    """List all products"""
-    products = Product.objects.filter(
-        status='active',
-        quantity__gt=0
+    """
+    List available products, one keyset page at a time
+    
+    GET /api/v1/marketplace/products/?category=tubers&search=cassava&sort=price_low
+        &limit=20&cursor=<next_cursor>&fields=name,price,thumbnail
+    
+    Facet filters: category, state, grade, organic, delivery. Pass facets=true
+    to get counts per facet value with the first page.
+    """
+    params = request.query_params
+    search = params.get('search')
+    
+    try:
+        sort, ordering = resolve_sort(params.get('sort'), searching=bool(search))
+        fields = resolve_fields(params.get('fields'), ProductSerializer().fields)
+        limit = resolve_limit(params.get('limit'))
+        seller = resolve_uuid(params.get('seller'), 'seller')
+        selected = {
+            'category': params.get('category'),
+            'state': params.get('state'),
+            'grade': params.get('grade'),
+            'organic': resolve_bool(params.get('organic'), 'organic'),
+            'delivery': resolve_bool(params.get('delivery'), 'delivery'),
+        }
+        with_facets = bool(resolve_bool(params.get('facets'), 'facets')) and not params.get('cursor')
+    except ListingError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    base_filters = {
+        'location': params.get('location'),
+        'seller': seller,
+        'search': search,
+    }
+    filters = dict(base_filters, **selected)
+    
+    def build():
+        products = Product.objects.filter(
+            status='available',
+            quantity_available__gt=0
+        )
+        
+        # Filter by location
+        if filters['location']:
+            products = products.filter(location_city__icontains=filters['location'])
+        
+        # Filter by seller (shop page)
+        if filters['seller']:
+            products = products.filter(seller_id=filters['seller'])
+        
+        # Search
+        if search:
+            products = search_products(products, search)
+        
+        facets = get_facets(products, base_filters, selected, scopes) if with_facets else None
+        
+        # Category, state, grade, organic and delivery filters
+        products = products.filter(**facet_filters(selected))
+        
+        # Load only the columns the requested fields need
+        columns = columns_for_fields(fields or ProductSerializer().fields, ordering)
+        if any(c.startswith('seller__') for c in columns):
+            products = products.select_related('seller')
+        products = products.only(*columns)
+        
+        page, next_cursor = paginate(products, sort, ordering, params.get('cursor'), limit)
+        
+        serializer = ProductSerializer(page, many=True, fields=fields)
+        data = {
+            'results': serializer.data,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+            'sort': sort,
+            'limit': limit,
+        }
+        if facets is not None:
+            data['facets'] = facets
+        return data
+    
+    # Category and seller pages only depend on their own version counter;
+    # facet counts span every category
+    if filters['seller']:
+        scopes = [version_key('seller', filters['seller'])]
+    elif filters['category'] and not search and not with_facets:
+        scopes = [version_key('category', filters['category'])]
+    else:
+        scopes = [version_key('listings')]
+    
+    key_params = dict(
+        filters,
+        facets=with_facets or None,
+        sort=sort,
+        limit=limit,
+        fields=','.join(fields) if fields else None,
+        cursor=params.get('cursor')
     )
     
-    # Filter by category
-    category = request.query_params.get('category')
-    if category:
-        products = products.filter(category=category)
+    try:
+        return cached_response(request, 'product_list', key_params, scopes, build)
+    except ListingError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def product_detail(request, product_id):
+    """Get product details"""
+    # Counted in Redis; flushed to view_count by a periodic task
+    record_view(product_id, viewer_key(request))
     
-    # Filter by location
-    location = request.query_params.get('location')
-    if location:
-        products = products.filter(location__icontains=location)
-    
-    # Search
-    search = request.query_params.get('search')
-    if search:
-        products = products.filter(
-            Q(name__icontains=search) |
-            Q(description__icontains=search)
+    def build():
+        product = get_object_or_404(
+            Product.objects.select_related('seller'),
+            id=product_id
         )
+        return ProductDetailSerializer(product).data
+    
+    return cached_response(
+        request,
+        'product_detail',
+        {'id': product_id},
+        [version_key('product', product_id)],
+        build
+    )
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def product_recommendations(request, product_id):
+    """
+    Products frequently bought together with this one, topped up with
+    similar products from the same category
+    
+    GET /api/v1/marketplace/products/<id>/recommendations/?limit=10
+    """
+    try:
+        limit = min(resolve_limit(request.query_params.get('limit') or 10), TOP_K)
+    except ListingError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    def build():
+        product = get_object_or_404(Product.objects.only('id', 'category'), id=product_id)
+        
+        results = []
+        for match in get_recommendations(product, limit):
+            item = ProductSerializer(match).data
+            item['reason'] = match.reason
+            item['score'] = match.score
+            results.append(item)
+        return {'results': results}
+    
+    # Neighbours change nightly; availability and prices with any product write
+    return cached_response(
+        request,
+        'product_recommendations',
+        {'id': product_id, 'limit': limit},
+        [version_key('recommendations'), version_key('listings')],
+        build
+    )
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def trending_products(request):
+    """
+    Most viewed available products over the last 24 hours
+    
+    GET /api/v1/marketplace/products/trending/?limit=20
+    """
+    try:
+        limit = resolve_limit(request.query_params.get('limit'))
+    except ListingError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    def build():
+        ranked = trending_product_ids(limit=limit * 2)
+        products = Product.objects.filter(
+            id__in=[pid for pid, _ in ranked],
+            status='available'
+        ).select_related('seller').in_bulk()
+        
+        results = []
+        for product_id, views in ranked:
+            product = products.get(UUID(product_id))
+            if product is None:
+                continue
+            item = ProductSerializer(product).data
+            item['recent_views'] = views
+            results.append(item)
+        return {'results': results[:limit]}
     
-    # Sort
-    sort_by = request.query_params.get('sort', '-created_at')
-    products = products.order_by(sort_by)
+    # Hourly view buckets change constantly; a short TTL is the only scope,
+    # and a rebuilt entry gets a new ETag
+    return cached_response(request, 'trending_products', {'limit': limit}, [], build)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def autocomplete(request):
+    """
+    Product and crop name suggestions for the search box, served from
+    memory without a database query
     
-    serializer = ProductSerializer(products, many=True)
-    return Response(serializer.data)
+    GET /api/v1/marketplace/products/autocomplete/?q=tom&limit=8
+    """
+    query = request.query_params.get('q', '')
+    try:
+        limit = resolve_limit(request.query_params.get('limit') or AUTOCOMPLETE_LIMIT)
+    except ListingError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({'query': query, 'suggestions': suggest(query, limit)})
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
-def product_detail(request, product_id):
-    """Get product details"""
-    product = get_object_or_404(Product, id=product_id)
-    serializer = ProductDetailSerializer(product)
-    return Response(serializer.data)
+def nearby_products(request):
+    """
+    Available products within a radius, nearest first
+    
+    GET /api/v1/marketplace/products/nearby/?lat=9.08&lon=7.49&radius_km=30&category=tubers
+    """
+    params = request.query_params
+    
+    try:
+        lat, lon, radius_km = parse_point(params.get('lat'), params.get('lon'), params.get('radius_km'))
+        limit = resolve_limit(params.get('limit'))
+    except (ValueError, ListingError) as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    products = Product.objects.filter(
+        status='available',
+        quantity_available__gt=0
+    ).select_related('seller')
+    
+    category = params.get('category')
+    if category:
+        products = products.filter(category=category)
+    
+    results = nearby(products, lat, lon, radius_km, limit=limit)
+    
+    data = ProductSerializer(results, many=True).data
+    for item, product in zip(data, results):
+        item['distance_km'] = product.distance_km
+    
+    return Response({
+        'results': data,
+        'radius_km': radius_km,
+        'count': len(data),
+    })
 
 
 @api_view(['POST'])
@@ -81,6 +326,41 @@ def create_product(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser, FormParser])
+def import_products_view(request):
+    """
+    Create many product listings from a CSV or XLSX sheet
+    
+    POST /api/v1/marketplace/products/import/  (multipart: file, dry_run)
+    
+    Columns: name, category, description, price_agrocoin, quantity_available,
+    unit, harvest_date, location_city, location_state, and optionally
+    minimum_order, primary_image, organic_certified, quality_grade, latitude,
+    longitude, delivery_available, pickup_available, delivery_fee_naira, status
+    (draft or available; draft by default). Returns a per-row error report.
+    """
+    upload = request.FILES.get('file')
+    if not upload:
+        return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
+    if upload.size > MAX_IMPORT_FILE_SIZE:
+        return Response(
+            {'error': f'File too large (max {MAX_IMPORT_FILE_SIZE // (1024 * 1024)}MB)'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        dry_run = bool(resolve_bool(request.data.get('dry_run'), 'dry_run'))
+        report = import_products(request.user, upload, upload.name, dry_run=dry_run)
+    except (ProductImportError, ListingError) as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if report['created'] or dry_run:
+        return Response(report, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
+    return Response(report, status=status.HTTP_400_BAD_REQUEST)
+
+
 @api_view(['PUT', 'PATCH'])
 @permission_classes([IsAuthenticated])
 def update_product(request, product_id):
@@ -120,62 +400,148 @@ def my_products(request):
 @permission_classes([IsAuthenticated])
 def create_order(request):
     """Create a new order"""
-    items = request.data.get('items', [])
+    delivery = {
+        'delivery_method': request.data.get('delivery_method', 'delivery'),
+        'delivery_address': request.data.get('delivery_address', request.data.get('shipping_address', '')),
+        'delivery_city': request.data.get('delivery_city', ''),
+        'delivery_state': request.data.get('delivery_state', ''),
+        'delivery_phone': request.data.get('delivery_phone', request.data.get('phone_number', request.user.phone_number)),
+        'buyer_notes': request.data.get('buyer_notes'),
+    }
     
-    if not items:
+    # Without explicit items, check out the whole cart
+    items = request.data.get('items')
+    from_cart = not items
+    if from_cart:
+        items = [
+            {'product_id': item['product_id'], 'quantity': item['quantity']}
+            for item in cart_service.get_cart(request.user.id)['items']
+        ]
+    
+    try:
+        order = place_order(
+            request.user,
+            items,
+            delivery,
+            reservation_id=request.data.get('reservation_id')
+        )
+    except OrderError as e:
         return Response(
-            {'error': 'Order items required'},
+            {'error': str(e)},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Calculate total
-    total_amount = 0
-    order_items = []
+    if from_cart:
+        cart_service.clear(request.user.id)
+        cart_service.flush(request.user.id)
     
-    for item_data in items:
-        product = get_object_or_404(Product, id=item_data['product_id'])
-        quantity = item_data['quantity']
-        
-        if product.quantity_available < quantity:
-            return Response(
-                {'error': f'Insufficient stock for {product.name}'},
-                status=status.HTTP_400_BAD_REQUEST
+    serializer = OrderDetailSerializer(order)
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def cart(request):
+    """
+    Get or empty the user's cart
+    
+    GET    /api/v1/marketplace/cart/
+    DELETE /api/v1/marketplace/cart/
+    """
+    if request.method == 'DELETE':
+        cart_service.clear(request.user.id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    return Response(cart_service.get_cart(request.user.id))
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def add_to_cart(request):
+    """
+    Add a product to the cart
+    
+    POST /api/v1/marketplace/cart/items/
+    {"product_id": "...", "quantity": 2}
+    """
+    try:
+        data = cart_service.add_item(
+            request.user.id,
+            request.data.get('product_id'),
+            request.data.get('quantity', 1)
+        )
+    except CartError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response(data)
+
+
+@api_view(['PATCH', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def cart_item(request, product_id):
+    """
+    Change the quantity of a cart line, or remove it
+    
+    PATCH  /api/v1/marketplace/cart/items/<product_id>/ {"quantity": 3}
+    DELETE /api/v1/marketplace/cart/items/<product_id>/
+    """
+    try:
+        if request.method == 'DELETE':
+            data = cart_service.remove_item(request.user.id, product_id)
+        else:
+            data = cart_service.set_quantity(
+                request.user.id,
+                product_id,
+                request.data.get('quantity')
             )
-        
-        subtotal = product.price_agrocoin * quantity
-        total_amount += subtotal
-        
-        order_items.append({
-            'product': product,
-            'quantity': quantity,
-            'price': product.price_agrocoin,
-            'subtotal': subtotal
-        })
-    
-    # Create order
-    order = Order.objects.create(
-        buyer=request.user,
-        total_amount=total_amount,
-        shipping_address=request.data.get('shipping_address', ''),
-        phone_number=request.data.get('phone_number', request.user.phone_number)
-    )
+    except CartError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Create order items and update stock
-    for item in order_items:
-        OrderItem.objects.create(
-            order=order,
-            product=item['product'],
-            quantity=item['quantity'],
-            price=item['price'],
-            subtotal=item['subtotal']
+    return Response(data)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def reserve_stock(request):
+    """
+    Hold stock for a basket while the buyer checks out
+    
+    POST /api/v1/marketplace/checkout/reserve/
+    {"items": [{"product_id": "...", "quantity": 2}]}
+    
+    Pass the returned reservation_id to create_order. Holds expire on their
+    own after a few minutes.
+    """
+    try:
+        quantities = normalise_items(request.data.get('items', []))
+        reservation = reservations.reserve(request.user.id, quantities)
+    except (OrderError, reservations.ReservationError) as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_409_CONFLICT if isinstance(e, reservations.ReservationError) else status.HTTP_400_BAD_REQUEST
         )
-        
-        # Reduce stock
-        item['product'].quantity -= item['quantity']
-        item['product'].save(update_fields=['quantity'])
     
-    serializer = OrderDetailSerializer(order)
-    return Response(serializer.data, status=status.HTTP_201_CREATED)
+    return Response(reservation, status=status.HTTP_201_CREATED)
+
+
+@api_view(['DELETE'])
+@permission_classes([IsAuthenticated])
+def release_reservation(request, reservation_id):
+    """Release a checkout hold the buyer no longer needs"""
+    try:
+        quantities = reservations.get_reservation(reservation_id, request.user.id)
+    except reservations.ReservationError as e:
+        return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
+    
+    # Holds already turned into an order are released with the order
+    if Order.objects.filter(reservation_id=reservation_id).exists():
+        return Response(
+            {'error': 'Reservation belongs to an order, cancel the order instead'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    reservations.release(reservation_id, quantities)
+    return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 @api_view(['GET'])
@@ -202,20 +568,14 @@ def cancel_order(request, order_id):
     """Cancel an order"""
     order = get_object_or_404(Order, id=order_id, buyer=request.user)
     
-    if order.status not in ['pending', 'confirmed']:
+    try:
+        cancel_order_service(order)
+    except OrderError as e:
         return Response(
-            {'error': 'Cannot cancel order in current status'},
+            {'error': str(e)},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Restore stock
-    for item in order.items.all():
-        item.product.quantity += item.quantity
-        item.product.save(update_fields=['quantity'])
-    
-    order.status = 'cancelled'
-    order.save()
-    
     return Response({
         'message': 'Order cancelled successfully',
         'order': OrderDetailSerializer(order).data
@@ -225,50 +585,111 @@ def cancel_order(request, order_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def seller_orders(request):
-    """Get orders for seller's products"""
-    # Get all orders containing seller's products
-    order_items = OrderItem.objects.filter(
-        product__seller=request.user
-    ).select_related('order')
+    """
+    Seller order inbox, newest first, one keyset page at a time
     
-    orders = Order.objects.filter(
-        id__in=order_items.values_list('order_id', flat=True)
-    ).distinct().order_by('-created_at')
+    GET /api/v1/marketplace/orders/selling/?status=paid,processing&limit=50&cursor=<next_cursor>
     
-    serializer = OrderSerializer(orders, many=True)
-    return Response(serializer.data)
+    The first page also carries the seller's order count per status.
+    """
+    params = request.query_params
+    valid_statuses = {value for value, _ in Order.STATUS_CHOICES}
+    statuses = [s.strip() for s in (params.get('status') or '').split(',') if s.strip()]
+    
+    invalid = [s for s in statuses if s not in valid_statuses]
+    if invalid:
+        return Response(
+            {'error': f"Invalid status '{invalid[0]}'"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    orders = Order.objects.filter(seller=request.user)
+    if statuses:
+        orders = orders.filter(status__in=statuses)
+    orders = orders.select_related('buyer').annotate(item_count=Count('line_items'))
+    
+    try:
+        page, next_cursor = paginate(
+            orders, 'inbox', SELLER_INBOX_ORDERING, params.get('cursor'), params.get('limit')
+        )
+    except ListingError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = {
+        'results': SellerOrderSerializer(page, many=True).data,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+    }
+    if not params.get('cursor'):
+        data['status_counts'] = dict(
+            Order.objects.filter(seller=request.user).order_by().values('status').annotate(
+                total=Count('id')
+            ).values_list('status', 'total')
+        )
+    return Response(data)
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def update_order_status(request, order_id):
     """Update order status (for sellers)"""
-    new_status = request.data.get('status')
+    order = get_object_or_404(Order, id=order_id)
     
-    if new_status not in ['confirmed', 'shipped', 'delivered']:
+    if order.seller_id != request.user.id:
         return Response(
-            {'error': 'Invalid status'},
-            status=status.HTTP_400_BAD_REQUEST
+            {'error': 'Unauthorized'},
+            status=status.HTTP_403_FORBIDDEN
         )
     
-    order = get_object_or_404(Order, id=order_id)
+    try:
+        updated, _ = transition_orders(request.user, [str(order.id)], request.data.get('status'))
+    except OrderError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Verify seller owns products in this order
-    if not order.items.filter(product__seller=request.user).exists():
+    if not updated:
         return Response(
-            {'error': 'Unauthorized'},
-            status=status.HTTP_403_FORBIDDEN
+            {'error': f'Cannot change order status from {order.status}'},
+            status=status.HTTP_400_BAD_REQUEST
         )
     
-    order.status = new_status
-    order.save()
+    tracking_number = request.data.get('tracking_number')
+    if tracking_number:
+        Order.objects.filter(id=order.id).update(tracking_number=tracking_number)
     
+    order.refresh_from_db()
     return Response({
         'message': 'Order status updated',
         'order': OrderDetailSerializer(order).data
     })
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_update_order_status(request):
+    """
+    Move many of the seller's orders to a new status at once
+    
+    POST /api/v1/marketplace/orders/selling/status/
+    {"order_ids": ["...", "..."], "status": "shipped"}
+    
+    Orders not in a status the transition allows are reported as skipped.
+    """
+    try:
+        updated, skipped = transition_orders(
+            request.user,
+            request.data.get('order_ids'),
+            request.data.get('status')
+        )
+    except OrderError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'message': f'{len(updated)} orders updated',
+        'updated': updated,
+        'skipped': skipped,
+    })
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_review(request, product_id):
@@ -289,7 +710,7 @@ def create_review(request, product_id):
         )
     
     # Check if already reviewed
-    if Review.objects.filter(product=product, user=request.user).exists():
+    if Review.objects.filter(product=product, reviewer=request.user).exists():
         return Response(
             {'error': 'You have already reviewed this product'},
             status=status.HTTP_400_BAD_REQUEST
@@ -297,12 +718,8 @@ def create_review(request, product_id):
     
     serializer = ReviewSerializer(data=request.data)
     if serializer.is_valid():
-        serializer.save(product=product, user=request.user)
-        
-        # Update product rating
-        avg_rating = product.reviews.aggregate(Avg('rating'))['rating__avg']
-        product.average_rating = avg_rating
-        product.save(update_fields=['rating'])
+        # Product rating aggregates are adjusted by Review.save
+        serializer.save(product=product, reviewer=request.user, verified_purchase=True)
         
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
@@ -323,17 +740,56 @@ def product_reviews(request, product_id):
 @permission_classes([AllowAny])
 def marketplace_stats(request):
     """Get marketplace statistics"""
-    stats = {
-        'total_products': Product.objects.filter(status='active').count(),
-        'total_orders': Order.objects.count(),
-        'total_reviews': Review.objects.count(),
-        'categories': Product.objects.values('category').annotate(
-            count=Count('id')
-        ).order_by('-count')[:5],
-        'top_rated': ProductSerializer(
-            Product.objects.filter(status='active').order_by('-rating')[:5],
-            many=True
-        ).data
+    def build():
+        available = Product.objects.filter(status='available')
+        return {
+            'total_products': available.count(),
+            'total_orders': Order.objects.count(),
+            'total_reviews': Review.objects.count(),
+            'categories': list(available.values('category').annotate(
+                count=Count('id')
+            ).order_by('-count')[:5]),
+            'top_rated': ProductSerializer(
+                available.select_related('seller').order_by('-average_rating', '-id')[:5],
+                many=True
+            ).data
+        }
+    
+    return cached_response(
+        request,
+        'marketplace_stats',
+        {},
+        [version_key('listings')],
+        build
+    )
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def crop_prices(request):
+    """
+    Market price index from paid orders: median and interquartile range
+    of the Naira unit price per unit, over a rolling window of days
+    
+    GET /api/v1/marketplace/prices/?crop=tomatoes&state=Kano&unit=basket&days=30
+    GET /api/v1/marketplace/prices/?category=grains
+    """
+    params = request.query_params
+    query = {
+        'crop': params.get('crop') or None,
+        'category': params.get('category') or None,
+        'state': params.get('state') or None,
+        'unit': params.get('unit') or None,
+        'days': params.get('days') or DEFAULT_WINDOW_DAYS,
     }
     
-    return Response(stats)
\ No newline at end of file
+    try:
+        return cached_response(
+            request,
+            'crop_prices',
+            query,
+            [version_key('price_index')],
+            lambda: get_price_index(**query)
+        )
+    except PriceIndexError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -104,34 +104,67 @@ def send_scheduled_reminders(self):
         raise self.retry(exc=e)
 
 
+def _deliver_sms(phone_number, message):
+    """
+    Deliver a single SMS via Africa's Talking, skipping recent duplicates
+    """
+    cache_key = f"sms_sent_{phone_number}_{hash(message)}"
+    if cache.get(cache_key):
+        logger.info(f"SMS duplicate skipped: {phone_number}")
+        return {'status': 'skipped', 'reason': 'duplicate'}
+    
+    if not getattr(settings, 'ENABLE_NOTIFICATIONS', False):
+        logger.info("Notifications disabled in settings")
+        return {'status': 'disabled'}
+    
+    # Simulating External Service Call (Replace with real SDK)
+    # import africastalking
+    # ... logic ...
+    
+    cache.set(cache_key, True, 300)
+    logger.info(f"SMS sent to {phone_number}")
+    return {'status': 'sent', 'phone': phone_number}
+
+
 @shared_task(bind=True, max_retries=3)
 def send_sms_notification(self, phone_number, message):
     """
     Send SMS notification via Africa's Talking
     """
     try:
-        cache_key = f"sms_sent_{phone_number}_{hash(message)}"
-        if cache.get(cache_key):
-            logger.info(f"SMS duplicate skipped: {phone_number}")
-            return {'status': 'skipped', 'reason': 'duplicate'}
-        
-        if not getattr(settings, 'ENABLE_NOTIFICATIONS', False):
-            logger.info("Notifications disabled in settings")
-            return {'status': 'disabled'}
-        
-        # Simulating External Service Call (Replace with real SDK)
-        # import africastalking
-        # ... logic ...
-        
-        cache.set(cache_key, True, 300)
-        logger.info(f"SMS sent to {phone_number}")
-        return {'status': 'sent', 'phone': phone_number}
+        return _deliver_sms(phone_number, message)
     
     except Exception as e:
         logger.error(f"Failed to send SMS to {phone_number}: {str(e)}")
         raise self.retry(exc=e, countdown=30)
 
 
+@shared_task(bind=True, max_retries=3)
+def send_sms_batch(self, messages):
+    """
+    Send a chunk of SMS notifications in one task
+    
+    Args:
+        messages (list): [[phone_number, message], ...]
+    """
+    sent_count = 0
+    failed = []
+    
+    for phone_number, message in messages:
+        try:
+            if _deliver_sms(phone_number, message)['status'] == 'sent':
+                sent_count += 1
+        except Exception as e:
+            logger.error(f"Failed to send SMS to {phone_number}: {str(e)}")
+            failed.append([phone_number, message])
+    
+    # Retry only the messages that failed
+    if failed and self.request.retries < self.max_retries:
+        raise self.retry(args=[failed], countdown=30)
+    
+    return {'sent': sent_count, 'failed': len(failed)}
+
+
 @shared_task(bind=True, max_retries=3)
 def send_email_notification(self, email, subject, message):
     """
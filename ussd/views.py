@@ -14,6 +14,7 @@ from accounts.models import User
 from farming.models import Farm, Crop, FarmTask
 from blockchain.models import Wallet
 from marketplace.models import Product
+from blockchain.rates import get_rate
 from django.conf import settings
 import logging
 import json
@@ -223,6 +224,10 @@ def handle_menu_navigation(user, user_input, session_data, session_id):
         elif main_choice == '3':  # Wallet
             return handle_wallet_operations(user, sub_choice, session_data)
     
+    elif level == 3:
+        if user_input[0] == '2' and user_input[1] == '5':  # Market prices for a crop
+            return show_market_prices(user, user_input[2])
+    
     return "END Invalid selection. Please try again."
 
 
@@ -248,6 +253,7 @@ def show_marketplace_menu(user):
     menu += "2. My Orders\n"
     menu += "3. Sell Produce\n"
     menu += "4. Search by Category\n"
+    menu += "5. Market Prices\n"
     menu += "0. Back"
     
     return menu
@@ -403,9 +409,47 @@ def handle_marketplace_operations(user, choice, session_data):
     elif choice == '3':  # Sell Produce
         return "CON Sell Produce:\nEnter product name:"
     
+    elif choice == '5':  # Market Prices
+        return "CON Market Prices:\nEnter crop name (e.g. Tomatoes):"
+    
     return "END Feature coming soon."
 
 
+def show_market_prices(user, crop):
+    """
+    Median and typical range of paid prices for a crop over the last
+    30 days, in the user's state when there is enough data there
+    """
+    from marketplace.cache import cached_data, version_key
+    from marketplace.price_index import PriceIndexError, get_price_index
+    
+    profile = getattr(user, 'profile', None)
+    states = [profile.state, None] if profile and profile.state else [None]
+    
+    try:
+        for state in states:
+            query = {'crop': crop, 'state': state}
+            index = cached_data(
+                'crop_prices',
+                query,
+                [version_key('price_index')],
+                lambda: get_price_index(**query)
+            )
+            if index['units']:
+                break
+    except PriceIndexError:
+        return f"END No prices for '{crop[:20]}'. Try a crop like Maize or Yam."
+    
+    if not index['units']:
+        return f"END No recent sales of {index['crop']} yet."
+    
+    response = f"END {index['crop'].title()} prices, {index['state'] or 'Nigeria'} (30 days):\n"
+    for entry in index['units'][:3]:
+        response += f"\nPer {entry['unit']}: ₦{entry['median']:,.0f}\n"
+        response += f"Range ₦{entry['p25']:,.0f}-₦{entry['p75']:,.0f} ({entry['samples']} sales)\n"
+    return response
+
+
 def handle_wallet_operations(user, choice, session_data):
     """Handle wallet operations"""
     if choice == '1':  # Buy AgroCoin
@@ -451,7 +495,7 @@ def ussd_payment_callback(request):
         
         # Process AgroCoin purchase
         from blockchain.models import TokenPurchase
-        conversion_rate = settings.ETHEREUM_CONFIG['AGROCOIN_TO_NAIRA_RATE']
+        conversion_rate = float(get_rate())
         ac_amount = float(amount) / conversion_rate
         
         purchase = TokenPurchase.objects.create(
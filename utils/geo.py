@@ -0,0 +1,242 @@
+"""
+AgroMentor 360 - Geo Proximity Helpers
+Geohash cells for indexed candidate lookup and vectorised haversine refinement
+
+Rows store a geohash of their coordinates. A radius query is answered by
+covering the radius' bounding box with a handful of geohash cells (each a
+prefix range on the indexed column), then computing exact great-circle
+distances for the candidates in one NumPy pass.
+"""
+
+from django.db.models import Q
+import math
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+GEOHASH_PRECISION = 9             # ~5 m cells; queries use shorter prefixes
+MAX_COVER_CELLS = 16              # Upper bound on prefix ranges per query
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+DEFAULT_RADIUS_KM = 30
+MAX_RADIUS_KM = 300
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """
+    Encode coordinates as a geohash string
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    latitude, longitude = float(latitude), float(longitude)
+
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+
+    while len(chars) < precision:
+        rng, coord = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if coord >= mid:
+            value = (value << 1) | 1
+            rng[0] = mid
+        else:
+            value <<= 1
+            rng[1] = mid
+        even = not even
+
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """
+    Geohash cell size in degrees at a given precision
+
+    Returns:
+        tuple: (lat_degrees, lon_degrees)
+    """
+    total_bits = precision * 5
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    Lat/lon box enclosing a circle of radius_km
+
+    Returns:
+        tuple: (min_lat, max_lat, min_lon, max_lon)
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    dlon = min(math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)), 180.0)
+
+    return (
+        max(latitude - dlat, -90.0),
+        min(latitude + dlat, 90.0),
+        max(longitude - dlon, -180.0),
+        min(longitude + dlon, 180.0),
+    )
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose cells together cover the radius' bounding box
+
+    Picks the longest prefix that needs at most MAX_COVER_CELLS cells.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+
+    precision = GEOHASH_PRECISION
+    while precision > 1:
+        lat_step, lon_step = cell_size(precision)
+        rows = math.floor(max_lat / lat_step) - math.floor(min_lat / lat_step) + 1
+        cols = math.floor(max_lon / lon_step) - math.floor(min_lon / lon_step) + 1
+        if rows * cols <= MAX_COVER_CELLS:
+            break
+        precision -= 1
+
+    lat_step, lon_step = cell_size(precision)
+    lats = list(np.arange(min_lat, max_lat, lat_step)) + [max_lat]
+    lons = list(np.arange(min_lon, max_lon, lon_step)) + [max_lon]
+
+    return sorted({
+        encode_geohash(lat, lon, precision)
+        for lat in lats
+        for lon in lons
+    })
+
+
+def geohash_filter(cells, field='geohash'):
+    """
+    Q object matching rows whose geohash falls in any of the cells
+    Uses range comparisons so a plain B-tree index on the column applies
+    """
+    condition = Q()
+    for cell in cells:
+        # '~' sorts after every geohash character
+        condition |= Q(**{f'{field}__gte': cell, f'{field}__lt': cell + '~'})
+    return condition
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """
+    Great-circle distances from one point to arrays of points, in km
+    """
+    lat1 = math.radians(float(latitude))
+    lon1 = math.radians(float(longitude))
+    lat2 = np.radians(np.asarray(latitudes, dtype=float))
+    lon2 = np.radians(np.asarray(longitudes, dtype=float))
+
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2 +
+        math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def parse_point(latitude, longitude, radius_km=None):
+    """
+    Validate query parameters for a radius search
+
+    Returns:
+        tuple: (latitude, longitude, radius_km)
+
+    Raises:
+        ValueError: If any value is missing or out of range
+    """
+    try:
+        latitude = float(latitude)
+        longitude = float(longitude)
+        radius_km = float(radius_km) if radius_km not in (None, '') else float(DEFAULT_RADIUS_KM)
+    except (TypeError, ValueError):
+        raise ValueError('lat, lon and radius_km must be numbers')
+
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError('lat must be within [-90, 90] and lon within [-180, 180]')
+    if not (0 < radius_km <= MAX_RADIUS_KM):
+        raise ValueError(f'radius_km must be between 0 and {MAX_RADIUS_KM}')
+
+    return latitude, longitude, radius_km
+
+
+def nearby(queryset, latitude, longitude, radius_km, limit=None,
+           lat_field='latitude', lon_field='longitude', geohash_field='geohash'):
+    """
+    Rows of a queryset within radius_km of a point, nearest first
+
+    Candidates are fetched through the geohash index (ids and coordinates
+    only), distances computed in NumPy, and the surviving rows loaded with
+    one id__in query. Each returned object gets a `distance_km` attribute.
+
+    Returns:
+        list: Model instances sorted by distance
+    """
+    cells = covering_cells(latitude, longitude, radius_km)
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+
+    candidates = list(
+        queryset.filter(geohash_filter(cells, geohash_field)).filter(**{
+            f'{lat_field}__gte': min_lat,
+            f'{lat_field}__lte': max_lat,
+            f'{lon_field}__gte': min_lon,
+            f'{lon_field}__lte': max_lon,
+        }).values_list('pk', lat_field, lon_field)
+    )
+    if not candidates:
+        return []
+
+    ids = [row[0] for row in candidates]
+    coords = np.array([(row[1], row[2]) for row in candidates], dtype=float)
+    distances = haversine_km(latitude, longitude, coords[:, 0], coords[:, 1])
+
+    order = np.argsort(distances, kind='stable')
+    order = order[distances[order] <= radius_km]
+    if limit is not None:
+        order = order[:limit]
+
+    selected = [(ids[i], float(distances[i])) for i in order]
+    objects = queryset.in_bulk([pk for pk, _ in selected])
+
+    results = []
+    for pk, distance in selected:
+        obj = objects.get(pk)
+        if obj is not None:
+            obj.distance_km = round(distance, 2)
+            results.append(obj)
+    return results
+
+
+def backfill_geohashes(queryset, batch_size=1000):
+    """
+    Give rows with coordinates but no geohash their geohash
+
+    Returns:
+        int: Number of rows filled
+    """
+    missing = queryset.filter(
+        geohash__isnull=True,
+        latitude__isnull=False,
+        longitude__isnull=False
+    ).order_by().only('pk', 'latitude', 'longitude')
+
+    filled = 0
+    while True:
+        rows = list(missing[:batch_size])
+        if not rows:
+            return filled
+        for row in rows:
+            row.geohash = encode_geohash(row.latitude, row.longitude)
+        queryset.model.objects.using(queryset.db).bulk_update(rows, ['geohash'])
+        filled += len(rows)
@@ -0,0 +1,243 @@
+"""
+AgroMentor 360 - Image Derivatives
+Resized, EXIF-free WebP/JPEG copies of uploaded images for mobile clients
+
+Uploads are kept as-is. A background task writes one file per width and
+format next to the original (e.g. products/yam_320w.webp) and records their
+names in a JSON field on the model, tagged with the original's name so a
+replaced upload is never served with the previous image's derivatives.
+"""
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from io import BytesIO
+from rest_framework import serializers
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+DERIVATIVE_WIDTHS = (160, 320, 640, 1280)
+THUMBNAIL_WIDTH = 320
+
+# format -> (Pillow format, extension, save options)
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 75, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 78, 'optimize': True, 'progressive': True}),
+}
+
+
+def derivative_name(name, width, fmt):
+    """
+    Storage name of one derivative, stored beside the original
+    """
+    root, _ = os.path.splitext(name)
+    return f'{root}_{width}w.{DERIVATIVE_FORMATS[fmt][1]}'
+
+
+def variants_current(field_file, variants):
+    """
+    True if `variants` were generated from the file currently in the field
+    """
+    return bool(field_file) and bool(variants) and variants.get('source') == field_file.name
+
+
+def _load(field_file):
+    from PIL import Image, ImageOps
+
+    field_file.open('rb')
+    try:
+        image = Image.open(field_file)
+        image.load()
+    finally:
+        field_file.close()
+
+    # Bake the EXIF orientation into the pixels; no metadata is written out
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    return image
+
+
+def _flatten(image):
+    from PIL import Image
+
+    if image.mode != 'RGBA':
+        return image
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def generate_derivatives(field_file, widths=DERIVATIVE_WIDTHS):
+    """
+    Write resized WebP and JPEG copies of an image file
+
+    Widths larger than the original are skipped (the smallest width is
+    always produced). Existing files with the same names are replaced.
+
+    Returns:
+        dict: {'source': original name, 'width': original width,
+               'webp': {width: name}, 'jpeg': {width: name}}
+    """
+    from PIL import Image
+
+    image = _load(field_file)
+    storage = field_file.storage
+
+    targets = [w for w in sorted(widths) if w < image.width] or [min(widths)]
+    variants = {'source': field_file.name, 'width': image.width}
+
+    for fmt, (pil_format, _, options) in DERIVATIVE_FORMATS.items():
+        variants[fmt] = {}
+        for width in targets:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+            if pil_format == 'JPEG':
+                resized = _flatten(resized)
+
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, **options)
+
+            name = derivative_name(field_file.name, width, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            variants[fmt][str(width)] = storage.save(name, ContentFile(buffer.getvalue()))
+
+    return variants
+
+
+def delete_derivatives(storage, variants):
+    """
+    Remove derivative files recorded in a variants dict
+    """
+    for fmt in DERIVATIVE_FORMATS:
+        for name in (variants or {}).get(fmt, {}).values():
+            try:
+                storage.delete(name)
+            except Exception as e:
+                logger.error(f"Error deleting image derivative {name}: {str(e)}")
+
+
+def schedule_derivatives(instance, field_name, variants_field, task, update_fields=None):
+    """
+    Queue derivative generation after a save if the image has changed
+
+    Call from Model.save after super().save(). `task` is the Celery task
+    taking the instance's primary key.
+    """
+    if update_fields is not None and field_name not in update_fields:
+        return
+
+    field_file = getattr(instance, field_name)
+    if not field_file or variants_current(field_file, getattr(instance, variants_field)):
+        return
+
+    pk = str(instance.pk)
+    transaction.on_commit(lambda: task.delay(pk))
+
+
+def refresh_derivatives(instance, field_name, variants_field):
+    """
+    Regenerate the derivatives of an instance's image and record them
+
+    Used by the per-model Celery tasks. Skips the write if the image was
+    replaced while the derivatives were being generated.
+
+    Returns:
+        dict or None: The new variants, or None if there is no image
+    """
+    field_file = getattr(instance, field_name)
+    previous = getattr(instance, variants_field) or {}
+
+    if not field_file:
+        delete_derivatives(field_file.storage, previous)
+        type(instance).objects.filter(pk=instance.pk).update(**{variants_field: {}})
+        return None
+
+    variants = generate_derivatives(field_file)
+
+    updated = type(instance).objects.filter(
+        pk=instance.pk,
+        **{field_name: field_file.name}
+    ).update(**{variants_field: variants})
+
+    if not updated:
+        # A newer upload has its own task queued
+        delete_derivatives(field_file.storage, variants)
+        return None
+
+    if previous.get('source') != variants['source']:
+        delete_derivatives(field_file.storage, previous)
+    return variants
+
+
+def _absolute(url, request):
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def image_urls(field_file, variants, request=None):
+    """
+    Client-facing URLs of an image and its derivatives
+
+    Returns:
+        dict: original URL, a thumbnail URL and a srcset string per format,
+            e.g. {'webp': '.../yam_160w.webp 160w, .../yam_320w.webp 320w'}.
+            Until derivatives exist the thumbnail is the original and
+            srcset is empty.
+    """
+    if not field_file:
+        return None
+
+    original = _absolute(field_file.url, request)
+    urls = {'original': original, 'thumbnail': original, 'srcset': {}}
+
+    if not variants_current(field_file, variants):
+        return urls
+
+    storage = field_file.storage
+    for fmt in DERIVATIVE_FORMATS:
+        names = sorted(variants.get(fmt, {}).items(), key=lambda item: int(item[0]))
+        urls['srcset'][fmt] = ', '.join(
+            f'{_absolute(storage.url(name), request)} {width}w' for width, name in names
+        )
+
+    jpeg = variants.get('jpeg', {})
+    if jpeg:
+        # The smallest width at or above THUMBNAIL_WIDTH, else the largest there is
+        widths = sorted(int(w) for w in jpeg)
+        width = next((w for w in widths if w >= THUMBNAIL_WIDTH), widths[-1])
+        urls['thumbnail'] = _absolute(storage.url(jpeg[str(width)]), request)
+
+    return urls
+
+
+def thumbnail_url(field_file, variants):
+    """
+    Relative URL of an image's thumbnail (the original until derivatives exist)
+    """
+    urls = image_urls(field_file, variants)
+    return urls['thumbnail'] if urls else None
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Read-only serializer field exposing an image's derivative URLs
+
+    Usage: images = ImageVariantsField('primary_image', 'image_variants')
+    """
+
+    def __init__(self, image_field, variants_field, **kwargs):
+        self.image_field = image_field
+        self.variants_field = variants_field
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        return image_urls(
+            getattr(instance, self.image_field),
+            getattr(instance, self.variants_field),
+            self.context.get('request')
+        )